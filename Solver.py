@@ -1,18 +1,148 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+from functools import partial
+from fastapi import FastAPI, HTTPException, Request, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from starlette.datastructures import MutableHeaders
+from typing import List, Dict, Any, Optional
 
 # Import the refactored core logic
-from core.preprocessing import predict_rendement
-from core.models import solve_assignment
+from config import config
+from core import preprocessing
+from core.preprocessing import RENDEMENT_MODES
+from core.pipeline import SolveError
+from core.executor import SolveExecutor, SolveCancelled
+from core.jobs import JobManager, SQLiteJobStore, QueueFull
+from core.scheduler import PriorityScheduler, Overloaded, parse_budgets
+from core.streaming import StreamRegistry
+from core.coalescing import SingleFlight, solve_key
+from core.timing import server_timing_header
+from core.responses import (RESPONSE_FORMATS, NDJSON_MEDIA_TYPE, NDJSON_BATCH, FastJSONResponse, ndjson_lines,
+                            parse_fields, select_fields)
+from core.metrics import metrics, MetricsMiddleware, HTTP_LATENCY, CONTENT_TYPE
+from core.logs import setup_logging, get_logger, fields, sampled, summarize, RequestContextMiddleware
+from core.profiling import ProfileCollector, ProfileGate
+from core.registry import registry
+from core.preload import preload, process_memory
+
+setup_logging()
+logger = get_logger("Solver")
+
+if config.PRELOAD_MODEL:
+    # `gunicorn --preload` (gunicorn.conf.py) imports this module once in the
+    # master: load the model here so the forked workers share its pages.
+    preload()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model and encoders in the background so the server starts
+    # answering (e.g. /health) right away; /solve waits for them if needed.
+    # Already done (and shared) when the master preloaded them.
+    setup_logging()  # again in a worker forked from a --preload master
+    threading.Thread(target=registry.ensure_loaded, daemon=True).start()
+    executor.start()
+    logger.info("worker started", extra=fields(**process_memory()))
+    yield
+    await jobs.stop()
+    executor.shutdown()
+
+
+# Runs prediction (threads) and the local search (processes) off the event loop
+executor = SolveExecutor(config.SOLVER_PROCESSES, config.PREDICT_THREADS, config.SOLVER_START_METHOD)
+# Decides which solve (/solve or /jobs) gets the executor next, by priorite
+scheduler = PriorityScheduler(
+    config.SCHEDULER_CAPACITY,
+    budgets=parse_budgets(config.PRIORITY_BUDGETS_S),
+    preemptible=[p.strip() for p in config.PREEMPTIBLE_PRIORITIES.split(",") if p.strip()],
+    preempt_after_s=config.PREEMPT_AFTER_S,
+    max_queued=config.SCHEDULER_QUEUE_MAX,
+    max_wait_s=config.SCHEDULER_MAX_WAIT_S,
+    client_max=config.SCHEDULER_CLIENT_MAX
+)
+# Streamed solves (/solve/stream) that can still be stopped
+streams = StreamRegistry()
+# Identical /solve requests in flight, answered by one solve
+flights = SingleFlight()
+# Rate limit of the opt-in /solve profiler
+profile_gate = ProfileGate(config.PROFILING_ENABLED, config.PROFILE_MIN_INTERVAL_S)
+# Async solve jobs (/jobs) on the same executor
+jobs = JobManager(executor, scheduler, config.JOB_QUEUE_MAX, config.JOB_TTL_S,
+                  SQLiteJobStore(config.JOBS_DB_PATH) if config.JOBS_DB_PATH else None)
+
 
 # Create a FastAPI app instance
 app = FastAPI(
     title="Equilibrage Solver API",
     description="An API to receive production data and return an optimized plan.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+
+class ModelVersionHeaderMiddleware:
+    """
+    Adds the X-Model-Version header to every response: the version of the
+    bundle the request pinned (see _pin_bundle), else the active one. Plain
+    ASGI rather than @app.middleware("http"), which hides client disconnects
+    from the endpoints.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_version(message):
+            if message["type"] == "http.response.start":
+                version = scope.get("state", {}).get("model_version")
+                if version is None:
+                    active = registry.active
+                    version = active.version if active else "none"
+                MutableHeaders(scope=message).append("X-Model-Version", version)
+            await send(message)
+
+        await self.app(scope, receive, send_with_version)
+
+
+app.add_middleware(ModelVersionHeaderMiddleware)
+app.add_middleware(MetricsMiddleware, histogram=HTTP_LATENCY)
+app.add_middleware(RequestContextMiddleware)
+
+
+# --- Scrape-time metrics (see core/metrics.py for the ones recorded as they happen) ---
+
+def _per_priority(field: str):
+    return lambda: {(p,): v[field] for p, v in scheduler.metrics()["priorities"].items()}
+
+
+metrics.gauge("scheduler_queue_depth", "Solves waiting for a slot, by priority.", ("priority",),
+              collect=_per_priority("queued"))
+metrics.gauge("scheduler_running", "Solves holding a slot, by priority.", ("priority",),
+              collect=_per_priority("running"))
+metrics.gauge("scheduler_oldest_wait_seconds", "Wait of the oldest queued solve, by priority.", ("priority",),
+              collect=_per_priority("oldest_wait_s"))
+metrics.gauge("scheduler_estimated_wait_seconds", "Expected wait of a solve arriving now, by priority.",
+              ("priority",), collect=_per_priority("estimated_wait_s"))
+metrics.gauge("scheduler_capacity", "Solves that can run at once.", collect=lambda: {(): scheduler.capacity})
+metrics.gauge("executor_in_flight", "Solves in the executor (predicting or solving).",
+              collect=lambda: {(): executor.in_flight})
+metrics.counter("executor_cancelled_total", "Solves cancelled by their client.",
+                collect=lambda: {(): executor.cancelled})
+metrics.gauge("jobs", "Known async jobs by state.", ("state",),
+              collect=lambda: {(state,): n for state, n in jobs.status()["jobs"].items()})
+metrics.gauge("solve_streams_open", "Streamed solves in progress.", collect=lambda: {(): len(streams)})
+metrics.gauge("solve_flights_in_progress", "Distinct /solve computations that identical requests can join.",
+              collect=lambda: {(): len(flights)})
+metrics.gauge("model_info", "Active model version (value is always 1).", ("version",),
+              collect=lambda: {(registry.active.version,): 1} if registry.active else {})
+metrics.gauge("model_ready", "1 once a model is loaded.", collect=lambda: {(): int(preprocessing.is_ready())})
+
 # --- Pydantic Models for API Request Body ---
 
 class Metadata(BaseModel):
@@ -52,65 +182,400 @@ class ProductionData(BaseModel):
     operations: List[Operation]
     parametres_production: ProductionParams
 
+class ModelReloadRequest(BaseModel):
+    model_path: str
+    agg_path: Optional[str] = None
+    encoders_path: Optional[str] = None
+    version: Optional[str] = None
+
+
+def _pin_bundle(request: Request):
+    """
+    The bundle serving this request, kept for all of it even if a reload
+    swaps the active one meanwhile; its version goes in X-Model-Version.
+    """
+    bundle = registry.get()
+    if bundle is None:
+        raise HTTPException(status_code=503, detail="Model not loaded.")
+    request.state.model_version = bundle.version
+    return bundle
+
+
+def _client_id(request: Request) -> str:
+    """Who a solve counts against for admission control: X-Client-ID, else the client address."""
+    client = request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+    return client[:64]
+
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    logger.info("solve refused", extra=fields(reason=e.reason, status=e.status_code, retry_after_s=e.retry_after_s))
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after_s)})
+
+
+@app.get("/health")
+def health():
+    """Readiness probe: reports whether the model is loaded and how long loading took."""
+    active = registry.active
+    return {
+        "ready": preprocessing.is_ready(),
+        "model_version": active.version if active else None,
+        "startup": active.load_stats if active else {},
+        "executor": executor.status(),
+        "scheduler": {key: value for key, value in scheduler.metrics().items() if key != "priorities"},
+        "jobs": jobs.status(),
+        "streams": len(streams)
+    }
+
+
+@app.get("/scheduler")
+def scheduler_metrics():
+    """Queue depth, running solves, wait times (avg / p50 / p95 / max), budgets and cuts per priority."""
+    return scheduler.metrics()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus text exposition of this worker's metrics."""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/memory")
+def memory_report():
+    """
+    Memory of the worker that answers: RSS, PSS (shared pages split between
+    the processes sharing them), shared and private MB. Compare `shared_mb`
+    across workers to check the preloaded model stays shared.
+    """
+    return {
+        **process_memory(),
+        "preloaded": config.PRELOAD_MODEL,
+        "parent_pid": os.getppid(),
+        "model_version": registry.active.version if registry.active else None,
+    }
+
+
+@app.get("/models")
+def models_status():
+    """Active model version, reload in progress, last reload error and swap history."""
+    return registry.status()
+
+
+def _resolve_model_file(path: Optional[str]) -> Optional[str]:
+    # Only artifacts under MODEL_DIR can be loaded (unpickling runs code).
+    if path is None:
+        return None
+    model_dir = os.path.realpath(config.MODEL_DIR)
+    resolved = os.path.realpath(os.path.join(model_dir, path))
+    if os.path.commonpath([model_dir, resolved]) != model_dir:
+        raise HTTPException(status_code=400, detail=f"'{path}' is outside the model directory")
+    return resolved
+
+
+@app.post("/models/reload", status_code=202)
+def reload_model(req: ModelReloadRequest):
+    """
+    Loads a new model (and its encoders) in the background, validates it on a
+    smoke batch and swaps it in. Requests keep using the current model meanwhile.
+    """
+    model_path = _resolve_model_file(req.model_path)
+    if not os.path.exists(model_path):
+        raise HTTPException(status_code=404, detail=f"Model file '{req.model_path}' not found")
+    started = registry.reload_async(
+        model_path,
+        agg_path=_resolve_model_file(req.agg_path),
+        encoders_path=_resolve_model_file(req.encoders_path),
+        version=req.version
+    )
+    if not started:
+        raise HTTPException(status_code=409, detail="A model reload is already in progress")
+    return {"status": "reloading", "model_path": req.model_path, "active": registry.active.version if registry.active else None}
+
 
 @app.post("/solve")
-async def solve_production_plan(data: ProductionData):
+async def solve_production_plan(data: ProductionData, request: Request,
+                                rendement_mode: Optional[str] = None, prune: Optional[bool] = None,
+                                include_rendements: bool = False, profile: bool = False,
+                                response_format: str = Query("records", alias="format"),
+                                field_paths: Optional[str] = Query(None, alias="fields")):
     """
     This endpoint receives production data, orchestrates the prediction
     and solving process, and returns the final assignment plan.
+
+    Prediction runs in a thread pool and the assignment search in a solver
+    process, so the event loop keeps serving other requests meanwhile. If the
+    client disconnects, the solve is cancelled.
+
+    Solves wait for a slot by `parametres_production.priorite` and their local
+    search gets that priority's time budget; a low-priority solve may be cut
+    short (keeping its best plan so far) when a more urgent one waits. The
+    response's `scheduling` entry reports the wait, run time and any cut.
+
+    `timings` gives the milliseconds spent per phase (queue, prune, features,
+    predict, expand, time_matrix, greedy, local_search, solver_overhead,
+    response, total), also sent as a Server-Timing header.
+
+    `profile=true` (or an `X-Profile: 1` header) profiles this solve when
+    config.PROFILING_ENABLED and the rate limit allow it: a cProfile dump
+    (.prof) and collapsed stacks for flamegraphs (.collapsed) are written to
+    config.PROFILE_DIR and listed in the response's `profile` entry. The
+    X-Profile response header says granted / rate-limited / disabled.
+
+    Identical requests arriving while a solve is in flight (same payload,
+    options and model version) wait for that solve and get its result,
+    marked by an `X-Coalesced: 1` header (config.SOLVE_COALESCING). If
+    admission control refuses that solve, they go through it on their own.
+    Profiled requests always run their own solve.
+
+    Admission control keeps latency bounded at peak: when too many solves
+    wait (config.SCHEDULER_QUEUE_MAX), when this one would wait longer than
+    config.SCHEDULER_MAX_WAIT_S, or when it waited that long, the answer is
+    503; a client (`X-Client-ID` header, else its address) with
+    config.SCHEDULER_CLIENT_MAX solves queued or running gets 429. Both
+    carry a Retry-After estimated from the recent solve durations.
+
+    `rendement_mode=hybrid` takes the observed rendement of known
+    (employee, operation) pairs and only predicts the unseen ones.
+    `prune=true` drops unqualified employees per operation before prediction
+    and solving (defaults to config.PRUNE_CANDIDATES).
+    `include_rendements=true` adds the per-pair `predicted_rendements` list;
+    otherwise the rendement matrix only goes from the predictor to the solver.
+
+    `format=columnar` sends the plan as index arrays (`operations`,
+    `employees`, `assignments.employee` / `assignments.time` per operation,
+    per-employee `emp_loads`, no `emp_ops`) and `predicted_rendements` as
+    one operations x employees matrix: about ten times smaller on big chains.
+    `format=ndjson` streams the response as newline-delimited JSON
+    (application/x-ndjson): a `{"type": "response", ...}` line with
+    everything but the rendements, one line per `predicted_rendements`
+    record as they are serialized, then `{"type": "end", "records": n}`.
+    `fields` keeps (`assignment_plan,timings`) or drops
+    (`-predicted_rendements,-assignment_plan.metrics.emp_ops`) sections by
+    dotted path, in any format.
     """
+    if rendement_mode is not None and rendement_mode not in RENDEMENT_MODES:
+        raise HTTPException(status_code=400, detail=f"rendement_mode must be one of {list(RENDEMENT_MODES)}")
+    if response_format not in RESPONSE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(RESPONSE_FORMATS)}")
+    try:
+        selected_fields = parse_fields(field_paths)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
-        print("--- Received Production Data ---")
         request_data = data.model_dump()
-        print(request_data)
-
-        # 1. Predict Rendement
-        print("\n--- Step 1: Predicting Rendement ---")
-        predicted_rendements = predict_rendement(
-            employees=request_data['employes'],
-            operations=request_data['operations'],
-            chain_name=request_data['chaine']['nom_chaine']
-        )
-        if not predicted_rendements:
-            raise HTTPException(status_code=400, detail="Rendement prediction failed or returned no results.")
-        print(f"Successfully predicted {len(predicted_rendements)} rendements.")
-
-        # 2. Prepare data for the solver
-        gamme_for_solver = [
-            {
-                "idOp": str(op['operation_id']),
-                "ordre": i,
-                "base_time": op['temps_execution']
-            }
-            for i, op in enumerate(request_data['operations'])
-        ]
-        solver_config = {
-            "max_operations_per_emp": request_data['parametres_production']['nbr_op_par_emp'],
-        }
-
-        # 3. Solve the Assignment Problem
-        print("\n--- Step 2: Solving Assignment ---")
-        assignment_result = solve_assignment(
-            gamme=gamme_for_solver,
-            employees=request_data['employes'],
-            predicted_rendement=predicted_rendements,
-            config=solver_config
-        )
-        print("Successfully generated assignment plan.")
-
-        # 4. Return the final result, including predicted_rendements
-        print("\n--- Step 3: Returning Final Plan ---")
-        
-        # Combine assignment results and predicted rendements
-        final_response = {
-            "assignment_plan": assignment_result,
-            "predicted_rendements": predicted_rendements
-        }
-        return final_response
+        logger.info("solve received", extra=fields(
+            operations=len(request_data["operations"]), employees=len(request_data["employes"]),
+            priority=request_data["parametres_production"].get("priorite")))
+        if sampled(logger):
+            logger.info("solve payload", extra=fields(sample=True, payload=summarize(request_data)))
 
+        bundle = _pin_bundle(request)
+
+        collector = decision = None
+        if profile or request.headers.get("x-profile", "").lower() in ("1", "true", "yes"):
+            decision = profile_gate.try_acquire()
+            if decision == "granted":
+                collector = ProfileCollector()
+        solve = partial(scheduler.solve, executor, request_data, bundle, client=_client_id(request),
+                        rendement_mode=rendement_mode, prune=prune, include_rendements=include_rendements,
+                        response_format=response_format)
+        coalesced = False
+        try:
+            if collector is None and config.SOLVE_COALESCING:
+                key = solve_key(request_data, rendement_mode=rendement_mode, prune=prune,
+                                include_rendements=include_rendements, response_format=response_format,
+                                model_version=bundle.version)
+                # the flight goes through admission as its first caller's client: a refusal is not shared
+                final_response, coalesced = await flights.run(key, solve, request.is_disconnected,
+                                                              solo_on=(Overloaded,))
+            else:
+                final_response = await solve(should_cancel=request.is_disconnected, profile=collector)
+            if collector is not None:
+                final_response["profile"] = await asyncio.to_thread(
+                    collector.write, config.PROFILE_DIR, config.PROFILE_KEEP)
+        finally:
+            if collector is not None:
+                profile_gate.release()
+        logger.info("solve done", extra=fields(total_ms=final_response["timings"].get("total"),
+                                               scheduling=final_response.get("scheduling"), coalesced=coalesced))
+        try:
+            body = select_fields(final_response, selected_fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if response_format == "ndjson":
+            matrix = body.get("predicted_rendements")
+            header = {k: v for k, v in body.items() if k != "predicted_rendements"}
+            response = StreamingResponse(
+                ndjson_lines(header, matrix.iter_records(NDJSON_BATCH) if matrix is not None else []),
+                media_type=NDJSON_MEDIA_TYPE)
+        else:
+            # returned as a Response: skips FastAPI's jsonable_encoder pass over the whole plan
+            response = FastJSONResponse(body)
+        response.headers["Server-Timing"] = server_timing_header(final_response["timings"])
+        if decision is not None:
+            response.headers["X-Profile"] = decision
+        if coalesced:
+            response.headers["X-Coalesced"] = "1"
+        return response
+
+    except SolveCancelled:
+        logger.info("client disconnected, solve cancelled")
+        # nobody is listening anymore; 499 = client closed request (nginx convention)
+        return Response(status_code=499)
+    except Overloaded as e:
+        raise _overloaded(e)
+    except SolveError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.exception("solve failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.post("/solve/stream")
+async def solve_production_plan_stream(data: ProductionData, request: Request, rendement_mode: Optional[str] = None,
+                                       prune: Optional[bool] = None, include_rendements: bool = False,
+                                       response_format: str = Query("records", alias="format"),
+                                       field_paths: Optional[str] = Query(None, alias="fields")):
+    """
+    Same solve as /solve, streamed as Server-Sent Events while it runs:
+    `accepted` (stream id and stop URL), `phase`, `milestone` (prediction done,
+    time matrix built, greedy plan with its makespan and balance_index),
+    local search `improvement` / `iteration` (best score, makespan,
+    balance_index), then `result` (the /solve response) or `error`.
+
+    POST /solve/stream/{stream_id}/stop ends the local search early: the
+    stream still ends with a `result`, the best plan found so far.
+    Closing the connection cancels the solve. `format` (records or columnar)
+    and `fields` shape the `result` like they do /solve's response.
+    A solve refused by admission control gets the same 429 / 503 as /solve
+    before the stream opens (or an `error` event if refused while queued).
+    """
+    if rendement_mode is not None and rendement_mode not in RENDEMENT_MODES:
+        raise HTTPException(status_code=400, detail=f"rendement_mode must be one of {list(RENDEMENT_MODES)}")
+    if response_format not in ("records", "columnar"):
+        raise HTTPException(status_code=400, detail="format must be one of ['records', 'columnar']")
+    try:
+        selected_fields = parse_fields(field_paths)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    bundle = _pin_bundle(request)
+
+    request_data = data.model_dump()
+    client = _client_id(request)
+    try:
+        scheduler.check_admission(request_data["parametres_production"].get("priorite"), client)
+    except Overloaded as e:
+        raise _overloaded(e)
+    stream = streams.open()
+
+    async def solve(**callbacks):
+        result = await scheduler.solve(executor, request_data, bundle, client=client, rendement_mode=rendement_mode,
+                                       prune=prune, include_rendements=include_rendements,
+                                       response_format=response_format, **callbacks)
+        try:
+            return select_fields(result, selected_fields)
+        except ValueError as e:
+            raise SolveError(400, str(e))
+
+    async def frames():
+        try:
+            async for frame in stream.run(solve):
+                yield frame
+        finally:
+            streams.close(stream)
+
+    return StreamingResponse(frames(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/solve/stream/{stream_id}/stop", status_code=202)
+def stop_stream(stream_id: str):
+    """Accept the current plan: the local search stops and the stream sends its `result`."""
+    stream = streams.get(stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail=f"Stream '{stream_id}' not found or already finished")
+    stream.stop_requested = True
+    return {"stream_id": stream_id, "stopping": True}
+
+# --- Async solve jobs ---
+
+def _get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+
+def _job_links(job_id: str) -> Dict[str, str]:
+    return {
+        "status": f"/jobs/{job_id}",
+        "progress": f"/jobs/{job_id}/progress",
+        "result": f"/jobs/{job_id}/result",
+    }
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(data: ProductionData, request: Request, response: Response, rendement_mode: Optional[str] = None,
+                     prune: Optional[bool] = None, include_rendements: bool = False):
+    """
+    Queues the same work as /solve and returns a job id right away. Poll
+    /jobs/{id} or /jobs/{id}/progress, then fetch /jobs/{id}/result.
+    """
+    if rendement_mode is not None and rendement_mode not in RENDEMENT_MODES:
+        raise HTTPException(status_code=400, detail=f"rendement_mode must be one of {list(RENDEMENT_MODES)}")
+    try:
+        job = jobs.submit(data.model_dump(), client=_client_id(request), rendement_mode=rendement_mode, prune=prune,
+                          include_rendements=include_rendements)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(scheduler.retry_after_s())})
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return {**job.summary(), "links": _job_links(job.id)}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = _get_job(job_id)
+    return {**job.summary(), "links": _job_links(job.id)}
+
+
+@app.get("/jobs/{job_id}/progress")
+def job_progress(job_id: str):
+    job = _get_job(job_id)
+    return {"job_id": job.id, "status": job.status, **job.progress}
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str, request: Request):
+    """
+    200 with the /solve response once the job is done, 202 with its status
+    while it runs. Both carry an ETag: send it back in If-None-Match to get
+    304 Not Modified until something changed.
+    """
+    job = _get_job(job_id)
+    etag = job.state_etag()
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    if job.status == "done":
+        headers = {"ETag": etag, "Cache-Control": "private, max-age=0"}
+        if job.result.get("timings"):
+            headers["Server-Timing"] = server_timing_header(job.result["timings"])
+        return JSONResponse(job.result, headers=headers)
+    if job.status == "failed":
+        raise HTTPException(status_code=job.error["status_code"], detail=job.error["detail"])
+    if job.status == "cancelled":
+        raise HTTPException(status_code=410, detail="Job was cancelled")
+    return JSONResponse(job.summary(), status_code=202, headers={"ETag": etag, "Retry-After": "1"})
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancels a queued or running job (a running solve stops at its next local search iteration)."""
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job.summary()
+
+
 # To run this API:
 # uvicorn Solver:app --reload
@@ -1,4 +1,5 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import json
@@ -666,6 +667,15 @@ def submit_to_api(chaine_data, employee_ids, selected_operations, params):
             if params.get('priorite'):
                 st.write(f"- **Priorité:** {params['priorite']}")
 
+    # After this many seconds the API stops improving and the current plan is kept
+    max_calc_s = st.number_input(
+        "⏱️ Temps de calcul max (s, 0 = sans limite)",
+        min_value=0,
+        value=0,
+        step=5,
+        help="Au-delà, l'optimisation s'arrête et le meilleur plan trouvé jusque-là est retenu."
+    )
+
     # Submit button
     submit_col1, submit_col2, submit_col3 = st.columns([1, 1, 2])
 
@@ -715,10 +725,28 @@ def submit_to_api(chaine_data, employee_ids, selected_operations, params):
                 }
             }
 
-            # Show loading spinner
-            with st.spinner("Envoi des données à l'API et calcul en cours..."):
+            # Follow the calculation live instead of a spinner
+            with st.status("Envoi des données à l'API et calcul en cours...", expanded=True) as calc_status:
+                live = st.empty()
+
+                def show_progress(event_name, event):
+                    if event_name == "milestone" and event["milestone"] == "prediction":
+                        st.write(f"✅ Rendements prédits: {event['rendements']} ({event['seconds']:.1f} s)")
+                    elif event_name == "milestone" and event["milestone"] == "matrix":
+                        st.write(f"✅ Matrice des temps: {event['operations']} opérations × {event['employees']} employés")
+                    elif event_name == "milestone" and event["milestone"] == "greedy":
+                        st.write(f"✅ Plan initial: makespan {event['makespan']:.2f} mn, "
+                                 f"équilibre {event['balance_index'] * 100:.1f}%")
+                    elif event_name == "improvement":
+                        live.write(f"🔄 Itération {event['iteration']}/{event['max_iter']}: "
+                                   f"makespan {event['makespan']:.2f} mn, équilibre {event['balance_index'] * 100:.1f}%")
+
                 # Send to API
-                result = api_client.send_production_data(api_data)
+                result = api_client.stream_production_data(
+                    api_data, on_event=show_progress, stop_after=max_calc_s or None, response_format="columnar"
+                )
+                calc_status.update(label="Calcul terminé" if result['success'] else "Échec du calcul",
+                                   state="complete" if result['success'] else "error", expanded=False)
 
                 # Store result in session state
                 st.session_state.api_response = result
@@ -729,6 +757,8 @@ def submit_to_api(chaine_data, employee_ids, selected_operations, params):
                     st.session_state.api_response = {"success": True, "data": full_api_data.get('assignment_plan', {})}
                     # Store predicted rendements separately
                     st.session_state.predicted_rendements_data = full_api_data.get('predicted_rendements', [])
+                    # Per-phase calculation times (ms), shown under the results
+                    st.session_state.api_timings = result.get('timings') or {}
                     st.success("✅ Données soumises avec succès!")
                     st.balloons()
                     return True
@@ -742,7 +772,7 @@ def submit_to_api(chaine_data, employee_ids, selected_operations, params):
             clear_keys = ['selected_employees', 'selected_employee_names',
                           'selected_game', 'selected_game_name',
                           'selected_operations', 'all_operations',
-                          'operations_loaded', 'api_response', 'predicted_rendements_data',
+                          'operations_loaded', 'api_response', 'predicted_rendements_data', 'api_timings',
                           'original_op_id_to_time_map'] # Added new key
             for key in clear_keys:
                 if key in st.session_state:
@@ -756,7 +786,7 @@ def submit_to_api(chaine_data, employee_ids, selected_operations, params):
                           'selected_employee_names', 'selected_game',
                           'selected_game_name', 'selected_operations',
                           'all_operations', 'operations_loaded', 'api_response', 'predicted_rendements_data',
-                          'original_op_id_to_time_map'] # Added new key
+                          'api_timings', 'original_op_id_to_time_map'] # Added new key
             for key in clear_keys:
                 if key in st.session_state:
                     del st.session_state[key]
@@ -765,6 +795,36 @@ def submit_to_api(chaine_data, employee_ids, selected_operations, params):
     return False
 
 
+def assignments_frame(plan):
+    """Assignments of a plan, columnar or records format, as an idOp / idEmp / time DataFrame"""
+    if plan.get('format') == 'columnar':
+        employees = plan['employees']
+        return pd.DataFrame({
+            'idOp': plan['operations'],
+            'idEmp': [employees[i] for i in plan['assignments']['employee']],
+            'time': plan['assignments']['time'],
+        })
+    return pd.DataFrame(plan.get('assignments', []))
+
+
+def rendements_frame(rendements):
+    """Predicted rendements, an operations x employees matrix (columnar) or records, as a long DataFrame"""
+    if not isinstance(rendements, dict):
+        return pd.DataFrame(rendements)
+    values = np.array(rendements['values'], dtype=float).T.ravel()  # employee-major, null -> NaN
+    keep = ~np.isnan(values)
+    n_ops, n_emps = len(rendements['operations']), len(rendements['employees'])
+    frame = pd.DataFrame({
+        'idEmp': np.repeat(rendements['employees'], n_ops)[keep],
+        'idOp': np.tile(rendements['operations'], n_emps)[keep],
+        'rendement': values[keep],
+    })
+    if 'observed' in rendements:
+        observed = np.array(rendements['observed'], dtype=bool).T.ravel()[keep]
+        frame['source'] = np.where(observed, 'observed', 'predicted')
+    return frame
+
+
 def display_api_results():
     """Display API response results"""
     if 'api_response' in st.session_state and st.session_state.api_response:
@@ -791,11 +851,22 @@ def display_api_results():
                 help="L'indice d'équilibre mesure la répartition de la charge de travail entre les employés. Un pourcentage plus élevé (proche de 100%) indique une meilleure répartition, tandis qu'un pourcentage plus faible signifie que certains employés sont beaucoup plus occupés que d'autres."
             )
 
+            # Where the calculation time went (per phase, from the API's timings / Server-Timing)
+            timings = st.session_state.get('api_timings', {})
+            if timings:
+                total_ms = timings.get('total', sum(timings.values()))
+                with st.expander(f"⏱️ Temps de calcul: {total_ms / 1000:.2f} s"):
+                    timings_df = pd.DataFrame(
+                        [(phase, ms / 1000) for phase, ms in timings.items() if phase != 'total'],
+                        columns=['Étape', 'Durée (s)']
+                    )
+                    st.bar_chart(timings_df, x='Étape', y='Durée (s)', horizontal=True)
+                    st.dataframe(timings_df.style.format({'Durée (s)': "{:.3f}"}), hide_index=True)
+
             # --- 2. Create and Display the Pivoted Table ---
             st.markdown("### Plan d'Affectation")
-            assignments = data.get('assignments', [])
-            if assignments:
-                assign_df = pd.DataFrame(assignments)
+            assign_df = assignments_frame(data)
+            if not assign_df.empty:
                 pivot_df = assign_df.pivot(index='idOp', columns='idEmp', values='time')
 
                 # --- 3. Sort for Diagonal View ---
@@ -864,7 +935,7 @@ def display_api_results():
             predicted_rendements = st.session_state.get('predicted_rendements_data', [])
 
             if predicted_rendements:
-                rendement_df = pd.DataFrame(predicted_rendements)
+                rendement_df = rendements_frame(predicted_rendements)
                 
                 # Map IDs to Names/Codes for readability
                 emp_map = st.session_state.get('employee_map', {})
@@ -905,7 +976,7 @@ def display_api_results():
 
             with col1:
                 if st.button("📥 Télécharger les Affectations (CSV)", width="stretch"):
-                    csv_data = pd.DataFrame(assignments).to_csv(index=False)
+                    csv_data = assign_df.to_csv(index=False)
                     st.download_button(
                         label="Cliquez pour télécharger",
                         data=csv_data,
@@ -1,9 +1,15 @@
+import logging
 import requests
 import json
+import time
 from datetime import datetime
 from config import config
+from core.logs import get_logger, fields, summarize
+from core.timing import parse_server_timing
 import streamlit as st
 
+logger = get_logger("api_client")
+
 class APIClient:
     def __init__(self):
         self.base_url = config.API_BASE_URL
@@ -22,10 +28,12 @@ class APIClient:
                 "Accept": "application/json"
             }
 
+            # The results page shows the per-pair rendements, ask the solver for them
             response = requests.post(
                 endpoint,
                 json=payload,
                 headers=headers,
+                params={"include_rendements": "true"},
                 timeout=self.timeout
             )
 
@@ -36,6 +44,7 @@ class APIClient:
                 return {
                     "success": True,
                     "data": result,
+                    "timings": result.get("timings") or parse_server_timing(response.headers.get("Server-Timing")),
                     "message": "Calculation completed successfully"
                 }
             else:
@@ -55,10 +64,200 @@ class APIClient:
                 "message": "Invalid response from API"
             }
 
+    # ------------------------------------------------------------
+    # Streamed solve (Server-Sent Events): live progress, early stop
+    # ------------------------------------------------------------
+    def send_production_data_ndjson(self, data, on_rendements=None, batch_size=2000):
+        """
+        /solve with format=ndjson: the plan comes first, then the predicted
+        rendements line by line. on_rendements(records) is called with every
+        `batch_size` records as they arrive, so they can be shown before the
+        last one is received; without it they are collected into
+        data["predicted_rendements"]. Returns the same dict shape as
+        send_production_data.
+        """
+        try:
+            with requests.post(
+                f"{self.base_url}{config.API_ENDPOINT}",
+                json=self._format_payload(data),
+                headers={"Accept": "application/x-ndjson"},
+                params={"include_rendements": "true", "format": "ndjson"},
+                stream=True,
+                timeout=self.timeout
+            ) as response:
+                response.raise_for_status()
+                result, batch, collected = None, [], []
+                emit = on_rendements or collected.extend
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    kind = record.pop("type", None)
+                    if kind == "response":
+                        result = record
+                    elif kind == "end":
+                        break
+                    else:
+                        batch.append(record)
+                        if len(batch) >= batch_size:
+                            emit(batch)
+                            batch = []
+                if batch:
+                    emit(batch)
+                if result is None:
+                    return {"success": False, "message": "Response ended before the plan"}
+                result["predicted_rendements"] = None if on_rendements else collected
+                return {
+                    "success": True,
+                    "data": result,
+                    "timings": result.get("timings") or parse_server_timing(response.headers.get("Server-Timing")),
+                    "message": "Calculation completed successfully"
+                }
+        except requests.exceptions.RequestException as e:
+            return {"success": False, "message": f"API request failed: {str(e)}"}
+
+    def stream_production_data(self, data, on_event=None, stop_after=None, include_rendements=True,
+                               response_format="records"):
+        """
+        Send production data to /solve/stream and follow the solve live.
+        on_event(event_name, event_dict) is called for every server event
+        (phase, milestone, improvement, ...). After `stop_after` seconds the
+        current plan is accepted: the server stops the local search and sends
+        its best plan. Returns the same dict shape as send_production_data.
+        response_format="columnar" asks for the compact plan and rendement matrix.
+        """
+        started = time.time()
+        stream_id = None
+        stop_sent = False
+        try:
+            with requests.post(
+                f"{self.base_url}{config.API_ENDPOINT}/stream",
+                json=self._format_payload(data),
+                headers={"Accept": "text/event-stream"},
+                params={"include_rendements": str(include_rendements).lower(), "format": response_format},
+                stream=True,
+                timeout=self.timeout
+            ) as response:
+                response.raise_for_status()
+                for event_name, event in self._iter_sse(response):
+                    if event_name == "accepted":
+                        stream_id = event["stream_id"]
+                    elif event_name == "result":
+                        return {"success": True, "data": event, "timings": event.get("timings"),
+                                "message": "Calculation completed successfully"}
+                    elif event_name == "error":
+                        return {"success": False, "message": f"API returned status {event['status_code']}: {event['detail']}"}
+                    if on_event is not None and event_name is not None:
+                        on_event(event_name, event)
+                    if stop_after is not None and not stop_sent and stream_id and time.time() - started > stop_after:
+                        self.stop_stream(stream_id)
+                        stop_sent = True
+            return {"success": False, "message": "Stream ended without a result"}
+        except requests.exceptions.RequestException as e:
+            return {"success": False, "message": f"API request failed: {str(e)}"}
+
+    def stop_stream(self, stream_id):
+        """Accept the current plan of a streamed solve"""
+        try:
+            requests.post(f"{self.base_url}{config.API_ENDPOINT}/stream/{stream_id}/stop", timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            logger.warning("could not stop stream %s: %s", stream_id, e)
+
+    @staticmethod
+    def _iter_sse(response):
+        """(event name, parsed data) pairs from a text/event-stream response; (None, None) for keep-alives"""
+        event_name, data_lines = None, []
+        for line in response.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            if line == "":
+                if data_lines:
+                    yield event_name, json.loads("\n".join(data_lines))
+                event_name, data_lines = None, []
+            elif line.startswith(":"):
+                yield None, None
+            elif line.startswith("event:"):
+                event_name = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[len("data:"):].strip())
+
+    # ------------------------------------------------------------
+    # Async solve jobs: no HTTP request stays open during a long solve
+    # ------------------------------------------------------------
+    def submit_production_job(self, data, include_rendements=True):
+        """Submit production data as a job; returns {"success", "job_id", ...}"""
+        try:
+            response = requests.post(
+                f"{self.base_url}/jobs",
+                json=self._format_payload(data),
+                params={"include_rendements": str(include_rendements).lower()},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            job = response.json()
+            return {"success": True, "job_id": job["job_id"], "data": job, "message": "Job submitted"}
+        except requests.exceptions.RequestException as e:
+            return {"success": False, "message": f"Job submission failed: {str(e)}"}
+
+    def get_job_status(self, job_id):
+        """Status and progress of a job"""
+        response = requests.get(f"{self.base_url}/jobs/{job_id}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get_job_result(self, job_id, etag=None):
+        """
+        Poll a job's result. Returns (status_code, body, etag): 200 with the
+        plan, 202 with the job status while it runs, 304 (body None) if
+        nothing changed since `etag`.
+        """
+        headers = {"If-None-Match": etag} if etag else {}
+        response = requests.get(f"{self.base_url}/jobs/{job_id}/result", headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return 304, None, etag
+        response.raise_for_status()
+        return response.status_code, response.json(), response.headers.get("ETag")
+
+    def cancel_job(self, job_id):
+        """Cancel a queued or running job"""
+        response = requests.delete(f"{self.base_url}/jobs/{job_id}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def wait_for_job(self, job_id, poll_interval=1.0, max_wait=None, on_progress=None):
+        """
+        Poll a job until it finishes, with conditional requests so unchanged
+        polls are cheap. on_progress(status_dict) is called on each change.
+        Returns the same dict shape as send_production_data.
+        """
+        started = time.time()
+        etag = None
+        while True:
+            try:
+                status_code, body, etag = self.get_job_result(job_id, etag)
+            except requests.exceptions.RequestException as e:
+                return {"success": False, "job_id": job_id, "message": f"Job failed: {str(e)}"}
+            if status_code == 200:
+                return {"success": True, "job_id": job_id, "data": body, "timings": body.get("timings"),
+                        "message": "Calculation completed successfully"}
+            if status_code == 202 and on_progress is not None:
+                on_progress(body)
+            if max_wait is not None and time.time() - started > max_wait:
+                return {"success": False, "job_id": job_id, "message": f"Job still running after {max_wait}s"}
+            time.sleep(poll_interval)
+
+    def send_production_data_as_job(self, data, poll_interval=1.0, max_wait=None, on_progress=None):
+        """Same result as send_production_data, through the job API (for solves longer than API_TIMEOUT)"""
+        submitted = self.submit_production_job(data)
+        if not submitted["success"]:
+            return submitted
+        return self.wait_for_job(submitted["job_id"], poll_interval, max_wait, on_progress)
+
     def _format_payload(self, data):
         """Format data according to API requirements"""
         # Adjust this based on your API's expected format
-        print(data)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("production payload", extra=fields(payload=summarize(data)))
         payload = {
             "metadata": data.get("metadata", {}),
             "chaine": data.get("chaine", {}),
@@ -1,9 +1,10 @@
 import streamlit as st
 import pandas as pd
-import pickle
+import io
 import os
-from core.models import load_model, predict
-from core.preprocessing import preprocess_data
+from config import config
+from core.models import load_model
+from core.batch import BatchStats, iter_predictions, DEFAULT_CHUNKSIZE
 
 # Page config
 st.set_page_config(
@@ -19,10 +20,15 @@ st.markdown("---")
 # Sidebar for navigation/configuration
 with st.sidebar:
     st.header("⚙️ Settings")
+    model_files = sorted(
+        f for f in os.listdir(config.MODEL_DIR) if f.endswith((".pkl", ".onnx", ".trees.npz"))
+    )
     model_choice = st.selectbox(
         "Select Model",
-        ["Model 1", "Model 2", "Model 3"]
+        model_files,
+        index=model_files.index(config.MODEL_PATH) if config.MODEL_PATH in model_files else 0
     )
+    chunksize = st.number_input("Rows per chunk", min_value=1000, value=DEFAULT_CHUNKSIZE, step=10000)
 
     uploaded_file = st.file_uploader(
         "Upload CSV File",
@@ -37,30 +43,40 @@ with tab1:
     st.header("Make Predictions")
 
     if uploaded_file is not None:
-        # Load and display data
-        df = pd.read_csv(uploaded_file)
+        # Preview only; the prediction reads the file chunk by chunk
+        df = pd.read_csv(uploaded_file, nrows=5)
+        uploaded_file.seek(0)
         st.write("### Uploaded Data Preview")
-        st.dataframe(df.head())
-
-        # Preprocess
-        processed_df = preprocess_data(df)
+        st.dataframe(df)
 
         # Make predictions
         if st.button("🚀 Run Predictions", type="primary"):
             with st.spinner("Making predictions..."):
-                model = load_model(model_choice)
-                predictions = predict(model, processed_df)
+                model = load_model(os.path.join(config.MODEL_DIR, model_choice))
+                stats = BatchStats()
+                output = io.StringIO()
+                progress = st.empty()
+                preview = None
+                try:
+                    for chunk in iter_predictions(uploaded_file, model, int(chunksize), stats=stats):
+                        chunk.to_csv(output, header=stats.chunks == 1, index=False)
+                        if preview is None:
+                            preview = chunk.head(1000)
+                        progress.text(f"{stats.rows:,} rows scored ({stats.rows_per_s:,.0f} rows/s)")
+                except ValueError as e:
+                    st.error(str(e))
+                    st.stop()
 
                 # Display results
-                st.success("Predictions Complete!")
+                st.success(f"Predictions Complete! {stats.rows:,} rows in {stats.elapsed_s:.2f}s "
+                           f"({stats.rows_per_s:,.0f} rows/s, model {model.version})")
                 st.write("### Results")
-                st.dataframe(predictions)
+                st.dataframe(preview)
 
                 # Download button
-                csv = predictions.to_csv(index=False)
                 st.download_button(
                     label="📥 Download Predictions",
-                    data=csv,
+                    data=output.getvalue(),
                     file_name="predictions.csv",
                     mime="text/csv"
                 )
@@ -27,6 +27,79 @@ class Config:
     API_ENDPOINT = os.getenv("API_ENDPOINT", "/solve")
     API_TIMEOUT = int(os.getenv("API_TIMEOUT", "30"))
 
+    # Model configuration
+    MODEL_PATH = os.getenv("MODEL_PATH", "equilibrage_model_XGBRegressorMtest.pkl")
+    AGG_PATH = os.getenv("AGG_PATH", "input/agg.csv")
+    ENCODERS_PATH = os.getenv("ENCODERS_PATH", "input/encoders.npz")
+    # Directory that /models/reload may load artifacts from
+    MODEL_DIR = os.getenv("MODEL_DIR", ".")
+    # Prediction backend: "inplace" (Booster.inplace_predict), "sklearn" (XGBRegressor.predict)
+    # or "numpy" (trees exported to NumPy arrays, see core/tree_eval.py). MODEL_PATH ending in
+    # .onnx (scripts/export_onnx.py) or .trees.npz always uses the "onnx" / "numpy" backend.
+    PREDICT_BACKEND = os.getenv("PREDICT_BACKEND", "inplace")
+    # "model": predict every (employee, operation) pair; "hybrid": use the observed
+    # avg_rendement from agg.csv when the pair has HISTORY_MIN_SAMPLES samples, predict the rest
+    RENDEMENT_MODE = os.getenv("RENDEMENT_MODE", "model")
+    HISTORY_MIN_SAMPLES = int(os.getenv("HISTORY_MIN_SAMPLES", "1"))
+    # Candidate pruning: per operation keep employees with history on the operation (observed
+    # rendement >= PRUNE_MIN_RENDEMENT) or on its usual machine, plus the PRUNE_MIN_CANDIDATES best
+    PRUNE_CANDIDATES = os.getenv("PRUNE_CANDIDATES", "false").lower() in ("1", "true", "yes")
+    PRUNE_MIN_CANDIDATES = int(os.getenv("PRUNE_MIN_CANDIDATES", "3"))
+    PRUNE_MIN_RENDEMENT = float(os.getenv("PRUNE_MIN_RENDEMENT", "0"))
+    # Threads per prediction call; keep low when several requests predict concurrently (0 = xgboost default)
+    PREDICT_NTHREAD = int(os.getenv("PREDICT_NTHREAD", "1"))
+    # Load the model when Solver.py is imported, i.e. in the gunicorn master with --preload,
+    # so forked workers share it copy-on-write (see gunicorn.conf.py)
+    PRELOAD_MODEL = os.getenv("PRELOAD_MODEL", "false").lower() in ("1", "true", "yes")
+    # /solve execution: local search in SOLVER_PROCESSES processes (0 = in threads), pruning and
+    # prediction in PREDICT_THREADS threads of the API process. Each API process (gunicorn worker,
+    # WEB_CONCURRENCY of them) has its own pool, so the default splits the cores between them
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+    SOLVER_PROCESSES = int(os.getenv("SOLVER_PROCESSES", str(max(1, (os.cpu_count() or 1) // max(1, WEB_CONCURRENCY)))))
+    PREDICT_THREADS = int(os.getenv("PREDICT_THREADS", "4"))
+    SOLVER_START_METHOD = os.getenv("SOLVER_START_METHOD", "spawn")
+    # Priority scheduler in front of the solver (/solve and /jobs, by parametres_production.priorite):
+    # solves running at once, local search time budget per priority ("" = no budget), priorities
+    # whose running solves get cut short when a higher one waits, and their minimum run time
+    SCHEDULER_CAPACITY = int(os.getenv("SCHEDULER_CAPACITY", str(max(SOLVER_PROCESSES, 1))))
+    PRIORITY_BUDGETS_S = os.getenv("PRIORITY_BUDGETS_S", "Urgente:60,Haute:45,Moyenne:30,Basse:15")
+    PREEMPTIBLE_PRIORITIES = os.getenv("PREEMPTIBLE_PRIORITIES", "Moyenne,Basse")
+    PREEMPT_AFTER_S = float(os.getenv("PREEMPT_AFTER_S", "2"))
+    # Admission control of /solve and /solve/stream (0 = unlimited): solves waiting before new ones
+    # get 503, longest wait in the queue (new solves expected to wait longer are refused right away),
+    # and solves queued or running per client (X-Client-ID header, else client address) before 429
+    SCHEDULER_QUEUE_MAX = int(os.getenv("SCHEDULER_QUEUE_MAX", "32"))
+    SCHEDULER_MAX_WAIT_S = float(os.getenv("SCHEDULER_MAX_WAIT_S", "120"))
+    SCHEDULER_CLIENT_MAX = int(os.getenv("SCHEDULER_CLIENT_MAX", "8"))
+    # Identical concurrent /solve requests (same payload, options and model) share one solve
+    SOLVE_COALESCING = os.getenv("SOLVE_COALESCING", "true").lower() in ("1", "true", "yes")
+    # Async solve jobs (/jobs): max waiting jobs, how long finished jobs are kept,
+    # and an optional SQLite file to keep finished jobs across restarts ("" = memory only)
+    JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "100"))
+    JOB_TTL_S = float(os.getenv("JOB_TTL_S", "3600"))
+    JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "")
+    # Opt-in /solve profiling (X-Profile: 1 header or ?profile=true): off unless PROFILING_ENABLED,
+    # at most one profile per PROFILE_MIN_INTERVAL_S, the newest PROFILE_KEEP kept in PROFILE_DIR
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_MIN_INTERVAL_S = float(os.getenv("PROFILE_MIN_INTERVAL_S", "60"))
+    PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+    # Logging: level, "json" (one object per line) or "text", share of requests whose detailed
+    # records (payload summaries, step details) are kept, max JSON size of a payload summary,
+    # and records waiting for the writer thread before new ones are dropped
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+    LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    # Incremental agg/encoder refresh (scripts/refresh_encoders.py): production records table,
+    # its increasing id column (the watermark) and the running aggregate state file
+    PRODUCTION_TABLE = os.getenv("PRODUCTION_TABLE", "production")
+    PRODUCTION_ID_COLUMN = os.getenv("PRODUCTION_ID_COLUMN", "id")
+    AGG_STATE_PATH = os.getenv("AGG_STATE_PATH", "input/agg_state.npz")
+    REFRESH_BATCH_SIZE = int(os.getenv("REFRESH_BATCH_SIZE", "5000"))
+
     # App configuration
     PAGE_TITLE = "Production Planning System"
     PAGE_ICON = "🏭"
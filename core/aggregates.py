@@ -0,0 +1,273 @@
+import os
+import numpy as np
+import pandas as pd
+from collections import Counter
+from typing import Dict, Iterable, Any, Optional, Tuple
+
+from core.encoders import ENCODED_COLUMNS, PAIR_COUNT_COLUMN, Encoders, PairIndex, TargetEncoder, pair_keys
+
+# ------------------------------------------------------------
+# Incremental agg features / target encoders
+# ------------------------------------------------------------
+# The encoders are means over (employee, operation) pairs of the pair's
+# avg_rendement (see Encoders.from_agg). Each category key therefore keeps a
+# running (count, sum) of the pair means it covers, and every pair keeps
+# running (count, sum) over its production records. Folding a record moves
+# the pair's mean and applies only the delta to its four keys.
+STATE_VERSION = 1
+WATERMARK_SUFFIX = ".watermark"  # next to an agg.csv: last production record id it aggregates
+KEY_NAMES = list(ENCODED_COLUMNS.values())  # emp, op, machine, chain
+
+
+class PairStats:
+    __slots__ = ("count", "sum_rendement", "sum_temps", "machines", "chains")
+
+    def __init__(self):
+        self.count = 0
+        self.sum_rendement = 0.0
+        self.sum_temps = 0.0
+        self.machines = Counter()
+        self.chains = Counter()
+
+    @property
+    def mean(self) -> float:
+        return self.sum_rendement / self.count
+
+    @property
+    def machine(self):
+        return self.machines.most_common(1)[0][0] if self.machines else None
+
+    @property
+    def chain(self):
+        return self.chains.most_common(1)[0][0] if self.chains else None
+
+
+class RunningAggregates:
+    """
+    Running state behind agg.csv and the target encoders, updated record by
+    record from production data past `watermark`.
+    """
+
+    def __init__(self):
+        self.pairs: Dict[Tuple[int, int], PairStats] = {}
+        # key state: name -> {category value: [n_pairs, sum_of_pair_means]}
+        self.keys: Dict[str, Dict[Any, list]] = {name: {} for name in KEY_NAMES}
+        self.watermark = 0
+        self.records_folded = 0
+
+    # -------------------- key bookkeeping --------------------
+    def _add(self, name: str, value, mean: float):
+        if value is None:
+            return
+        state = self.keys[name].setdefault(value, [0, 0.0])
+        state[0] += 1
+        state[1] += mean
+
+    def _remove(self, name: str, value, mean: float):
+        if value is None:
+            return
+        state = self.keys[name][value]
+        state[0] -= 1
+        state[1] -= mean
+        if state[0] == 0:
+            del self.keys[name][value]
+
+    def _pair_keys(self, pair_id: Tuple[int, int], stats: PairStats):
+        return {"emp": pair_id[0], "op": pair_id[1], "machine": stats.machine, "chain": stats.chain}
+
+    # -------------------- updates --------------------
+    def fold_record(self, emp_id: int, op_id: int, temps: float, rendement: float, machine=None, chain=None,
+                    weight: int = 1):
+        """Adds `weight` production records of one (employee, operation) pair."""
+        pair_id = (int(emp_id), int(op_id))
+        stats = self.pairs.get(pair_id)
+        if stats is None:
+            stats = self.pairs[pair_id] = PairStats()
+            before = None
+        else:
+            before = (stats.mean, self._pair_keys(pair_id, stats))
+
+        stats.count += weight
+        stats.sum_rendement += float(rendement) * weight
+        stats.sum_temps += float(temps) * weight
+        if machine is not None:
+            stats.machines[machine] += weight
+        if chain is not None:
+            stats.chains[chain] += weight
+
+        if before is not None:
+            for name, value in before[1].items():
+                self._remove(name, value, before[0])
+        for name, value in self._pair_keys(pair_id, stats).items():
+            self._add(name, value, stats.mean)
+
+    def fold(self, records: Iterable[Dict[str, Any]], watermark_field: str = "record_id") -> int:
+        """
+        Folds production records (dicts with IDEmploye, IDOperation, temps,
+        rendement, machine, chain and the watermark field) into the state.
+
+        Records without rendement or temps are skipped, but still move the
+        watermark: they are never read again.
+
+        Returns:
+            The number of records folded.
+        """
+        n = 0
+        for rec in records:
+            self.watermark = max(self.watermark, int(rec[watermark_field]))
+            if rec.get("rendement") is None or rec.get("temps") is None:
+                continue
+            self.fold_record(rec["IDEmploye"], rec["IDOperation"], float(rec["temps"]), float(rec["rendement"]),
+                             _category(rec.get("machine")), _category(rec.get("chain")))
+            n += 1
+        self.records_folded += n
+        return n
+
+    @classmethod
+    def from_agg(cls, agg_df: pd.DataFrame, watermark: int = 0) -> "RunningAggregates":
+        """
+        Seeds the state from an agg.csv snapshot. Each row becomes one pair
+        weighted by its n_records column (or 1 if there is none). Records
+        folded afterwards only move the means correctly with n_records, and
+        only if `watermark` is the last record the snapshot aggregates (see
+        read_agg_watermark); scripts/refresh_encoders.py requires both.
+        """
+        state = cls()
+        counts = agg_df[PAIR_COUNT_COLUMN] if PAIR_COUNT_COLUMN in agg_df.columns else pd.Series(1, index=agg_df.index)
+        for emp, op, temps, rend, machine, chain, count in zip(
+                agg_df["IDEmploye"], agg_df["IDOperation"], agg_df["avg_temps"], agg_df["avg_rendement"],
+                agg_df["most_used_machine"], agg_df["most_used_chain"], counts):
+            state.fold_record(emp, op, temps, rend, _category(machine), _category(chain), int(count))
+        state.watermark = watermark
+        return state
+
+    # -------------------- publishing --------------------
+    def to_encoders(self, source_digest: str = "") -> Encoders:
+        """Encoders straight from the running key state, no groupby over the pairs."""
+        encoders = {}
+        for name in KEY_NAMES:
+            items = sorted(self.keys[name].items(), key=lambda kv: kv[0])
+            keys = np.array([k for k, _ in items])
+            means = np.array([s / n for _, (n, s) in items], dtype=np.float64)
+            encoders[name] = TargetEncoder(keys, means, float(means.mean()) if len(means) else 0.0)
+        agg = self.to_agg_frame()
+        pairs = PairIndex(pair_keys(agg["IDEmploye"], agg["IDOperation"]), agg["avg_rendement"].to_numpy(),
+                          agg[PAIR_COUNT_COLUMN].to_numpy(),
+                          pd.to_numeric(agg["most_used_machine"], errors="coerce").fillna(-1).to_numpy())
+        return Encoders(encoders, pairs, source_digest)
+
+    def to_agg_frame(self) -> pd.DataFrame:
+        """The state in agg.csv layout (plus the n_records column)."""
+        rows = [
+            (emp, op, s.sum_temps / s.count, s.mean, s.machine, s.chain, s.count)
+            for (emp, op), s in self.pairs.items()
+        ]
+        return pd.DataFrame(rows, columns=["IDEmploye", "IDOperation", "avg_temps", "avg_rendement",
+                                           "most_used_machine", "most_used_chain", PAIR_COUNT_COLUMN])
+
+    def publish(self, agg_path: str, encoders_path: str) -> Encoders:
+        """
+        Writes the refreshed agg.csv, its watermark file (when the state has
+        folded production records, i.e. watermark > 0) and the matching
+        encoder artifact.
+        """
+        from core.encoders import file_digest
+
+        tmp_path = f"{agg_path}.tmp"
+        self.to_agg_frame().to_csv(tmp_path, index=False)
+        os.replace(tmp_path, agg_path)
+        write_agg_watermark(agg_path, self.watermark)
+        encoders = self.to_encoders(file_digest(agg_path))
+        encoders.save(encoders_path)
+        return encoders
+
+    # -------------------- persistence --------------------
+    def save(self, path: str):
+        pair_ids = list(self.pairs)
+        machine_rows = [(i, m, c) for i, p in enumerate(pair_ids) for m, c in self.pairs[p].machines.items()]
+        chain_rows = [(i, ch, c) for i, p in enumerate(pair_ids) for ch, c in self.pairs[p].chains.items()]
+        stats = [self.pairs[p] for p in pair_ids]
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            state_version=np.array(STATE_VERSION),
+            watermark=np.array(self.watermark),
+            records_folded=np.array(self.records_folded),
+            pair_emp=np.array([p[0] for p in pair_ids], dtype=np.int64),
+            pair_op=np.array([p[1] for p in pair_ids], dtype=np.int64),
+            pair_count=np.array([s.count for s in stats], dtype=np.int64),
+            pair_sum_rendement=np.array([s.sum_rendement for s in stats]),
+            pair_sum_temps=np.array([s.sum_temps for s in stats]),
+            machine_rows=np.array(machine_rows, dtype=np.int64).reshape(-1, 3),
+            chain_rows=np.array(chain_rows, dtype=np.int64).reshape(-1, 3),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RunningAggregates":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["state_version"]) != STATE_VERSION:
+                raise ValueError(f"Unsupported aggregate state version in {path}")
+            pair_ids = list(zip(data["pair_emp"].tolist(), data["pair_op"].tolist()))
+            stats = []
+            for count, sum_rend, sum_temps in zip(data["pair_count"].tolist(), data["pair_sum_rendement"].tolist(),
+                                                  data["pair_sum_temps"].tolist()):
+                s = PairStats()
+                s.count, s.sum_rendement, s.sum_temps = count, sum_rend, sum_temps
+                stats.append(s)
+            for i, machine, count in data["machine_rows"].tolist():
+                stats[i].machines[machine] = count
+            for i, chain, count in data["chain_rows"].tolist():
+                stats[i].chains[chain] = count
+            state = cls()
+            state.watermark = int(data["watermark"])
+            state.records_folded = int(data["records_folded"])
+
+        for pair_id, s in zip(pair_ids, stats):
+            state.pairs[pair_id] = s
+            for name, value in state._pair_keys(pair_id, s).items():
+                state._add(name, value, s.mean)
+        return state
+
+
+def read_agg_watermark(agg_path: str) -> Optional[int]:
+    """The watermark stored next to an agg.csv, or None if unknown."""
+    try:
+        with open(agg_path + WATERMARK_SUFFIX) as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_agg_watermark(agg_path: str, watermark: int):
+    # a watermark of 0 means the aggregates do not come from the production table: leave it unknown
+    path = agg_path + WATERMARK_SUFFIX
+    if watermark <= 0:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(f"{path}.tmp", "w") as f:
+        f.write(f"{watermark}\n")
+    os.replace(f"{path}.tmp", path)
+
+
+def _category(value) -> Optional[int]:
+    """Machine/chain ids as ints (as in agg.csv); missing values -> None."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return int(value)
+
+
+if __name__ == "__main__":
+    # python -m core.aggregates : self-check of fold() on synthetic records
+    def record(record_id, rendement, temps=1.0):
+        return {"record_id": record_id, "IDEmploye": 1, "IDOperation": 2, "temps": temps, "rendement": rendement,
+                "machine": 3, "chain": 4}
+
+    state = RunningAggregates()
+    assert state.fold([record(1, None), record(2, 0.8, None)]) == 0
+    assert state.watermark == 2, "a batch of null records must still move the watermark"
+    assert state.fold([record(3, 0.5), record(4, None)]) == 1
+    assert state.watermark == 4 and state.records_folded == 1
+    assert state.pairs[(1, 2)].mean == 0.5
+    print("fold: ok")
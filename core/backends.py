@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+# ------------------------------------------------------------
+# Prediction backends for the rendement model
+# ------------------------------------------------------------
+# Same feature names/order as model training
+FEATURE_COLUMNS = [
+    "IDEmploye_encoded",
+    "IDOperation_encoded",
+    "avg_temps",
+    "most_used_machine_encoded",
+    "most_used_chain_encoded"
+]
+
+
+class SklearnBackend:
+    """Original path: XGBRegressor.predict on a DataFrame (feature-name validation + DMatrix per call)."""
+    name = "sklearn"
+
+    def __init__(self, model, nthread: Optional[int] = None):
+        self.model = model
+        if nthread:
+            self.model.set_params(n_jobs=nthread)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.model.predict(pd.DataFrame(X, columns=FEATURE_COLUMNS))
+
+
+class InplaceBackend:
+    """Booster.inplace_predict on a contiguous float32 array, no DMatrix and no pandas."""
+    name = "inplace"
+
+    def __init__(self, model, nthread: Optional[int] = None):
+        self.booster = model.get_booster() if hasattr(model, "get_booster") else model
+        if nthread:
+            self.booster.set_param({"nthread": int(nthread)})
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.booster.inplace_predict(X, validate_features=False)
+
+
+class NumpyBackend:
+    """
+    Trees exported to NumPy node arrays and walked level by level (core.tree_eval).
+    No xgboost call per request; fastest when the per-call overhead dominates (small grids).
+    """
+    name = "numpy"
+
+    def __init__(self, model, nthread: Optional[int] = None):
+        from core.tree_eval import TreeEnsemble
+        self.ensemble = model if isinstance(model, TreeEnsemble) else TreeEnsemble.from_booster(model)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.ensemble.predict(X)
+
+
+class OnnxModel:
+    """An .onnx rendement model opened with onnxruntime (CPU)."""
+
+    def __init__(self, path: str, nthread: Optional[int] = None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The 'onnx' backend needs onnxruntime: pip install onnxruntime")
+        options = ort.SessionOptions()
+        if nthread:
+            options.intra_op_num_threads = int(nthread)
+            options.inter_op_num_threads = 1
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+
+class OnnxBackend:
+    """onnxruntime TreeEnsembleRegressor; serving needs onnxruntime but not xgboost."""
+    name = "onnx"
+
+    def __init__(self, model, nthread: Optional[int] = None):
+        if not isinstance(model, OnnxModel):
+            raise ValueError("The 'onnx' backend needs an .onnx model file (see scripts/export_onnx.py)")
+        self.model = model
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.model.session.run(None, {self.model.input_name: X})[0].ravel()
+
+
+BACKENDS = {
+    SklearnBackend.name: SklearnBackend,
+    InplaceBackend.name: InplaceBackend,
+    NumpyBackend.name: NumpyBackend,
+    OnnxBackend.name: OnnxBackend,
+}
+
+# Artifacts that can only be served by one backend
+ARTIFACT_BACKENDS = {
+    ".onnx": OnnxBackend.name,
+    ".trees.npz": NumpyBackend.name,
+}
+
+
+def artifact_backend(model_path: str) -> Optional[str]:
+    """Backend forced by the artifact type, or None for a pickled XGBRegressor."""
+    for suffix, name in ARTIFACT_BACKENDS.items():
+        if model_path.endswith(suffix):
+            return name
+    return None
+
+
+def load_model_artifact(model_path: str, nthread: Optional[int] = None):
+    """
+    Loads a model artifact: .onnx (onnxruntime), .trees.npz (NumPy trees) or a
+    joblib pickle of the XGBRegressor. Only the pickle needs xgboost installed.
+    """
+    if model_path.endswith(".onnx"):
+        return OnnxModel(model_path, nthread)
+    if model_path.endswith(".trees.npz"):
+        from core.tree_eval import TreeEnsemble
+        return TreeEnsemble.load(model_path)
+    import joblib
+    return joblib.load(model_path)
+
+
+def make_backend(name: str, model, nthread: Optional[int] = None):
+    """Builds the prediction backend `name` around a loaded XGBRegressor."""
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown prediction backend '{name}', expected one of {sorted(BACKENDS)}")
+    return backend_cls(model, nthread=nthread)
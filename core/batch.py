@@ -0,0 +1,128 @@
+import os
+import time
+import pandas as pd
+from typing import Iterator, Optional, Dict, Any
+
+from core.models import predict
+from core.preprocessing import preprocess_data, resolve_input_columns
+
+# ------------------------------------------------------------
+# Chunked batch prediction: CSV in, CSV/Parquet out
+# ------------------------------------------------------------
+PREDICTION_COLUMN = "predicted_rendement"
+DEFAULT_CHUNKSIZE = 50000
+
+
+class BatchStats:
+    """Running row count and throughput of a batch prediction."""
+
+    def __init__(self):
+        self.rows = 0
+        self.chunks = 0
+        self.started = time.perf_counter()
+        self.predict_s = 0.0
+
+    @property
+    def elapsed_s(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_s(self) -> float:
+        return self.rows / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "chunks": self.chunks,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "predict_s": round(self.predict_s, 3),
+            "rows_per_s": round(self.rows_per_s),
+        }
+
+
+def iter_predictions(source, bundle, chunksize: int = DEFAULT_CHUNKSIZE, keep_columns: bool = True,
+                     stats: Optional[BatchStats] = None) -> Iterator[pd.DataFrame]:
+    """
+    Reads a CSV (path or file object) `chunksize` rows at a time and yields each
+    chunk with a predicted_rendement column. Only one chunk is in memory.
+
+    Args:
+        keep_columns: Keep every input column; otherwise only the model inputs.
+        stats: Updated after each chunk (rows, throughput).
+    """
+    columns = None
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        if columns is None:
+            columns = resolve_input_columns(chunk.columns)
+        t0 = time.perf_counter()
+        predicted = predict(bundle, preprocess_data(chunk, bundle.encoders, columns))
+        if not keep_columns:
+            chunk = chunk[[c for c in columns.values() if c is not None]]
+        chunk = chunk.assign(**{PREDICTION_COLUMN: predicted})
+        if stats is not None:
+            stats.predict_s += time.perf_counter() - t0
+            stats.rows += len(chunk)
+            stats.chunks += 1
+        yield chunk
+
+
+class ChunkWriter:
+    """Appends DataFrame chunks to one CSV or Parquet file (chosen by extension)."""
+
+    def __init__(self, out_path: str, fmt: Optional[str] = None):
+        self.out_path = out_path
+        self.fmt = fmt or ("parquet" if out_path.endswith((".parquet", ".pq")) else "csv")
+        self._writer = None
+        self._schema = None
+        self._wrote_header = False
+
+    def write(self, chunk: pd.DataFrame):
+        if self.fmt == "parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("Parquet output needs pyarrow (pip install pyarrow), or write to .csv") from e
+            table = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                self._writer = pq.ParquetWriter(self.out_path, self._schema)
+            self._writer.write_table(table)
+        else:
+            chunk.to_csv(self.out_path, mode="a" if self._wrote_header else "w",
+                         header=not self._wrote_header, index=False)
+            self._wrote_header = True
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def predict_csv(in_path: str, out_path: str, bundle, chunksize: int = DEFAULT_CHUNKSIZE,
+                fmt: Optional[str] = None, keep_columns: bool = True, progress=None) -> Dict[str, Any]:
+    """
+    Scores a CSV file chunk by chunk into `out_path` (.parquet or .csv).
+    The output is written to a temporary file and renamed when complete.
+
+    Args:
+        progress: Optional callable receiving the BatchStats after each chunk.
+
+    Returns:
+        BatchStats.to_dict() of the run.
+    """
+    stats = BatchStats()
+    tmp_path = f"{out_path}.tmp"
+    with ChunkWriter(tmp_path, fmt or ("parquet" if out_path.endswith((".parquet", ".pq")) else "csv")) as writer:
+        for chunk in iter_predictions(in_path, bundle, chunksize, keep_columns, stats):
+            writer.write(chunk)
+            if progress is not None:
+                progress(stats)
+    os.replace(tmp_path, out_path)
+    return stats.to_dict()
@@ -0,0 +1,87 @@
+import asyncio
+import hashlib
+import json
+from typing import Dict, Any, Callable, Awaitable, List, Optional, Tuple, Type
+
+from core.metrics import COALESCED_SOLVES
+
+# ------------------------------------------------------------
+# Single-flight coalescing of identical concurrent /solve requests
+# ------------------------------------------------------------
+# A double-clicked button, or several planners sending the same chain at
+# once, would each run a full solve. While a solve is in flight, requests
+# with the same key (canonical payload + the options that change the
+# response + model version) wait on it and get the same result, or the same
+# error. The shared solve is only cancelled once every waiting client has
+# disconnected. The result object is shared between the requests: callers
+# must not modify it (core.responses.select_fields copies). Errors that only
+# concern the caller who started the flight (`solo_on`, e.g. its client's
+# admission refusal) are not shared: the other waiters then solve on their own.
+
+
+def solve_key(request_data: Dict[str, Any], **options) -> str:
+    """sha256 of the payload and options, independent of key order and whitespace."""
+    canonical = json.dumps([request_data, options], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+async def _connected() -> bool:
+    return False
+
+
+class _Flight:
+    def __init__(self):
+        self.task: Optional[asyncio.Future] = None
+        self.waiters: List[Callable[[], Awaitable[bool]]] = []
+
+    async def all_gone(self) -> bool:
+        for is_gone in list(self.waiters):
+            if not await is_gone():
+                return False
+        return True
+
+
+class SingleFlight:
+    """Identical solves in flight, by solve_key."""
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    async def run(self, key: str, solve: Callable[..., Awaitable[Dict[str, Any]]],
+                  should_cancel: Optional[Callable[[], Awaitable[bool]]] = None,
+                  solo_on: Tuple[Type[BaseException], ...] = ()) -> Tuple[Dict[str, Any], bool]:
+        """
+        Runs solve(should_cancel=...) unless a solve with this key is in
+        flight, and waits for its result. A request that joined a flight
+        failing with one of `solo_on` tries again with its own `solve`.
+
+        Returns:
+            (result, coalesced): coalesced is True when the result came from
+            a solve started by another request.
+        """
+        flight = self._flights.get(key)
+        coalesced = flight is not None
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.ensure_future(solve(should_cancel=flight.all_gone))
+            flight.task.add_done_callback(lambda task: self._done(key, flight, task))
+        else:
+            COALESCED_SOLVES.inc()
+        flight.waiters.append(should_cancel or _connected)
+        try:
+            # shielded: a waiter being cancelled must not cancel the others' solve
+            return await asyncio.shield(flight.task), coalesced
+        except solo_on:
+            if not coalesced:
+                raise
+        # the failed flight is gone: the first waiter to get here starts a new one, with its own solve
+        return await self.run(key, solve, should_cancel, solo_on)
+
+    def _done(self, key: str, flight: _Flight, task: asyncio.Future):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here too, in case every waiter is gone
@@ -0,0 +1,217 @@
+import hashlib
+import os
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+from core.logs import get_logger
+
+# ------------------------------------------------------------
+# Target encoders (mean avg_rendement per category)
+# ------------------------------------------------------------
+# Column of agg.csv -> short name used inside the .npz artifact
+ENCODED_COLUMNS = {
+    "IDEmploye": "emp",
+    "IDOperation": "op",
+    "most_used_machine": "machine",
+    "most_used_chain": "chain",
+}
+
+# Optional per-pair sample count column in agg.csv; without it every row counts as one sample
+PAIR_COUNT_COLUMN = "n_records"
+
+ARTIFACT_VERSION = 3
+
+logger = get_logger(__name__)
+
+
+class TargetEncoder:
+    """Maps category values to their mean avg_rendement, with a global fallback."""
+
+    def __init__(self, keys, values, fallback: float):
+        self.keys = pd.Index(keys)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.fallback = float(fallback)
+
+    @classmethod
+    def from_series(cls, series: pd.Series) -> "TargetEncoder":
+        return cls(series.index.values, series.values, float(series.mean()))
+
+    def transform(self, values) -> np.ndarray:
+        """Vectorized equivalent of `Series.map(enc_map).fillna(fallback)`."""
+        return self.lookup(values)[0]
+
+    def lookup(self, values):
+        """
+        Returns:
+            (encoded, found): transform's output and a mask of the values that
+            are known categories (the others got the fallback).
+        """
+        idx = self.keys.get_indexer(pd.Index(values))
+        out = np.full(len(idx), self.fallback, dtype=np.float64)
+        found = idx >= 0
+        out[found] = self.values[idx[found]]
+        return out, found
+
+    def to_series(self) -> pd.Series:
+        return pd.Series(self.values, index=self.keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def pair_keys(employees, operations) -> np.ndarray:
+    """Packs (IDEmploye, IDOperation) into one int64 key: employee in the high 32 bits."""
+    return (np.asarray(employees, dtype=np.int64) << 32) | np.asarray(operations, dtype=np.int64)
+
+
+class PairIndex:
+    """
+    Observed avg_rendement per (employee, operation), as a sorted int64 key
+    array searched with np.searchsorted. Also keeps the pair's most used
+    machine (-1 if unknown) for candidate pruning.
+    """
+
+    def __init__(self, keys, rendement, count, machine=None):
+        order = np.argsort(keys, kind="stable")
+        self.keys = np.asarray(keys, dtype=np.int64)[order]
+        self.rendement = np.asarray(rendement, dtype=np.float64)[order]
+        self.count = np.asarray(count, dtype=np.int64)[order]
+        if machine is None:
+            machine = np.full(len(order), -1)
+        self.machine = np.asarray(machine, dtype=np.int64)[order]
+
+    @classmethod
+    def from_agg(cls, agg_df: pd.DataFrame) -> "PairIndex":
+        if PAIR_COUNT_COLUMN in agg_df.columns:
+            count = agg_df[PAIR_COUNT_COLUMN].to_numpy()
+        else:
+            count = np.ones(len(agg_df), dtype=np.int64)
+        machine = pd.to_numeric(agg_df["most_used_machine"], errors="coerce").fillna(-1).to_numpy()
+        return cls(pair_keys(agg_df["IDEmploye"], agg_df["IDOperation"]), agg_df["avg_rendement"].to_numpy(),
+                   count, machine)
+
+    def lookup(self, keys: np.ndarray, min_samples: int = 1):
+        """
+        Returns:
+            (rendement, observed): observed rendement per key and a mask of the
+            keys that exist with at least `min_samples` samples.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        rendement = np.full(len(keys), np.nan)
+        if len(self.keys) == 0:
+            return rendement, np.zeros(len(keys), dtype=bool)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        observed = (self.keys[pos] == keys) & (self.count[pos] >= min_samples)
+        rendement[observed] = self.rendement[pos[observed]]
+        return rendement, observed
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class Encoders:
+    """The four target encoders used to build the rendement feature matrix, plus the observed pairs."""
+
+    def __init__(self, encoders: Dict[str, TargetEncoder], pairs: PairIndex, source_digest: str = ""):
+        self.emp = encoders["emp"]
+        self.op = encoders["op"]
+        self.machine = encoders["machine"]
+        self.chain = encoders["chain"]
+        self.pairs = pairs
+        self.source_digest = source_digest
+
+    @classmethod
+    def from_agg(cls, agg_df: pd.DataFrame, source_digest: str = "") -> "Encoders":
+        encoders = {
+            name: TargetEncoder.from_series(agg_df.groupby(col)["avg_rendement"].mean())
+            for col, name in ENCODED_COLUMNS.items()
+        }
+        return cls(encoders, PairIndex.from_agg(agg_df), source_digest)
+
+    def items(self):
+        return [("emp", self.emp), ("op", self.op), ("machine", self.machine), ("chain", self.chain)]
+
+    def save(self, path: str):
+        arrays = {
+            "artifact_version": np.array(ARTIFACT_VERSION),
+            "source_digest": np.array(self.source_digest),
+        }
+        for name, enc in self.items():
+            keys = enc.keys.values
+            if keys.dtype == object:
+                keys = keys.astype(str)
+            arrays[f"{name}_keys"] = keys
+            arrays[f"{name}_values"] = enc.values
+            arrays[f"{name}_fallback"] = np.array(enc.fallback)
+        arrays["pair_keys"] = self.pairs.keys
+        arrays["pair_rendement"] = self.pairs.rendement
+        arrays["pair_count"] = self.pairs.count
+        arrays["pair_machine"] = self.pairs.machine
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Encoders":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["artifact_version"]) != ARTIFACT_VERSION:
+                raise ValueError(f"Unsupported encoder artifact version in {path}")
+            encoders = {
+                name: TargetEncoder(data[f"{name}_keys"], data[f"{name}_values"], float(data[f"{name}_fallback"]))
+                for name in ENCODED_COLUMNS.values()
+            }
+            pairs = PairIndex(data["pair_keys"], data["pair_rendement"], data["pair_count"], data["pair_machine"])
+            return cls(encoders, pairs, str(data["source_digest"]))
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def build_encoders(agg_path: str, artifact_path: str) -> Encoders:
+    """Recompute the encoders from agg.csv and write the compact artifact."""
+    agg_df = pd.read_csv(agg_path)
+    encoders = Encoders.from_agg(agg_df, file_digest(agg_path))
+    encoders.save(artifact_path)
+    return encoders
+
+
+def load_encoders(agg_path: str, artifact_path: str, rebuild_path: Optional[str] = None) -> Tuple[Encoders, str]:
+    """
+    Loads the encoders from the .npz artifact, rebuilding it from agg.csv when
+    it is missing or was built from a different agg.csv. The rebuilt artifact
+    is written to `rebuild_path` (default: artifact_path), e.g. a staging file
+    for the caller to move into place once it decided to use it.
+
+    Returns:
+        The encoders and where they came from ('artifact' or 'csv').
+    """
+    digest = file_digest(agg_path) if os.path.exists(agg_path) else None
+    if os.path.exists(artifact_path):
+        try:
+            encoders = Encoders.load(artifact_path)
+        except (ValueError, KeyError) as e:
+            if digest is None:
+                raise
+            logger.warning("encoder artifact %s is unreadable (%s), rebuilding from %s", artifact_path, e, agg_path)
+        else:
+            if digest is None or encoders.source_digest == digest:
+                return encoders, "artifact"
+            logger.warning("encoder artifact %s is stale, rebuilding from %s", artifact_path, agg_path)
+    return build_encoders(agg_path, rebuild_path or artifact_path), "csv"
+
+
+if __name__ == "__main__":
+    # python -m core.encoders : precompute input/encoders.npz from input/agg.csv
+    from config import config
+
+    t0 = time.perf_counter()
+    enc = build_encoders(config.AGG_PATH, config.ENCODERS_PATH)
+    print(f"Built {config.ENCODERS_PATH} in {time.perf_counter() - t0:.3f}s "
+          f"({', '.join(f'{name}={len(e)}' for name, e in enc.items())}, pairs={len(enc.pairs)})")
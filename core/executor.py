@@ -0,0 +1,313 @@
+import asyncio
+import contextvars
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+
+from core.logs import setup_logging, log_context, bind_log_context
+from core.pipeline import SolveError, prepare_solve, run_solver, build_response
+from core.profiling import ProfileCollector, profiled
+from core.registry import ModelBundle
+from core.timing import PhaseTimings
+
+# ------------------------------------------------------------
+# Off-loop execution of /solve: model in threads, solver in processes
+# ------------------------------------------------------------
+# Prediction runs in a thread pool of the API process (the model lives there
+# and xgboost releases the GIL); the pure-Python local search runs in a
+# bounded process pool so concurrent solves do not serialize on the GIL and
+# the event loop stays free for other requests.
+#
+# Each in-flight solve owns a slot. Cancellation: the slot's byte in a shared
+# array the solver processes inherit; setting it makes the local search stop
+# at its next iteration (see local_search_balance's should_stop). Progress:
+# the solver processes put (slot, event) on a shared queue that a thread of
+# the API process hands to the listener of that slot. A time budget (see
+# core/scheduler.py) and a scheduler cut stop the local search the same way,
+# but the solve then returns its best plan so far instead of being cancelled.
+PROGRESS_EVERY = 50  # iterations between two "iteration" progress events
+
+_cancel_flags = None  # shared array, set in each solver process by _init_solver_process
+_events = None  # shared queue, idem
+
+
+class SolveCancelled(Exception):
+    """The client went away before the solve finished."""
+
+
+def make_progress(emit: Callable[[Dict[str, Any]], None], every: int = PROGRESS_EVERY):
+    """local_search_balance progress callback emitting improvements and every `every`-th iteration."""
+    def progress(iteration, max_iter, score, improved, makespan, balance_index):
+        if improved or iteration % every == 0:
+            emit({
+                "type": "improvement" if improved else "iteration",
+                "iteration": iteration,
+                "max_iter": max_iter,
+                "score": round(float(score), 6),
+                "makespan": round(float(makespan), 2),
+                "balance_index": round(float(balance_index), 3),
+            })
+    return progress
+
+
+def make_milestone(emit: Callable[[Dict[str, Any]], None]):
+    """solve_assignment_matrix on_milestone callback: {"type": "milestone", "milestone": ..., ...} events."""
+    return lambda milestone: emit({"type": "milestone", **milestone})
+
+
+def _init_solver_process(flags, events):
+    global _cancel_flags, _events
+    _cancel_flags = flags
+    _events = events
+    setup_logging()
+
+
+def _with_deadline(should_stop: Optional[Callable[[], bool]], deadline: Optional[float]):
+    if deadline is None:
+        return should_stop
+    if should_stop is None:
+        return lambda: time.time() >= deadline
+    return lambda: should_stop() or time.time() >= deadline
+
+
+def _timed_solver(profile: bool, *args):
+    """run_solver(*args) with its own PhaseTimings -> (result, phase seconds, profile segment or None)."""
+    timings = PhaseTimings()
+    if not profile:
+        return run_solver(*args, timings), timings.seconds, None
+    result, segment = profiled("solve", run_solver, *args, timings)
+    return result, timings.seconds, segment
+
+
+def _solve_in_process(slot: Optional[int], token: int, deadline: Optional[float], profile: bool, context, gamme,
+                      rendement_matrix, solver_config, candidates):
+    bind_log_context(context)  # the request id / sampling of the API request, for this process's records
+    should_stop = progress = on_milestone = None
+    if slot is not None and _cancel_flags is not None:
+        emit = lambda event: _events.put((slot, token, event))
+        should_stop = lambda: _cancel_flags[slot] != 0
+        progress, on_milestone = make_progress(emit), make_milestone(emit)
+    should_stop = _with_deadline(should_stop, deadline)
+    return _timed_solver(profile, gamme, rendement_matrix, solver_config, candidates, should_stop, progress,
+                         on_milestone)
+
+
+class SolveExecutor:
+    """
+    Runs prepare (predict) and solve steps off the event loop.
+
+    Args:
+        processes: Solver processes; 0 runs the solver in the thread pool instead.
+        predict_threads: Threads for pruning + prediction.
+        start_method: multiprocessing start method of the solver processes
+            ("spawn" avoids forking a process that already runs threads).
+        cancel_slots: Max in-flight solves that can be cancelled individually.
+        poll_interval: Seconds between client-disconnect checks.
+    """
+
+    def __init__(self, processes: int, predict_threads: int, start_method: str = "spawn",
+                 cancel_slots: int = 256, poll_interval: float = 0.25):
+        self.processes = processes
+        self.predict_threads = predict_threads
+        self.start_method = start_method
+        self.poll_interval = poll_interval
+        self._cancel_slots = cancel_slots
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._flags = None
+        self._events = None
+        # slot -> (task token, listener); the token drops late events of a slot's previous task
+        self._listeners: Dict[int, Tuple[int, Callable[[Dict[str, Any]], None]]] = {}
+        self._tokens = itertools.count()
+        self._free_slots = deque()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.cancelled = 0
+
+    # -------------------- lifecycle --------------------
+    def start(self):
+        self._threads = ThreadPoolExecutor(max_workers=self.predict_threads, thread_name_prefix="predict")
+        if self.processes > 0:
+            ctx = multiprocessing.get_context(self.start_method)
+            self._flags = ctx.RawArray("b", self._cancel_slots)
+            self._events = ctx.SimpleQueue()
+            self._free_slots = deque(range(self._cancel_slots))
+            threading.Thread(target=self._pump_events, name="solver-events", daemon=True).start()
+            self._start_processes()
+
+    def _start_processes(self):
+        ctx = multiprocessing.get_context(self.start_method)
+        self._processes = ProcessPoolExecutor(max_workers=self.processes, mp_context=ctx,
+                                              initializer=_init_solver_process, initargs=(self._flags, self._events))
+        # start the workers now rather than on the first request
+        for _ in range(self.processes):
+            self._processes.submit(os.getpid)
+
+    def _pump_events(self):
+        while True:
+            item = self._events.get()
+            if item is None:
+                return
+            slot, token, event = item
+            owner = self._listeners.get(slot)
+            if owner is not None and owner[0] == token:
+                owner[1](event)
+
+    def shutdown(self):
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+            self._processes = None
+            self._events.put(None)
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "solver_processes": self.processes,
+            "predict_threads": self.predict_threads,
+            "in_flight": self.in_flight,
+            "cancelled": self.cancelled,
+        }
+
+    # -------------------- cancel slots --------------------
+    def _take_slot(self) -> Optional[int]:
+        with self._lock:
+            return self._free_slots.popleft() if self._free_slots else None
+
+    def _release_slot(self, slot: Optional[int]):
+        if slot is None:
+            return
+        self._flags[slot] = 0
+        self._listeners.pop(slot, None)
+        with self._lock:
+            self._free_slots.append(slot)
+
+    # -------------------- solve --------------------
+    async def _wait(self, future: asyncio.Future, should_cancel: Optional[Callable[[], Awaitable[bool]]],
+                    on_cancel: Callable[[], None], should_cut: Optional[Callable[[], bool]] = None):
+        cut = False
+        while True:
+            done, _ = await asyncio.wait({future}, timeout=self.poll_interval)
+            if done:
+                return future.result()
+            if should_cut is not None and not cut and should_cut():
+                # same stop signal as a cancel, but the solver's result is still awaited
+                on_cancel()
+                cut = True
+            if should_cancel is not None and await should_cancel():
+                on_cancel()
+                future.cancel()
+                self.cancelled += 1
+                raise SolveCancelled()
+
+    async def _solve_in_pool(self, args, should_cancel, listener, should_cut=None, deadline=None, profile=False):
+        pool = self._processes
+        slot = self._take_slot()
+        token = next(self._tokens)
+        if slot is not None and listener is not None:
+            self._listeners[slot] = (token, listener)
+        try:
+            future = pool.submit(_solve_in_process, slot, token, deadline, profile, log_context(), *args)
+            # the slot stays taken until the task really ends, even after a cancel
+            future.add_done_callback(lambda _: self._release_slot(slot))
+        except BrokenProcessPool:
+            self._release_slot(slot)
+            raise self._replace_broken_pool(pool)
+        cancel = (lambda: self._flags.__setitem__(slot, 1)) if slot is not None else (lambda: None)
+        try:
+            return await self._wait(asyncio.wrap_future(future), should_cancel, cancel, should_cut)
+        except BrokenProcessPool:
+            raise self._replace_broken_pool(pool)
+
+    def _replace_broken_pool(self, pool) -> SolveError:
+        # a solver process died (e.g. OOM killed): replace the pool for the next requests
+        with self._lock:
+            if pool is self._processes:
+                self._start_processes()
+        return SolveError(500, "Solver process crashed, please retry")
+
+    async def solve(self, request_data: Dict[str, Any], bundle: ModelBundle, rendement_mode: Optional[str] = None,
+                    prune: Optional[bool] = None, include_rendements: bool = False,
+                    should_cancel: Optional[Callable[[], Awaitable[bool]]] = None,
+                    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    should_cut: Optional[Callable[[], bool]] = None,
+                    time_budget_s: Optional[float] = None,
+                    timings: Optional[PhaseTimings] = None,
+                    profile: Optional[ProfileCollector] = None,
+                    response_format: str = "records") -> Dict[str, Any]:
+        """
+        Full /solve pipeline off the event loop.
+
+        Args:
+            should_cancel: Polled every poll_interval (e.g. request.is_disconnected).
+            on_event: Called on the event loop with progress events: {"type": "phase",
+                "phase": "predict"|"solve"}, {"type": "milestone", "milestone":
+                "prediction"|"matrix"|"greedy", ...} as those steps finish, and local
+                search "iteration"/"improvement" events (score, makespan, balance_index).
+            should_cut: Polled like should_cancel; once True the local search stops
+                and the solve returns its best plan so far.
+            time_budget_s: Local search stops after this many seconds (None = max_iter only).
+            timings: Collects the phase times (core.timing); the caller adds them to the response.
+            profile: Profiles prediction and solver steps into this collector (core.profiling).
+            response_format: "records", "columnar" or "ndjson" (core.responses).
+
+        Raises:
+            SolveError: the request cannot be solved (carries the HTTP status).
+            SolveCancelled: should_cancel() turned True before the end.
+        """
+        loop = asyncio.get_running_loop()
+        emit = on_event or (lambda event: None)
+        timings = timings if timings is not None else PhaseTimings()
+        # progress events arrive on other threads
+        listener = (lambda event: loop.call_soon_threadsafe(on_event, event)) if on_event else None
+        self.in_flight += 1
+        try:
+            emit({"type": "phase", "phase": "predict"})
+            started = time.perf_counter()
+            prepare_args = (request_data, bundle, rendement_mode, prune, timings)
+            # run_in_executor does not carry contextvars over: copy them (request id for the logs)
+            run = contextvars.copy_context().run
+            if profile is None:
+                future = loop.run_in_executor(self._threads, run, prepare_solve, *prepare_args)
+            else:
+                future = loop.run_in_executor(self._threads, run, profiled, "predict", prepare_solve, *prepare_args)
+            prepared = await self._wait(future, should_cancel, lambda: None)
+            if profile is not None:
+                prepared, segment = prepared
+                profile.add(segment)
+            emit({"type": "milestone", "milestone": "prediction", "seconds": round(time.perf_counter() - started, 3),
+                  "rendements": prepared.rendement_matrix.size, "sources": prepared.rendement_matrix.sources()})
+            args = (prepared.gamme, prepared.rendement_matrix, prepared.solver_config,
+                    prepared.candidates_by_operation)
+
+            emit({"type": "phase", "phase": "solve"})
+            deadline = time.time() + time_budget_s if time_budget_s is not None else None
+            started = time.perf_counter()
+            if self._processes is None:
+                stop = threading.Event()
+                progress = make_progress(listener) if listener else None
+                on_milestone = make_milestone(listener) if listener else None
+                future = loop.run_in_executor(self._threads, contextvars.copy_context().run, _timed_solver,
+                                              profile is not None, *args,
+                                              _with_deadline(stop.is_set, deadline), progress, on_milestone)
+                result, solver_seconds, segment = await self._wait(future, should_cancel, stop.set, should_cut)
+            else:
+                result, solver_seconds, segment = await self._solve_in_pool(
+                    args, should_cancel, listener, should_cut, deadline, profile is not None)
+            if segment is not None:
+                profile.add(segment)
+            timings.merge(solver_seconds)
+            # what the solver phases do not account for: dispatch, pickling, waiting for a free process
+            timings.add("solver_overhead", max(0.0, time.perf_counter() - started - sum(solver_seconds.values())))
+
+            with timings.phase("response"):
+                return build_response(prepared, result, include_rendements, response_format)
+        finally:
+            self.in_flight -= 1
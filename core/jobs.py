@@ -0,0 +1,269 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from core.executor import SolveExecutor, SolveCancelled
+from core.logs import get_logger
+from core.pipeline import SolveError
+from core.registry import registry
+from core.scheduler import PriorityScheduler
+
+# ------------------------------------------------------------
+# Asynchronous solve jobs: submit / poll / cancel
+# ------------------------------------------------------------
+# Each job is a task waiting in the same PriorityScheduler as /solve, so jobs
+# and synchronous solves share the solver slots by priority. Finished jobs are kept in memory
+# for JOB_TTL_S and, if JOBS_DB_PATH is set, in SQLite so results survive a
+# restart of the API.
+JOB_STATES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+logger = get_logger(__name__)
+
+
+class QueueFull(Exception):
+    """Too many jobs are waiting."""
+
+
+def _etag(payload: Any) -> str:
+    return '"' + hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16] + '"'
+
+
+class Job:
+    """One submitted solve: its inputs, state, progress and (when done) its result."""
+
+    def __init__(self, job_id: str, request_data: Optional[Dict[str, Any]], options: Dict[str, Any],
+                 client: Optional[str] = None):
+        self.id = job_id
+        self.request_data = request_data
+        self.options = options
+        self.client = client  # submitter, for the scheduler's fair share
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.progress: Dict[str, Any] = {"phase": "queued", "iteration": 0, "max_iter": None,
+                                         "best_score": None, "makespan": None, "balance_index": None,
+                                         "improvements": 0}
+        self.result: Optional[Dict[str, Any]] = None
+        self.result_etag: Optional[str] = None
+        self.error: Optional[Dict[str, Any]] = None
+        self.cancel_requested = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def on_event(self, event: Dict[str, Any]):
+        """Executor progress events -> job progress."""
+        if event["type"] == "phase":
+            self.progress["phase"] = event["phase"]
+            if self.status == "queued" and event["phase"] != "queued":  # got a scheduler slot
+                self.status = "running"
+                self.started_at = time.time()
+        elif event["type"] == "milestone":
+            if event["milestone"] == "greedy":
+                self.progress["best_score"] = event["score"]
+                self.progress["makespan"] = event["makespan"]
+                self.progress["balance_index"] = event["balance_index"]
+        else:
+            self.progress["iteration"] = event["iteration"]
+            self.progress["max_iter"] = event["max_iter"]
+            self.progress["best_score"] = event["score"]
+            self.progress["makespan"] = event["makespan"]
+            self.progress["balance_index"] = event["balance_index"]
+            if event["type"] == "improvement":
+                self.progress["improvements"] += 1
+
+    def finish(self, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[Dict[str, Any]] = None):
+        self.status = status
+        self.finished_at = time.time()
+        self.progress["phase"] = status
+        self.result = result
+        self.result_etag = _etag(result) if result is not None else None
+        self.error = error
+        self.request_data = None  # not needed anymore
+
+    def state_etag(self) -> str:
+        """ETag of the result resource: the result itself once done, else the job's state."""
+        if self.result_etag:
+            return self.result_etag
+        return _etag([self.id, self.status, self.progress["phase"], self.progress["iteration"]])
+
+    def summary(self) -> Dict[str, Any]:
+        def iso(ts):
+            return datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else None
+
+        ref = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": dict(self.progress),
+            "created_at": iso(self.created_at),
+            "started_at": iso(self.started_at),
+            "finished_at": iso(self.finished_at),
+            "queued_s": round((self.started_at or ref) - self.created_at, 3),
+            "run_s": round(ref - self.started_at, 3) if self.started_at else None,
+            "error": self.error,
+        }
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "Job":
+        summary = json.loads(row["summary"])
+        job = cls(row["id"], None, {})
+        job.status = row["status"]
+        job.progress = summary["progress"]
+        job.error = summary.get("error")
+        job.created_at, job.started_at, job.finished_at = row["created_at"], row["started_at"], row["finished_at"]
+        job.result = json.loads(row["result"]) if row["result"] else None
+        job.result_etag = row["etag"]
+        return job
+
+
+class SQLiteJobStore:
+    """Finished jobs in a SQLite file, so results can still be fetched after a restart."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    summary TEXT NOT NULL,
+                    result TEXT,
+                    etag TEXT
+                )
+            """)
+
+    def save(self, job: Job):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.status, job.created_at, job.started_at, job.finished_at, json.dumps(job.summary()),
+                 json.dumps(job.result) if job.result is not None else None, job.result_etag)
+            )
+
+    def load(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return Job.from_row(dict(row)) if row else None
+
+    def purge(self, older_than: float):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (older_than,))
+
+
+class JobManager:
+    """
+    In-process solve jobs.
+
+    Args:
+        executor: The SolveExecutor the jobs run on.
+        scheduler: The PriorityScheduler deciding when each job runs.
+        max_queued: Waiting jobs above which submit raises QueueFull.
+        ttl_s: How long finished jobs stay available.
+        store: Optional SQLiteJobStore for finished jobs.
+    """
+
+    def __init__(self, executor: SolveExecutor, scheduler: PriorityScheduler, max_queued: int = 100,
+                 ttl_s: float = 3600, store: Optional[SQLiteJobStore] = None):
+        self.executor = executor
+        self.scheduler = scheduler
+        self.max_queued = max_queued
+        self.ttl_s = ttl_s
+        self.store = store
+        self.jobs: Dict[str, Job] = {}
+        self._tasks = set()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = set()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == "queued")
+
+    def status(self) -> Dict[str, Any]:
+        counts = {state: 0 for state in JOB_STATES}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {"queued": self.queued, "jobs": counts}
+
+    def submit(self, request_data: Dict[str, Any], client: Optional[str] = None, **options) -> Job:
+        if self.queued >= self.max_queued:
+            raise QueueFull(f"{self.queued} jobs already waiting")
+        self._purge()
+        job = Job(uuid.uuid4().hex, request_data, options, client)
+        self.jobs[job.id] = job
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Queued jobs leave the scheduler queue at its next check; running ones stop at the next iteration."""
+        job = self.jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_requested = True
+            if job.status == "queued":
+                job.finish("cancelled")
+                self._persist(job)
+        return job or self.get(job_id)
+
+    async def _run(self, job: Job):
+        async def should_cancel():
+            return job.cancel_requested
+
+        try:
+            bundle = registry.get()
+            if bundle is None:
+                raise SolveError(503, "Model not loaded.")
+            # fair-shared with the submitter's other solves; JOB_QUEUE_MAX bounds the jobs instead of admission control
+            result = await self.scheduler.solve(self.executor, job.request_data, bundle,
+                                                should_cancel=should_cancel, on_event=job.on_event,
+                                                client=job.client or f"job:{job.id}", admission=False, **job.options)
+            job.finish("done", result=result)
+        except SolveCancelled:
+            if job.finished:  # cancelled while queued, already recorded
+                return
+            job.finish("cancelled")
+        except SolveError as e:
+            job.finish("failed", error={"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.exception("job %s failed", job.id)
+            job.finish("failed", error={"status_code": 500, "detail": str(e)})
+        self._persist(job)
+
+    def _persist(self, job: Job):
+        if self.store is not None:
+            try:
+                self.store.save(job)
+            except sqlite3.Error as e:
+                logger.warning("could not store job %s: %s", job.id, e)
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl_s
+        for job_id in [j.id for j in self.jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+        if self.store is not None:
+            self.store.purge(cutoff)
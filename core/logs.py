@@ -0,0 +1,234 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from typing import Dict, Any, Optional, Tuple
+
+from config import config
+
+# ------------------------------------------------------------
+# Structured, non-blocking logging of the solver / predictor services
+# ------------------------------------------------------------
+# Records go through a bounded queue (QueueHandler) to a listener thread that
+# formats and writes them, one JSON object per line by default, so a request
+# only pays for building a small record; when the queue is full the record is
+# dropped and counted instead of blocking. Every record carries the request
+# id (X-Request-ID, see RequestContextMiddleware). Chatty per-request records
+# (payload summaries, step details) are logged with fields(sample=True) and
+# only kept for LOG_SAMPLE_RATE of the requests; warnings and errors are
+# always kept. Payloads are never logged whole: summarize() keeps their shape
+# (keys, list lengths, first item) within LOG_PAYLOAD_MAX_CHARS.
+_request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default=None)
+_sampled: contextvars.ContextVar = contextvars.ContextVar("log_sampled", default=True)
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+_state: Dict[str, Any] = {"pid": None, "handler": None, "listener": None, "sample_rate": 1.0}
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
+
+
+def fields(sample: bool = False, **values) -> Dict[str, Any]:
+    """
+    `extra=` of a structured record: logger.info("solve done", extra=fields(total_ms=812)).
+    With sample=True the record (below WARNING) is only kept for sampled requests.
+    """
+    return {"fields": values, "sample": sample}
+
+
+def sampled(logger: logging.Logger, level: int = logging.INFO) -> bool:
+    """Whether a sample=True record at `level` would be kept; check it before building costly fields."""
+    return logger.isEnabledFor(level) and (level >= logging.WARNING or _sampled.get())
+
+
+# ------------------------------------------------------------
+# Request context: id + sampling decision, per asyncio task / thread
+# ------------------------------------------------------------
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def start_request(request_id: Optional[str] = None) -> str:
+    """Binds a request id (a valid client one, else a new one) and draws the sampling decision."""
+    if not request_id or not _REQUEST_ID.match(request_id):
+        request_id = new_request_id()
+    _request_id.set(request_id)
+    _sampled.set(random.random() < _state["sample_rate"])
+    return request_id
+
+
+def log_context() -> Tuple[Optional[str], bool]:
+    """The current request id and sampling decision, to hand to a solver process."""
+    return _request_id.get(), _sampled.get()
+
+
+def bind_log_context(context: Tuple[Optional[str], bool]):
+    _request_id.set(context[0])
+    _sampled.set(context[1])
+
+
+# ------------------------------------------------------------
+# Payload summaries
+# ------------------------------------------------------------
+def _shape(value: Any, depth: int) -> Any:
+    if isinstance(value, dict):
+        if depth <= 0:
+            return f"dict[{len(value)}]"
+        return {str(k): _shape(v, depth - 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if depth <= 0 or not value:
+            return f"list[{len(value)}]"
+        return {"len": len(value), "first": _shape(value[0], depth - 1)}
+    if isinstance(value, str):
+        return value if len(value) <= 80 else value[:77] + "..."
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = repr(value)
+    return text if len(text) <= 80 else text[:77] + "..."
+
+
+def summarize(value: Any, max_chars: Optional[int] = None) -> Any:
+    """
+    The shape of a payload ({"employes": {"len": 150, "first": {...}}, ...}),
+    as deep as fits in max_chars of JSON (default config.LOG_PAYLOAD_MAX_CHARS).
+    """
+    max_chars = max_chars or config.LOG_PAYLOAD_MAX_CHARS
+    for depth in (4, 3, 2, 1):
+        shape = _shape(value, depth)
+        if len(json.dumps(shape, default=str)) <= max_chars:
+            return shape
+    text = json.dumps(_shape(value, 1), default=str)
+    return text[:max_chars - 3] + "..."
+
+
+# ------------------------------------------------------------
+# Handler, filter and formatters
+# ------------------------------------------------------------
+class _ContextFilter(logging.Filter):
+    """Runs on the caller's thread (its context): stamps the request id and applies the sampling."""
+
+    def filter(self, record):
+        if getattr(record, "sample", False) and record.levelno < logging.WARNING and not _sampled.get():
+            return False
+        record.request_id = _request_id.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks nor formats in the caller; a full queue drops the record."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # the stdlib version formats the whole record here, i.e. on the request's thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "pid": record.process,
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = (f"{self.formatTime(record)} {record.levelname:<7} {record.name} "
+                f"[{getattr(record, 'request_id', None) or '-'}] {record.getMessage()}")
+        values = getattr(record, "fields", None)
+        if values:
+            line += " " + " ".join(f"{k}={json.dumps(v, default=str)}" for k, v in values.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None, sample_rate: Optional[float] = None,
+                  queue_size: Optional[int] = None, stream=None):
+    """
+    Routes the root logger through the queue handler (defaults from config).
+    Once per process: a forked process (gunicorn worker, solver process)
+    inherits a handler whose listener thread did not survive the fork, so
+    calling it again there replaces it.
+    """
+    if _state["pid"] == os.getpid():
+        return
+    root = logging.getLogger()
+    if _state["handler"] is not None:
+        root.removeHandler(_state["handler"])
+    out = logging.StreamHandler(stream or sys.stdout)
+    out.setFormatter(TextFormatter() if (fmt or config.LOG_FORMAT) == "text" else JsonFormatter())
+    handler = _QueueHandler(queue.Queue(queue_size or config.LOG_QUEUE_SIZE))
+    handler.addFilter(_ContextFilter())
+    listener = logging.handlers.QueueListener(handler.queue, out)
+    listener.start()
+    root.addHandler(handler)
+    root.setLevel(level or config.LOG_LEVEL)
+    _state.update(pid=os.getpid(), handler=handler, listener=listener,
+                  sample_rate=config.LOG_SAMPLE_RATE if sample_rate is None else sample_rate)
+
+
+def dropped_records() -> int:
+    return _state["handler"].dropped if _state["handler"] is not None else 0
+
+
+@atexit.register
+def _flush():
+    # writes what is still queued
+    if _state["listener"] is not None and _state["pid"] == os.getpid():
+        _state["listener"].stop()
+
+
+class RequestContextMiddleware:
+    """
+    Plain ASGI middleware binding each request's id (the client's X-Request-ID
+    when valid, else a new one) and sampling decision; the id is echoed in
+    the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        request_id = start_request(incoming).encode("latin-1")
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id)]
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
@@ -0,0 +1,226 @@
+import bisect
+import threading
+import time
+from typing import Dict, Any, Optional, Callable, Iterable, List, Tuple
+
+from core.logs import get_logger, fields, dropped_records
+
+# ------------------------------------------------------------
+# Prometheus text exposition, without prometheus_client
+# ------------------------------------------------------------
+# Counters, gauges and histograms with labels, rendered by GET /metrics in
+# the text format 0.0.4. Values live in the process that serves the request:
+# with several gunicorn workers, each worker exposes its own (scrape each, or
+# sum them on the Prometheus side).
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+logger = get_logger(__name__)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """
+    Base of the metric types. Counters and gauges can also be computed at
+    scrape time by `collect`, returning {label values tuple: value}.
+    """
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (),
+                 collect: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.collect = collect
+        self._values: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def _snapshot(self) -> Dict[Tuple, Any]:
+        if self.collect is None:
+            return dict(self._values)
+        try:
+            return self.collect()
+        except Exception as e:  # a broken collector must not break the whole scrape
+            logger.warning("metric could not be collected", extra=fields(metric=self.name, error=str(e)))
+            return {}
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in sorted(self._snapshot().items())]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))  # self._values: key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            state[i] += 1
+            state[-1] += value
+
+    def samples(self):
+        lines = []
+        for key, state in sorted(self._snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, ('le', _number(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(state[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric):
+        # module reloads / second app in the same process: keep the first one
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labels=(), collect=None) -> Counter:
+        return self._add(Counter(name, help_text, labels, collect))
+
+    def gauge(self, name, help_text, labels=(), collect=None) -> Gauge:
+        return self._add(Gauge(name, help_text, labels, collect))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets=buckets))
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware observing request latency per route template
+    (e.g. /jobs/{job_id}), method and status into `histogram`.
+    """
+
+    def __init__(self, app, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            self.histogram.observe(time.perf_counter() - started,
+                                   handler=getattr(route, "path", "unmatched"),
+                                   method=scope["method"], status=status["code"])
+
+
+# ------------------------------------------------------------
+# Metrics of the solver / predictor services
+# ------------------------------------------------------------
+metrics = MetricsRegistry()
+
+HTTP_LATENCY = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template, method and status.",
+    ("handler", "method", "status"))
+SOLVE_PHASE_LATENCY = metrics.histogram(
+    "solve_phase_duration_seconds", "Time per /solve phase (see the response's timings).", ("phase",))
+SOLVES = metrics.counter("solves_total", "Finished solves by outcome and priority.", ("outcome", "priority"))
+COALESCED_SOLVES = metrics.counter(
+    "solve_coalesced_total", "/solve requests answered by an identical solve already in flight.")
+INSTANCE_SIZE = metrics.histogram(
+    "solve_instance_size", "Solved instance sizes: operations, expanded_operations, employees.", ("dimension",),
+    buckets=SIZE_BUCKETS)
+SEARCH_ITERATIONS = metrics.counter("solver_local_search_iterations_total", "Local search iterations run.")
+SEARCH_IMPROVEMENTS = metrics.counter("solver_local_search_improvements_total", "Local search improving moves.")
+SEARCH_STOPPED_EARLY = metrics.counter(
+    "solver_local_search_stopped_early_total", "Local searches ended by a budget, cut, stop or cancel.")
+ENCODER_LOOKUPS = metrics.counter(
+    "encoder_lookups_total", "Target encoder lookups: hit = known category, miss = fallback value.",
+    ("encoder", "result"))
+HISTORY_LOOKUPS = metrics.counter(
+    "rendement_history_lookups_total", "Hybrid mode: pairs answered from history (hit) or by the model (miss).",
+    ("result",))
+PREDICTED_PAIRS = metrics.counter("predicted_pairs_total", "Employee x operation pairs sent to the model.")
+PREDICT_PHASE_LATENCY = metrics.histogram(
+    "predict_phase_duration_seconds", "Time per /predict-rendement phase (encode, predict, format).", ("phase",))
+LOG_DROPPED = metrics.counter(
+    "log_records_dropped_total", "Log records dropped because the log queue was full.",
+    collect=lambda: {(): dropped_records()})
+
+
+def observe_solve(response: Dict[str, Any], priority: str):
+    """Records a finished solve's phase times, instance size and local search counters."""
+    for phase, ms in response.get("timings", {}).items():
+        SOLVE_PHASE_LATENCY.observe(ms / 1000, phase=phase)
+    plan = response.get("assignment_plan") or {}
+    search = plan.get("search") or {}
+    size = response.get("instance") or {}
+    for dimension, value in size.items():
+        INSTANCE_SIZE.observe(value, dimension=dimension)
+    SEARCH_ITERATIONS.inc(search.get("iterations", 0))
+    SEARCH_IMPROVEMENTS.inc(search.get("improvements", 0))
+    if search.get("stopped_early"):
+        SEARCH_STOPPED_EARLY.inc()
+    SOLVES.inc(outcome="done", priority=priority)
+
+
+def observe_lookups(encoder: str, found) -> None:
+    hits = int(found.sum())
+    ENCODER_LOOKUPS.inc(hits, encoder=encoder, result="hit")
+    ENCODER_LOOKUPS.inc(len(found) - hits, encoder=encoder, result="miss")
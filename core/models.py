@@ -1,8 +1,11 @@
+import os
 import pandas as pd
 import numpy as np
 import random
 from collections import defaultdict
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable
+
+from core.timing import PhaseTimings, timed
 
 # ----------------------------- Helper functions from solver0.py -----------------------------
 
@@ -69,19 +72,36 @@ def expand_rendement(rend_list, expanded_gamme):
             expanded.append({"idOp": full_id, "idEmp": emp, "rendement": r})
     return expanded
 
+def expand_candidates(candidates: Optional[Dict[str, List[str]]], time_mat: pd.DataFrame) -> Dict[str, List[str]]:
+    """
+    Candidate employees per (expanded) operation of the time matrix. Split
+    operations ("574_2") inherit the candidates of their base operation; with
+    no pruning, or no candidate left, every employee is a candidate.
+    """
+    all_emps = list(time_mat.columns)
+    if candidates is None:
+        return {op: all_emps for op in time_mat.index}
+    emp_set = set(all_emps)
+    expanded = {}
+    for op in time_mat.index:
+        cands = [e for e in candidates.get(str(op).split("_")[0], []) if e in emp_set]
+        expanded[op] = cands or all_emps
+    return expanded
+
 # ----------------------------- Core Solver Logic from solver0.py ------------------------------------
 
-def greedy_initial_assign(time_mat: pd.DataFrame, cfg: Dict) -> Dict:
+def greedy_initial_assign(time_mat: pd.DataFrame, cfg: Dict, op_candidates: Optional[Dict[str, List[str]]] = None) -> Dict:
     max_ops = cfg.get("max_operations_per_emp", len(time_mat))
+    op_candidates = op_candidates or expand_candidates(None, time_mat)
     assignments = {}
     emp_load = defaultdict(float)
     emp_count = defaultdict(int)
     
     ops_sorted = time_mat.index.tolist()
-    ops_sorted = sorted(ops_sorted, key=lambda o: time_mat.loc[o].max(), reverse=True)
+    ops_sorted = sorted(ops_sorted, key=lambda o: time_mat.loc[o, op_candidates[o]].max(), reverse=True)
 
     for op in ops_sorted:
-        candidates = list(time_mat.columns)
+        candidates = list(op_candidates[op])
         candidates.sort(key=lambda e: (time_mat.loc[op, e], emp_load[e]))
         chosen = None
         for e in candidates:
@@ -132,11 +152,20 @@ def compute_metrics(assignments, time_mat):
     }
     return metrics, emp_load, emp_ops
 
-def local_search_balance(assignments, time_mat, cfg):
+def local_search_balance(assignments, time_mat, cfg, op_candidates=None, should_stop=None, progress=None,
+                         stats=None):
+    """
+    Moves single operations to better candidates while the score improves.
+    `should_stop` (no-arg callable) is polled every iteration; when it returns
+    True the search ends early with the best assignment found so far.
+    `progress` is called after every iteration with
+    (iteration, max_iter, best_score, improved, makespan, balance_index).
+    `stats` (dict), if given, receives iterations, improvements and stopped_early.
+    """
     max_iter = cfg.get("max_iter_local_search", 2000)
     max_ops = cfg.get("max_operations_per_emp", 999)
     ops = list(time_mat.index)
-    emps = list(time_mat.columns)
+    op_candidates = op_candidates or expand_candidates(None, time_mat)
 
     def build_state(assign):
         emp_load = defaultdict(float)
@@ -151,14 +180,20 @@ def local_search_balance(assignments, time_mat, cfg):
     emp_load, emp_ops = build_state(best_assign)
     best_score = compute_score(emp_load, emp_ops, max_ops)
     no_improve, patience = 0, 200
+    iterations = improvements = 0
+    stopped_early = False
 
-    for _ in range(max_iter):
+    for it in range(max_iter):
         if no_improve > patience: break
+        if should_stop is not None and should_stop():
+            stopped_early = True
+            break
+        iterations += 1
         op = random.choice(ops)
         cur_emp = best_assign[op]
         cur_time = float(time_mat.loc[op, cur_emp])
         improved = False
-        for cand in sorted(emps, key=lambda e: time_mat.loc[op, e]):
+        for cand in sorted(op_candidates[op], key=lambda e: time_mat.loc[op, e]):
             if cand == cur_emp or len(emp_ops[cand]) >= max_ops: continue
             cand_time = float(time_mat.loc[op, cand])
             emp_load[cur_emp] -= cur_time; emp_load[cand] += cand_time
@@ -171,18 +206,66 @@ def local_search_balance(assignments, time_mat, cfg):
                 emp_load[cur_emp] -= cur_time; emp_load[cand] += cand_time
                 emp_ops[cur_emp].remove(op); emp_ops[cand].append(op)
                 best_score = new_score
-                improved = True; no_improve = 0
+                improved = True; no_improve = 0; improvements += 1
                 break
+        if progress is not None:
+            loads = [emp_load[e] for e in emp_ops if emp_ops[e]]
+            makespan = max(loads) if loads else 0.0
+            progress(it + 1, max_iter, best_score, improved, makespan, min(loads) / makespan if makespan > 0 else 1.0)
         if improved: continue
         no_improve += 1
-    
+
+    if stats is not None:
+        stats.update(iterations=iterations, improvements=improvements, stopped_early=stopped_early)
     final_metrics, _, _ = compute_metrics(best_assign, time_mat)
     return best_assign, final_metrics
 
 # ----------------------------- Main `solve_assignment` function -----------------------------
 
-def solve_assignment(gamme: List[Dict], employees: List[int], predicted_rendement: List[Dict], config: Dict) -> Dict:
-    """ Main function to solve the assignment problem using the full logic from solver0.py """
+def _assignments_list(assign: Dict, time_mat: pd.DataFrame) -> List[Dict]:
+    return [{"idOp": op, "idEmp": emp, "time": float(time_mat.loc[op, emp])} for op, emp in assign.items()]
+
+
+def _optimize(time_mat: pd.DataFrame, config: Dict, candidates: Optional[Dict[str, List[str]]],
+              target_duration: float, should_stop: Optional[Callable[[], bool]] = None,
+              progress: Optional[Callable] = None, on_milestone: Optional[Callable[[Dict], None]] = None,
+              timings: Optional[PhaseTimings] = None) -> Dict:
+    # 3. Initial greedy assignment (over the candidate employees of each operation)
+    with timed(timings, "greedy"):
+        op_candidates = expand_candidates(candidates, time_mat)
+        initial_assign = greedy_initial_assign(time_mat, config, op_candidates)
+    if on_milestone is not None:
+        # already a usable plan: streamed to the client before the local search starts
+        greedy_metrics, emp_load, emp_ops = compute_metrics(initial_assign, time_mat)
+        on_milestone({
+            "milestone": "greedy",
+            "score": round(float(compute_score(emp_load, emp_ops, config.get("max_operations_per_emp", 999))), 6),
+            "makespan": greedy_metrics["makespan"],
+            "balance_index": greedy_metrics["balance_index"],
+            "assignments": _assignments_list(initial_assign, time_mat),
+        })
+
+    # 4. Local search optimizer
+    search = {}
+    with timed(timings, "local_search"):
+        best_assign, final_metrics = local_search_balance(initial_assign, time_mat, config, op_candidates,
+                                                          should_stop, progress, search)
+
+    # 5. Build JSON result
+    assignments_list = _assignments_list(best_assign, time_mat)
+
+    return {"assignments": assignments_list, "metrics": final_metrics, "target_duration": target_duration,
+            "search": search}
+
+
+def solve_assignment(gamme: List[Dict], employees: List[int], predicted_rendement: List[Dict], config: Dict,
+                     candidates: Optional[Dict[str, List[str]]] = None) -> Dict:
+    """
+    Main function to solve the assignment problem using the full logic from solver0.py
+
+    `candidates` (operation id -> employee ids, see core.pruning) restricts
+    which employees the greedy pass and the local search consider per operation.
+    """
     
     # 1. Expand gamme using splitting logic
     durations = [g["base_time"] for g in gamme]
@@ -193,13 +276,79 @@ def solve_assignment(gamme: List[Dict], employees: List[int], predicted_rendemen
     # 2. Build time matrix
     time_mat = build_time_matrix(expanded_gamme, employees, pd.DataFrame(expanded_rend))
 
-    # 3. Initial greedy assignment
-    initial_assign = greedy_initial_assign(time_mat, config)
+    return _optimize(time_mat, config, candidates, target_duration)
 
-    # 4. Local search optimizer
-    best_assign, final_metrics = local_search_balance(initial_assign, time_mat, config)
 
-    # 5. Build JSON result
-    assignments_list = [{"idOp": op, "idEmp": emp, "time": float(time_mat.loc[op, emp])} for op, emp in best_assign.items()]
+def build_time_matrix_dense(expanded_gamme: List[Dict], rendement) -> pd.DataFrame:
+    """
+    Time matrix straight from a dense (operations x employees) rendement matrix
+    (core.preprocessing.RendementMatrix): each expanded operation takes the row
+    of its base operation, time = base_time / rendement. Rendements are
+    rounded to 3 decimals like the records (RendementMatrix.to_records) the
+    list-of-dicts path divides by, so both give the same times. Pairs without
+    a rendement (pruned) use 1.0 like expand_rendement.
+    """
+    row_of_op = {op_id: i for i, op_id in enumerate(rendement.op_ids)}
+    rows = np.array([row_of_op[g["idOp"].split("_")[0]] for g in expanded_gamme], dtype=np.int64)
+    base_times = np.array([float(g["base_time"]) for g in expanded_gamme])
+
+    rend = np.nan_to_num(np.round(rendement.values.astype(np.float64), 3)[rows], nan=1.0)
+    with np.errstate(divide="ignore"):
+        times = np.where(rend > 0, base_times[:, None] / np.where(rend > 0, rend, 1.0), np.inf)
+    return pd.DataFrame(times, index=[g["idOp"] for g in expanded_gamme], columns=list(rendement.emp_ids))
+
+
+def solve_assignment_matrix(gamme: List[Dict], rendement, config: Dict,
+                            candidates: Optional[Dict[str, List[str]]] = None,
+                            should_stop: Optional[Callable[[], bool]] = None,
+                            progress: Optional[Callable] = None,
+                            on_milestone: Optional[Callable[[Dict], None]] = None,
+                            timings: Optional[PhaseTimings] = None) -> Dict:
+    """
+    Same as solve_assignment, but takes the predictor's dense RendementMatrix
+    directly instead of a list of dicts (no DataFrame rebuild, iterrows or pivot).
+    `should_stop` ends the local search early and `progress` follows its
+    iterations (see local_search_balance). `on_milestone` gets a dict when the
+    time matrix is built ("matrix") and after the greedy pass ("greedy", with its plan).
+    `timings` (core.timing.PhaseTimings) collects the expand, time_matrix,
+    greedy and local_search phase times.
+    """
+    # 1. Expand gamme using splitting logic
+    with timed(timings, "expand"):
+        durations = [g["base_time"] for g in gamme]
+        target_duration = float(np.mean(durations)) if durations else 0
+        expanded_gamme = expand_gamme(gamme, target_duration)
+
+    # 2. Build time matrix
+    with timed(timings, "time_matrix"):
+        time_mat = build_time_matrix_dense(expanded_gamme, rendement)
+    if on_milestone is not None:
+        on_milestone({"milestone": "matrix", "operations": time_mat.shape[0], "employees": time_mat.shape[1],
+                      "target_duration": round(target_duration, 2)})
+
+    return _optimize(time_mat, config, candidates, target_duration, should_stop, progress, on_milestone, timings)
+
+
+# ----------------------------- Batch prediction (app.py / scripts.predict_batch) -----------------------------
+
+def load_model(model_path: Optional[str] = None):
+    """
+    Model bundle for batch prediction: the registry's active model, or the
+    artifact at `model_path` with the configured encoders.
+    """
+    from config import config
+    from core.registry import registry, load_bundle
+
+    active = registry.active
+    if model_path is None or (active is not None
+                              and os.path.realpath(active.model_path) == os.path.realpath(model_path)):
+        return registry.get()
+    return load_bundle(model_path, config.AGG_PATH, config.ENCODERS_PATH,
+                       config.PREDICT_BACKEND, config.PREDICT_NTHREAD)
+
 
-    return {"assignments": assignments_list, "metrics": final_metrics, "target_duration": target_duration}
+def predict(bundle, X: np.ndarray) -> np.ndarray:
+    """Predicted rendement of each row of a feature matrix from core.preprocessing.preprocess_data."""
+    if len(X) == 0:
+        return np.empty(0, dtype=np.float32)
+    return np.asarray(bundle.backend.predict(X), dtype=np.float32)
@@ -0,0 +1,74 @@
+import numpy as np
+
+from core.backends import FEATURE_COLUMNS
+from core.tree_eval import TreeEnsemble
+
+# ------------------------------------------------------------
+# TreeEnsemble -> ONNX TreeEnsembleRegressor (ai.onnx.ml)
+# ------------------------------------------------------------
+# Built from the NumPy node arrays of core.tree_eval rather than with
+# onnxmltools, which rejects our named features and only needs `onnx`
+# at export time. Serving the .onnx file needs onnxruntime only.
+ONNX_INPUT_NAME = "input"
+ONNX_OUTPUT_NAME = "variable"
+
+
+def ensemble_to_onnx(ensemble: TreeEnsemble, model_version: str = ""):
+    import onnx
+    from onnx import helper, TensorProto
+
+    n_nodes = len(ensemble.feature)
+    tree_of_node = np.searchsorted(ensemble.roots, np.arange(n_nodes), side="right") - 1
+    root_of_node = ensemble.roots[tree_of_node]
+    node_ids = np.arange(n_nodes) - root_of_node
+    is_leaf = ensemble.left == np.arange(n_nodes)
+
+    branch = ~is_leaf
+    leaf = is_leaf
+    node = helper.make_node(
+        "TreeEnsembleRegressor",
+        inputs=[ONNX_INPUT_NAME],
+        outputs=[ONNX_OUTPUT_NAME],
+        domain="ai.onnx.ml",
+        n_targets=1,
+        aggregate_function="SUM",
+        post_transform="NONE",
+        base_values=[ensemble.base_score],
+        nodes_treeids=tree_of_node.tolist(),
+        nodes_nodeids=node_ids.tolist(),
+        nodes_featureids=np.where(branch, ensemble.feature, 0).tolist(),
+        nodes_values=np.where(branch, ensemble.threshold, 0).astype(np.float32).tolist(),
+        nodes_modes=np.where(branch, "BRANCH_LT", "LEAF").tolist(),
+        # xgboost goes left when x < threshold, i.e. left is the "true" branch
+        nodes_truenodeids=np.where(branch, ensemble.left - root_of_node, 0).tolist(),
+        nodes_falsenodeids=np.where(branch, ensemble.right - root_of_node, 0).tolist(),
+        nodes_missing_value_tracks_true=np.where(branch, ensemble.default_left, False).astype(int).tolist(),
+        target_treeids=tree_of_node[leaf].tolist(),
+        target_nodeids=node_ids[leaf].tolist(),
+        target_ids=[0] * int(leaf.sum()),
+        target_weights=ensemble.value[leaf].tolist(),
+    )
+    graph = helper.make_graph(
+        [node], "rendement_model",
+        inputs=[helper.make_tensor_value_info(ONNX_INPUT_NAME, TensorProto.FLOAT, [None, len(FEATURE_COLUMNS)])],
+        outputs=[helper.make_tensor_value_info(ONNX_OUTPUT_NAME, TensorProto.FLOAT, [None, 1])],
+    )
+    model = helper.make_model(
+        graph,
+        opset_imports=[helper.make_opsetid("", 15), helper.make_opsetid("ai.onnx.ml", 3)],
+        producer_name="equilibrage",
+        model_version=1,
+    )
+    model.ir_version = 8
+    helper.set_model_props(model, {"features": ",".join(FEATURE_COLUMNS), "source_version": model_version})
+    onnx.checker.check_model(model)
+    return model
+
+
+def export_onnx(model, out_path: str, model_version: str = ""):
+    """Exports a loaded XGBRegressor/Booster (or TreeEnsemble) to an .onnx file."""
+    ensemble = model if isinstance(model, TreeEnsemble) else TreeEnsemble.from_booster(model)
+    onnx_model = ensemble_to_onnx(ensemble, model_version)
+    with open(out_path, "wb") as f:
+        f.write(onnx_model.SerializeToString())
+    return onnx_model
@@ -0,0 +1,157 @@
+from typing import Dict, Any, Optional, Callable
+
+from config import config
+from core.logs import get_logger, fields
+from core.models import solve_assignment_matrix
+from core.preprocessing import predict_rendement_matrix, RendementMatrix
+from core.pruning import prune_candidates, CandidateSet
+from core.registry import ModelBundle
+from core.responses import columnar_plan
+from core.timing import PhaseTimings, timed
+
+# ------------------------------------------------------------
+# /solve pipeline: prune -> predict rendement -> solve assignment
+# ------------------------------------------------------------
+# Split in two steps so the API can run them on different executors:
+# prepare_solve needs the model (thread pool, in the API process) and
+# run_solver is pure Python on picklable inputs (process pool).
+logger = get_logger(__name__)
+
+
+class SolveError(Exception):
+    """A request the pipeline cannot solve; carries the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class PreparedSolve:
+    """Everything the solver step needs, plus what the response reports about prediction."""
+
+    def __init__(self, gamme, solver_config: Dict[str, Any], rendement_matrix: RendementMatrix,
+                 candidates: Optional[CandidateSet], model_version: str):
+        self.gamme = gamme
+        self.solver_config = solver_config
+        self.rendement_matrix = rendement_matrix
+        self.candidates = candidates
+        self.model_version = model_version
+
+    @property
+    def candidates_by_operation(self):
+        return self.candidates.by_operation() if self.candidates is not None else None
+
+
+def prepare_solve(request_data: Dict[str, Any], bundle: ModelBundle, rendement_mode: Optional[str] = None,
+                  prune: Optional[bool] = None, timings: Optional[PhaseTimings] = None) -> PreparedSolve:
+    """Prunes the grid (optionally), predicts the rendement matrix and builds the solver inputs."""
+    # 0. Optionally prune the employee x operation grid
+    candidates = None
+    if config.PRUNE_CANDIDATES if prune is None else prune:
+        with timed(timings, "prune"):
+            candidates = prune_candidates(
+                bundle.encoders,
+                request_data['employes'],
+                request_data['operations'],
+                min_candidates=config.PRUNE_MIN_CANDIDATES,
+                min_rendement=config.PRUNE_MIN_RENDEMENT
+            )
+        logger.info("pruned candidates", extra=fields(sample=True, **candidates.summary()))
+
+    # 1. Predict Rendement
+    rendement_matrix = predict_rendement_matrix(
+        employees=request_data['employes'],
+        operations=request_data['operations'],
+        chain_name=request_data['chaine']['nom_chaine'],
+        bundle=bundle,
+        mode=rendement_mode,
+        candidates=candidates,
+        timings=timings
+    )
+    if rendement_matrix is None or rendement_matrix.size == 0:
+        raise SolveError(400, "Rendement prediction failed or returned no results.")
+    sources = rendement_matrix.sources()
+    logger.info("predicted rendements", extra=fields(sample=True, rendements=rendement_matrix.size, **sources))
+
+    # 2. Prepare data for the solver
+    gamme_for_solver = [
+        {
+            "idOp": str(op['operation_id']),
+            "ordre": i,
+            "base_time": op['temps_execution']
+        }
+        for i, op in enumerate(request_data['operations'])
+    ]
+    solver_config = {
+        "max_operations_per_emp": request_data['parametres_production']['nbr_op_par_emp'],
+    }
+    return PreparedSolve(gamme_for_solver, solver_config, rendement_matrix, candidates, bundle.version)
+
+
+def run_solver(gamme, rendement_matrix: RendementMatrix, solver_config: Dict[str, Any],
+               candidates: Optional[Dict[str, Any]] = None,
+               should_stop: Optional[Callable[[], bool]] = None,
+               progress: Optional[Callable] = None,
+               on_milestone: Optional[Callable[[Dict[str, Any]], None]] = None,
+               timings: Optional[PhaseTimings] = None) -> Dict[str, Any]:
+    """The assignment step (greedy + local search); runs in a solver worker process."""
+    assignment_result = solve_assignment_matrix(
+        gamme=gamme,
+        rendement=rendement_matrix,
+        config=solver_config,
+        candidates=candidates,
+        should_stop=should_stop,
+        progress=progress,
+        on_milestone=on_milestone,
+        timings=timings
+    )
+    logger.info("assignment plan generated", extra=fields(sample=True, makespan=assignment_result["metrics"].get("makespan"),
+                                                          **assignment_result.get("search", {})))
+    return assignment_result
+
+
+def build_response(prepared: PreparedSolve, assignment_result: Dict[str, Any],
+                   include_rendements: bool = False, response_format: str = "records") -> Dict[str, Any]:
+    """
+    The /solve response, with predicted_rendements if the client asked for them
+    (timings are added by the caller). response_format="columnar": see core.responses;
+    "ndjson": predicted_rendements is the RendementMatrix itself, streamed by the caller.
+    """
+    matrix = prepared.rendement_matrix
+    if response_format == "columnar":
+        plan = columnar_plan(assignment_result, matrix.emp_ids)
+        rendements = matrix.to_columnar() if include_rendements else None
+    elif response_format == "ndjson":
+        plan = assignment_result
+        rendements = matrix if include_rendements else None
+    else:
+        plan = assignment_result
+        rendements = matrix.to_records() if include_rendements else None
+    return {
+        "assignment_plan": plan,
+        "predicted_rendements": rendements,
+        "rendement_sources": matrix.sources(),
+        "candidates": prepared.candidates.summary() if prepared.candidates is not None else None,
+        "model_version": prepared.model_version,
+        "instance": {
+            "operations": len(prepared.gamme),
+            "expanded_operations": len(assignment_result["assignments"]),
+            "employees": len(matrix.emp_ids),
+        }
+    }
+
+
+def solve_request(request_data: Dict[str, Any], bundle: ModelBundle, rendement_mode: Optional[str] = None,
+                  prune: Optional[bool] = None, include_rendements: bool = False,
+                  should_stop: Optional[Callable[[], bool]] = None, response_format: str = "records") -> Dict[str, Any]:
+    """The whole pipeline in the calling thread."""
+    timings = PhaseTimings()
+    with timings.phase("total"):
+        prepared = prepare_solve(request_data, bundle, rendement_mode, prune, timings)
+        result = run_solver(prepared.gamme, prepared.rendement_matrix, prepared.solver_config,
+                            prepared.candidates_by_operation, should_stop, timings=timings)
+        with timings.phase("response"):
+            response = build_response(prepared, result, include_rendements, response_format)
+    response["timings"] = timings.to_ms()
+    return response
@@ -0,0 +1,94 @@
+import gc
+import os
+import numpy as np
+from typing import Dict, Any, Optional
+
+from core.logs import get_logger, fields
+from core.pruning import machine_history
+from core.registry import registry, ModelBundle
+
+# ------------------------------------------------------------
+# Preload deployment: load once in the master, share with forked workers
+# ------------------------------------------------------------
+# With `gunicorn --preload` (see gunicorn.conf.py) Solver.py is imported in
+# the master before it forks its workers. Loading the bundle there means the
+# model, encoder arrays and pair index sit in pages every worker shares
+# copy-on-write. Pages only stay shared while nobody writes to them, so the
+# bundle is fully built (lazy caches included), its arrays are made
+# read-only and the loaded objects are moved out of the garbage collector's
+# reach (gc.freeze) so collections in the workers do not touch them.
+logger = get_logger(__name__)
+
+
+def _readonly_arrays(obj, seen=None):
+    """Marks every NumPy array attribute of obj (and of its array-holding attributes) read-only."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen or not hasattr(obj, "__dict__"):
+        return
+    seen.add(id(obj))
+    for value in vars(obj).values():
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        elif type(value).__module__.startswith("core."):
+            _readonly_arrays(value, seen)
+
+
+def warm_bundle(bundle: ModelBundle):
+    """Builds the bundle's lazy caches now rather than on first request in each worker."""
+    encoders = bundle.encoders
+    for _, enc in encoders.items():
+        # pd.Index builds its hash table on the first get_indexer call
+        enc.transform(enc.keys[:1])
+    encoders.pairs.lookup(encoders.pairs.keys[:1])
+    machine_history(encoders)
+
+
+def freeze_bundle(bundle: ModelBundle):
+    """Makes the bundle's arrays read-only and stops the GC from scanning it after fork."""
+    warm_bundle(bundle)
+    _readonly_arrays(bundle.encoders)
+    _readonly_arrays(bundle.backend)
+    gc.collect()
+    gc.freeze()
+
+
+def preload() -> bool:
+    """
+    Loads and freezes the configured model in the current (master) process.
+
+    Returns:
+        True if a bundle is active.
+    """
+    if not registry.ensure_loaded():
+        return False
+    freeze_bundle(registry.active)
+    report = process_memory()
+    logger.info("preloaded %s in master pid %s", registry.active.version, os.getpid(),
+                extra=fields(rss_mb=round(report.get('rss_mb', 0), 1)))
+    return True
+
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Memory of a process from /proc (Linux). `pss_mb` counts shared pages
+    divided by the number of processes sharing them, so the sum of the
+    workers' PSS is what they really cost together; `shared_mb` is what a
+    worker shares with the master and its siblings.
+    """
+    pid = pid or os.getpid()
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    except OSError:
+        return {"pid": pid}
+    return {
+        "pid": pid,
+        "rss_mb": round(fields.get("Rss", 0.0), 1),
+        "pss_mb": round(fields.get("Pss", 0.0), 1),
+        "shared_mb": round(fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0), 1),
+        "private_mb": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0), 1),
+    }
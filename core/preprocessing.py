@@ -1,37 +1,197 @@
-import pandas as pd
-import joblib
-from typing import List, Dict, Any
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterator
+
+from config import config
+from core.backends import FEATURE_COLUMNS
+from core.encoders import pair_keys
+from core.logs import get_logger
+from core.metrics import observe_lookups, HISTORY_LOOKUPS, PREDICTED_PAIRS
+from core.pruning import CandidateSet
+from core.registry import registry, ModelBundle
+from core.timing import PhaseTimings, timed
+
+RENDEMENT_MODES = ("model", "hybrid")
+
+logger = get_logger(__name__)
 
 # ------------------------------------------------------------
-# Load model + encoders
+# Model + encoders live in the registry (lazily loaded, hot-swappable)
 # ------------------------------------------------------------
-try:
-    model = joblib.load("equilibrage_model_XGBRegressorMtest.pkl")
-    agg_df = pd.read_csv("input/agg.csv")
 
-    # Precompute encoders
-    enc_emp_map = agg_df.groupby("IDEmploye")["avg_rendement"].mean()
-    enc_op_map = agg_df.groupby("IDOperation")["avg_rendement"].mean()
-    enc_machine_map = agg_df.groupby("most_used_machine")["avg_rendement"].mean()
-    enc_chain_map = agg_df.groupby("most_used_chain")["avg_rendement"].mean()
 
-    EMP_FALLBACK = float(enc_emp_map.mean())
-    OP_FALLBACK = float(enc_op_map.mean())
-    MACHINE_FALLBACK = float(enc_machine_map.mean())
-    CHAIN_FALLBACK = float(enc_chain_map.mean())
+def load_resources() -> bool:
+    """
+    Loads the configured model and encoders once. Safe to call from several
+    threads; only the first call does the work.
+
+    Returns:
+        True if a model bundle is available.
+    """
+    return registry.ensure_loaded()
+
+
+def is_ready() -> bool:
+    """Readiness flag: True once a model bundle is active."""
+    return registry.is_ready()
+
+
+def build_features(encoders, employees: List[int], operations: List[Dict[str, Any]], chain_name: str) -> np.ndarray:
+    """
+    Builds the float32 feature matrix for every employee-operation combination,
+    employee-major (row e * len(operations) + o). Each category is encoded once
+    per distinct value instead of once per row.
+    """
+    n_emp, n_ops = len(employees), len(operations)
+
+    def encode(name, values):
+        encoded, found = getattr(encoders, name).lookup(values)
+        observe_lookups(name, found)
+        return encoded
+
+    emp_enc = encode("emp", [int(e) for e in employees])
+    op_enc = encode("op", [int(op['operation_id']) for op in operations])
+    # Get machine from op if available
+    machine_enc = encode("machine", [op.get("machine", "UNKNOWN") for op in operations])
+    chain_enc = encode("chain", [chain_name])[0]
+    temps = np.array([float(op['temps_execution']) for op in operations])
+
+    X = np.empty((n_emp * n_ops, len(FEATURE_COLUMNS)), dtype=np.float32)
+    X[:, 0] = np.repeat(emp_enc, n_ops)
+    X[:, 1] = np.tile(op_enc, n_emp)
+    X[:, 2] = np.tile(temps, n_emp)
+    X[:, 3] = np.tile(machine_enc, n_emp)
+    X[:, 4] = chain_enc
+    return X
+
+
+# Accepted column names of a batch-prediction row (agg.csv names first, then API / DB names).
+# Machine and chain are optional; missing ones get the encoder fallback.
+INPUT_COLUMNS = {
+    "IDEmploye": ("IDEmploye", "employee_id", "id_employe", "idEmp"),
+    "IDOperation": ("IDOperation", "operation_id", "id_operation", "idOp"),
+    "avg_temps": ("avg_temps", "temps_execution", "temps", "tps"),
+    "most_used_machine": ("most_used_machine", "machine", "idMachine"),
+    "most_used_chain": ("most_used_chain", "chain", "IDChaineMontage"),
+}
+OPTIONAL_INPUT_COLUMNS = ("most_used_machine", "most_used_chain")
+
+
+def resolve_input_columns(columns) -> Dict[str, Optional[str]]:
+    """
+    Maps each model input to the column of `columns` that holds it.
+
+    Raises:
+        ValueError: if an employee, operation or time column is missing.
+    """
+    columns = list(columns)
+    resolved = {name: next((c for c in aliases if c in columns), None) for name, aliases in INPUT_COLUMNS.items()}
+    missing = [name for name, col in resolved.items() if col is None and name not in OPTIONAL_INPUT_COLUMNS]
+    if missing:
+        raise ValueError(f"Missing input columns: {', '.join(f'{m} (or {INPUT_COLUMNS[m][1:]})' for m in missing)}")
+    return resolved
+
+
+def preprocess_data(df, encoders=None, columns: Optional[Dict[str, Optional[str]]] = None) -> np.ndarray:
+    """
+    Builds the float32 feature matrix of a table of (employee, operation, time
+    [, machine, chain]) rows, one row per input row.
+
+    Args:
+        df: Input rows (see INPUT_COLUMNS for the accepted column names).
+        encoders: Encoders to use; defaults to those of the registry's active model.
+        columns: Output of resolve_input_columns, to skip resolving per chunk.
+    """
+    if encoders is None:
+        encoders = registry.get().encoders
+    columns = columns or resolve_input_columns(df.columns)
+    n = len(df)
+
+    def encode(enc, name):
+        col = columns[name]
+        return enc.transform(df[col].to_numpy()) if col is not None else np.full(n, enc.fallback)
+
+    X = np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float32)
+    X[:, 0] = encode(encoders.emp, "IDEmploye")
+    X[:, 1] = encode(encoders.op, "IDOperation")
+    X[:, 2] = df[columns["avg_temps"]].to_numpy(dtype=np.float64)
+    X[:, 3] = encode(encoders.machine, "most_used_machine")
+    X[:, 4] = encode(encoders.chain, "most_used_chain")
+    return X
+
+
+class RendementMatrix:
+    """
+    Dense (operations x employees) float32 rendement matrix with its id index,
+    handed directly from the predictor to the solver. Pruned pairs are NaN.
+    `observed` marks the cells taken from history in hybrid mode.
+    """
+
+    def __init__(self, op_ids: List[str], emp_ids: List[str], values: np.ndarray,
+                 observed: Optional[np.ndarray] = None):
+        self.op_ids = op_ids
+        self.emp_ids = emp_ids
+        self.values = values
+        self.observed = observed
+
+    @property
+    def size(self) -> int:
+        return int(np.count_nonzero(~np.isnan(self.values)))
+
+    def sources(self) -> Dict[str, int]:
+        """Counts observed vs model-predicted pairs."""
+        observed = int(self.observed.sum()) if self.observed is not None else 0
+        return {"observed": observed, "predicted": self.size - observed}
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """
+        The public list-of-dicts form ('idEmp', 'idOp', 'rendement' and, in hybrid
+        mode, 'source'), employee-major like the original predictor output.
+        """
+        values = self.values.T.ravel()
+        keep = ~np.isnan(values)
+        emp_col = np.repeat(self.emp_ids, len(self.op_ids))[keep].tolist()
+        op_col = np.tile(self.op_ids, len(self.emp_ids))[keep].tolist()
+        rendement = values[keep].tolist()
+        if self.observed is None:
+            return [
+                {"idEmp": emp, "idOp": op, "rendement": float(round(r, 3))}
+                for emp, op, r in zip(emp_col, op_col, rendement)
+            ]
+        observed = self.observed.T.ravel()[keep].tolist()
+        return [
+            {"idEmp": emp, "idOp": op, "rendement": float(round(r, 3)), "source": "observed" if seen else "predicted"}
+            for emp, op, r, seen in zip(emp_col, op_col, rendement, observed)
+        ]
 
-    print("=== Encoders loaded successfully ===")
+    def iter_records(self, batch_size: int = 2000) -> Iterator[List[Dict[str, Any]]]:
+        """to_records() in batches of about batch_size records (whole employees), same order."""
+        step = max(1, batch_size // max(1, len(self.op_ids)))
+        for start in range(0, len(self.emp_ids), step):
+            columns = slice(start, start + step)
+            yield RendementMatrix(self.op_ids, self.emp_ids[columns], self.values[:, columns],
+                                  self.observed[:, columns] if self.observed is not None else None).to_records()
 
-except FileNotFoundError as e:
-    print(f"Error loading model or data: {e}")
-    print("Please ensure 'equilibrage_model_XGBRegressor.pkl' and 'input/agg.csv' are in the correct paths.")
-    # Assign dummy values to allow import to succeed
-    model = None
-    EMP_FALLBACK, OP_FALLBACK, MACHINE_FALLBACK, CHAIN_FALLBACK = 0.85, 0.85, 0.85, 0.85
-    enc_emp_map, enc_op_map, enc_machine_map, enc_chain_map = {}, {}, {}, {}
+    def to_columnar(self) -> Dict[str, Any]:
+        """
+        The dense form: {"operations": [...], "employees": [...], "values":
+        operations x employees rendements (null for pruned pairs) and, in hybrid
+        mode, "observed" with the same shape}.
+        """
+        values = np.round(self.values.astype(np.float64), 3)
+        rows = values.tolist()
+        if np.isnan(values).any():
+            rows = [[None if v != v else v for v in row] for row in rows]
+        columnar = {"operations": list(self.op_ids), "employees": list(self.emp_ids), "values": rows}
+        if self.observed is not None:
+            columnar["observed"] = self.observed.tolist()
+        return columnar
 
 
-def predict_rendement(employees: List[int], operations: List[Dict[str, Any]], chain_name: str) -> List[Dict[str, Any]]:
+def predict_rendement_matrix(employees: List[int], operations: List[Dict[str, Any]], chain_name: str,
+                             bundle: Optional[ModelBundle] = None, mode: Optional[str] = None,
+                             min_samples: Optional[int] = None,
+                             candidates: Optional[CandidateSet] = None,
+                             timings: Optional[PhaseTimings] = None) -> Optional[RendementMatrix]:
     """
     Predicts the 'rendement' for each employee-operation combination.
 
@@ -39,64 +199,75 @@ def predict_rendement(employees: List[int], operations: List[Dict[str, Any]], ch
         employees: A list of employee IDs.
         operations: A list of dictionaries, where each dictionary represents an operation.
         chain_name: The name of the production chain.
+        bundle: The model bundle to use; defaults to the registry's active one.
+        mode: "model" predicts every pair; "hybrid" uses the observed avg_rendement
+            of pairs present in agg.csv and predicts only the unseen ones.
+            Defaults to config.RENDEMENT_MODE.
+        min_samples: Minimum samples for an observed pair to be used in hybrid mode.
+        candidates: Pruned candidate pairs (core.pruning); only those pairs are
+            predicted, the others are left NaN.
+        timings: Collects the "features" and "predict" phase times (core.timing).
 
     Returns:
-        A list of dictionaries, each containing 'idEmp', 'idOp', and 'rendement'.
+        A RendementMatrix, or None if the model is not loaded or the grid is empty.
+    """
+    mode = mode or config.RENDEMENT_MODE
+    if mode not in RENDEMENT_MODES:
+        raise ValueError(f"Unknown rendement mode '{mode}', expected one of {RENDEMENT_MODES}")
+
+    bundle = bundle or registry.get()
+    if bundle is None:
+        logger.warning("model not loaded, returning no predictions")
+        return None
+
+    employee_ids = [int(emp_id) for emp_id in employees]
+    operation_ids = [int(op['operation_id']) for op in operations]
+    if not employee_ids or not operation_ids:
+        return None
+    n_emp, n_ops = len(employee_ids), len(operation_ids)
+
+    # 1-3) Build the (employees x operations) feature matrix
+    with timed(timings, "features"):
+        X = build_features(bundle.encoders, employee_ids, operations, chain_name)
+    keep = candidates.mask.ravel() if candidates is not None else np.ones(n_emp * n_ops, dtype=bool)
+
+    # 4) Predict (hybrid: only the pairs without enough history, in one batch)
+    values = np.full(n_emp * n_ops, np.nan, dtype=np.float32)
+    observed = None
+    if mode == "hybrid":
+        keys = pair_keys(np.repeat(employee_ids, n_ops), np.tile(operation_ids, n_emp))
+        rendement, observed = bundle.encoders.pairs.lookup(
+            keys, config.HISTORY_MIN_SAMPLES if min_samples is None else min_samples
+        )
+        observed &= keep
+        values[observed] = rendement[observed]
+        to_predict = keep & ~observed
+        HISTORY_LOOKUPS.inc(int(observed.sum()), result="hit")
+        HISTORY_LOOKUPS.inc(int(to_predict.sum()), result="miss")
+    else:
+        to_predict = keep
+    PREDICTED_PAIRS.inc(int(to_predict.sum()))
+    if to_predict.any():
+        with timed(timings, "predict"):
+            values[to_predict] = bundle.backend.predict(X[to_predict])
+
+    # 5) (employees x operations) rows -> (operations x employees) matrix
+    return RendementMatrix(
+        [str(o) for o in operation_ids],
+        [str(e) for e in employee_ids],
+        np.ascontiguousarray(values.reshape(n_emp, n_ops).T),
+        np.ascontiguousarray(observed.reshape(n_emp, n_ops).T) if observed is not None else None
+    )
+
+
+def predict_rendement(employees: List[int], operations: List[Dict[str, Any]], chain_name: str,
+                      bundle: Optional[ModelBundle] = None, mode: Optional[str] = None,
+                      min_samples: Optional[int] = None,
+                      candidates: Optional[CandidateSet] = None) -> List[Dict[str, Any]]:
+    """
+    Same as predict_rendement_matrix, formatted as a list of dictionaries, each
+    containing 'idEmp', 'idOp', and 'rendement' (plus 'source': 'observed' or
+    'predicted' in hybrid mode).
     """
-    if model is None:
-        print("Model not loaded. Returning empty predictions.")
-        return []
-
-    # 1) Build dataframe of combinations
-    rows = []
-    for emp_id in employees:
-        for op in operations:
-            rows.append({
-                "IDEmploye": int(emp_id),
-                "IDOperation": int(op['operation_id']),
-                "avg_temps": float(op['temps_execution']),
-                "most_used_machine": op.get("machine", "UNKNOWN"), # Get machine from op if available
-                "most_used_chain": chain_name
-            })
-
-    if not rows:
-        return []
-
-    df = pd.DataFrame(rows)
-
-    # 2) ENCODING
-    df["IDEmploye_encoded"] = df["IDEmploye"].map(enc_emp_map)
-    df["IDOperation_encoded"] = df["IDOperation"].map(enc_op_map)
-    df["most_used_machine_encoded"] = df["most_used_machine"].map(enc_machine_map)
-    df["most_used_chain_encoded"] = df["most_used_chain"].map(enc_chain_map)
-
-    # *** SECONDARY FIX: Use modern pandas syntax to fill missing values ***
-    df.fillna({
-        "IDEmploye_encoded": EMP_FALLBACK,
-        "IDOperation_encoded": OP_FALLBACK,
-        "most_used_machine_encoded": MACHINE_FALLBACK,
-        "most_used_chain_encoded": CHAIN_FALLBACK
-    }, inplace=True)
-
-    # 3) Build feature matrix
-    X = df[[
-        "IDEmploye_encoded",
-        "IDOperation_encoded",
-        "avg_temps",
-        "most_used_machine_encoded",
-        "most_used_chain_encoded"
-    ]]
-
-    # 4) Predict
-    df["predicted_rendement"] = model.predict(X)
-
-    # 5) Format output
-    output = []
-    for _, row in df.iterrows():
-        output.append({
-            "idEmp": str(row["IDEmploye"]),
-            "idOp": str(row["IDOperation"]),
-            "rendement": float(round(row["predicted_rendement"], 3))
-        })
-
-    return output
+    matrix = predict_rendement_matrix(employees, operations, chain_name, bundle, mode, min_samples, candidates)
+    return matrix.to_records() if matrix is not None else []
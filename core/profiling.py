@@ -0,0 +1,153 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Any, Optional, Callable, List, Tuple
+
+# ------------------------------------------------------------
+# Opt-in per-request profiling (X-Profile header / ?profile=true)
+# ------------------------------------------------------------
+# A profiled /solve runs each of its steps under a SegmentProfiler where the
+# step runs (prediction in a thread of the API process, the local search in
+# a solver process): cProfile for the per-function table, plus a thread
+# sampling its own stack every few ms for real call stacks. The segments are
+# merged in the API process into <id>.prof (pstats / snakeviz) and
+# <id>.collapsed ("frame;frame;frame count" lines for flamegraph.pl or
+# speedscope) in PROFILE_DIR. A ProfileGate limits how often that happens.
+SAMPLE_INTERVAL_S = 0.005
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class SegmentProfiler:
+    """cProfile + stack sampling of the calling thread while active (a context manager)."""
+
+    def __init__(self, label: str, interval: float = SAMPLE_INTERVAL_S):
+        self.label = label
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._profile = cProfile.Profile()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._root = None  # frame that entered the profiler; the frames above it are left out
+
+    def _sample(self, thread_id: int):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None and frame is not self._root:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join([self.label] + stack[::-1])] += 1
+
+    def __enter__(self):
+        self._root = sys._getframe(1)
+        self._sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),),
+                                         name="profile-sampler", daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self._profile.disable()
+        self._stop.set()
+        self._sampler.join()
+
+    def segment(self) -> Tuple[str, Dict, Counter]:
+        """Picklable result: (label, pstats stats dict, collapsed stack counts)."""
+        self._profile.create_stats()
+        return self.label, self._profile.stats, self.stacks
+
+
+def profiled(label: str, fn: Callable, *args) -> Tuple[Any, Tuple[str, Dict, Counter]]:
+    """Runs fn(*args) under a SegmentProfiler; returns (result, segment)."""
+    with SegmentProfiler(label) as profiler:
+        result = fn(*args)
+    return result, profiler.segment()
+
+
+class _StatsHolder:
+    # what pstats.Stats.add accepts besides files and Profile objects
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class ProfileCollector:
+    """The segments of one profiled request, written out as .prof + .collapsed."""
+
+    def __init__(self, profile_id: Optional[str] = None):
+        self.id = profile_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.segments: List[Tuple[str, Dict, Counter]] = []
+
+    def add(self, segment: Tuple[str, Dict, Counter]):
+        self.segments.append(segment)
+
+    def write(self, directory: str, keep: int = 0) -> Dict[str, str]:
+        """Writes the merged profile; with keep > 0, only the newest `keep` profiles stay in `directory`."""
+        os.makedirs(directory, exist_ok=True)
+        stats = pstats.Stats()
+        stacks: Counter = Counter()
+        for _, segment_stats, segment_stacks in self.segments:
+            stats.add(_StatsHolder(segment_stats))
+            stacks.update(segment_stacks)
+        prof_path = os.path.join(directory, f"{self.id}.prof")
+        collapsed_path = os.path.join(directory, f"{self.id}.collapsed")
+        stats.dump_stats(prof_path)
+        with open(collapsed_path, "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        if keep > 0:
+            _prune(directory, keep)
+        return {"id": self.id, "prof": prof_path, "collapsed": collapsed_path,
+                "segments": [label for label, _, _ in self.segments], "samples": sum(stacks.values())}
+
+
+def _prune(directory: str, keep: int):
+    profiles = sorted((f for f in os.listdir(directory) if f.endswith(".prof")),
+                      key=lambda f: os.path.getmtime(os.path.join(directory, f)))
+    for name in profiles[:-keep]:
+        for suffix in (".prof", ".collapsed"):
+            try:
+                os.remove(os.path.join(directory, name[:-len(".prof")] + suffix))
+            except FileNotFoundError:
+                pass
+
+
+class ProfileGate:
+    """
+    Allows at most one profiled request per `min_interval_s` (and one at a
+    time), so profiling can stay enabled in production.
+    """
+
+    def __init__(self, enabled: bool, min_interval_s: float):
+        self.enabled = enabled
+        self.min_interval_s = min_interval_s
+        self._last = float("-inf")
+        self._active = False
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> str:
+        """'granted', 'disabled' or 'rate-limited'."""
+        if not self.enabled:
+            return "disabled"
+        with self._lock:
+            now = time.monotonic()
+            if self._active or now - self._last < self.min_interval_s:
+                return "rate-limited"
+            self._active = True
+            self._last = now
+            return "granted"
+
+    def release(self):
+        with self._lock:
+            self._active = False
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any
+
+from core.encoders import Encoders, pair_keys
+
+# ------------------------------------------------------------
+# Candidate pruning of the employee x operation grid
+# ------------------------------------------------------------
+
+
+class MachineHistory:
+    """Which machines each employee has worked on, and the usual machine of each operation (from agg.csv)."""
+
+    def __init__(self, encoders: Encoders):
+        pairs = encoders.pairs
+        known = pairs.machine >= 0
+        emp_ids = pairs.keys >> 32
+        op_ids = pairs.keys & 0xFFFFFFFF
+        # sorted (employee << 32 | machine) keys of every machine an employee has used
+        self.emp_machine_keys = np.unique(pair_keys(emp_ids[known], pairs.machine[known]))
+        # most frequent machine per operation
+        counts = pd.DataFrame({"op": op_ids[known], "machine": pairs.machine[known]}).value_counts()
+        dominant = counts.reset_index().drop_duplicates("op")
+        self.op_machine = pd.Series(dominant["machine"].to_numpy(), index=dominant["op"].to_numpy())
+
+    def operation_machines(self, operation_ids: List[int]) -> np.ndarray:
+        """Usual machine of each operation, -1 if the operation has no history."""
+        return self.op_machine.reindex(operation_ids).fillna(-1).to_numpy(dtype=np.int64)
+
+    def has_worked_on(self, employee_ids: np.ndarray, machines: np.ndarray) -> np.ndarray:
+        keys = pair_keys(employee_ids, np.maximum(machines, 0))
+        pos = np.minimum(np.searchsorted(self.emp_machine_keys, keys), max(len(self.emp_machine_keys) - 1, 0))
+        found = self.emp_machine_keys[pos] == keys if len(self.emp_machine_keys) else np.zeros(len(keys), dtype=bool)
+        return found & (machines >= 0)
+
+
+def machine_history(encoders: Encoders) -> MachineHistory:
+    """MachineHistory of an Encoders object, built on first use and kept with it."""
+    history = getattr(encoders, "_machine_history", None)
+    if history is None:
+        history = MachineHistory(encoders)
+        encoders._machine_history = history
+    return history
+
+
+class CandidateSet:
+    """
+    Boolean (employees x operations) mask of the pairs kept after pruning,
+    with the ids it is indexed by.
+    """
+
+    def __init__(self, employee_ids: List[int], operation_ids: List[int], mask: np.ndarray):
+        self.employee_ids = list(employee_ids)
+        self.operation_ids = list(operation_ids)
+        self.mask = mask
+
+    @property
+    def size(self) -> int:
+        return int(self.mask.sum())
+
+    def by_operation(self) -> Dict[str, List[str]]:
+        """Sparse form for the solver: operation id -> candidate employee ids (as strings)."""
+        emp_ids = np.array([str(e) for e in self.employee_ids])
+        return {str(op): emp_ids[self.mask[:, j]].tolist() for j, op in enumerate(self.operation_ids)}
+
+    def summary(self) -> Dict[str, Any]:
+        full = self.mask.size
+        return {
+            "pairs_kept": self.size,
+            "pairs_total": full,
+            "kept_ratio": round(self.size / full, 3) if full else 1.0,
+            "min_candidates_per_op": int(self.mask.sum(axis=0).min()) if full else 0,
+        }
+
+
+def prune_candidates(encoders: Encoders, employees: List[int], operations: List[Dict[str, Any]],
+                     min_candidates: int = 3, min_rendement: float = 0.0, min_samples: int = 1) -> CandidateSet:
+    """
+    Keeps, per operation, the employees that either:
+      - have an observed rendement >= min_rendement on that operation, or
+      - have history on the operation's usual machine,
+    plus the `min_candidates` best employees by (observed or encoded) rendement,
+    so that every operation keeps enough candidates for the solver.
+    """
+    employee_ids = np.array([int(e) for e in employees], dtype=np.int64)
+    operation_ids = np.array([int(op['operation_id']) for op in operations], dtype=np.int64)
+    n_emp, n_ops = len(employee_ids), len(operation_ids)
+    if n_emp == 0 or n_ops == 0:
+        return CandidateSet(employee_ids.tolist(), operation_ids.tolist(), np.zeros((n_emp, n_ops), dtype=bool))
+
+    grid_emp = np.repeat(employee_ids, n_ops)
+    grid_op = np.tile(operation_ids, n_emp)
+    rendement, observed = encoders.pairs.lookup(pair_keys(grid_emp, grid_op), min_samples)
+    by_history = observed & (rendement >= min_rendement)
+
+    history = machine_history(encoders)
+    by_machine = history.has_worked_on(grid_emp, np.tile(history.operation_machines(operation_ids), n_emp))
+
+    mask = (by_history | by_machine).reshape(n_emp, n_ops)
+
+    # top `min_candidates` employees per operation, by observed or encoded rendement
+    k = min(int(min_candidates), n_emp)
+    if k > 0:
+        score = np.where(observed, rendement, np.repeat(encoders.emp.transform(employee_ids), n_ops))
+        top = np.argsort(-score.reshape(n_emp, n_ops), axis=0, kind="stable")[:k]
+        mask[top, np.arange(n_ops)] = True
+
+    return CandidateSet(employee_ids.tolist(), operation_ids.tolist(), mask)
@@ -0,0 +1,244 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+import numpy as np
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+from config import config
+from core.backends import FEATURE_COLUMNS, make_backend, load_model_artifact, artifact_backend
+from core.encoders import load_encoders
+from core.logs import get_logger, fields
+
+# ------------------------------------------------------------
+# Model registry: versioned model + encoders, hot-swapped atomically
+# ------------------------------------------------------------
+logger = get_logger(__name__)
+
+
+class ModelBundle:
+    """A model and the encoders it was trained with, loaded and ready to predict."""
+
+    def __init__(self, version: str, model_path: str, model, encoders, backend, load_stats: Dict[str, Any]):
+        self.version = version
+        self.model_path = model_path
+        self.model = model
+        self.encoders = encoders
+        self.backend = backend
+        self.load_stats = load_stats
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+        # (staging file, artifact path) of encoders rebuilt for this bundle, moved into place on activation
+        self.staged_encoders: Optional[Tuple[str, str]] = None
+
+    def discard_staged(self):
+        if self.staged_encoders is not None:
+            _remove_quietly(self.staged_encoders[0])
+            self.staged_encoders = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "model_path": self.model_path,
+            "backend": self.backend.name,
+            "loaded_at": self.loaded_at,
+            "load_stats": self.load_stats,
+        }
+
+
+def model_version(model_path: str) -> str:
+    """Version tag of a model artifact: file name + short content hash."""
+    h = hashlib.sha1()
+    with open(model_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    return f"{name}@{h.hexdigest()[:8]}"
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def load_bundle(model_path: str, agg_path: str, encoders_path: str,
+                backend_name: str, nthread: Optional[int] = None, version: Optional[str] = None,
+                stage_encoders: bool = False) -> ModelBundle:
+    """
+    With stage_encoders, encoders rebuilt from agg_path are written to a
+    staging file instead of encoders_path (which the live bundle may use):
+    ModelRegistry moves it into place when the bundle goes live.
+    """
+    t0 = time.perf_counter()
+    staging_path = f"{encoders_path}.{uuid.uuid4().hex[:8]}.staged" if stage_encoders else None
+    encoders, encoders_source = load_encoders(agg_path, encoders_path, staging_path)
+    t1 = time.perf_counter()
+    try:
+        model = load_model_artifact(model_path, nthread)
+        backend = make_backend(artifact_backend(model_path) or backend_name, model, nthread)
+    except Exception:
+        if staging_path is not None:
+            _remove_quietly(staging_path)
+        raise
+    t2 = time.perf_counter()
+    load_stats = {
+        "backend": backend.name,
+        "encoders_source": encoders_source,
+        "encoders_load_s": round(t1 - t0, 4),
+        "model_load_s": round(t2 - t1, 4),
+        "total_s": round(t2 - t0, 4),
+    }
+    bundle = ModelBundle(version or model_version(model_path), model_path, model, encoders, backend, load_stats)
+    if staging_path is not None and encoders_source == "csv":
+        bundle.staged_encoders = (staging_path, encoders_path)
+    return bundle
+
+
+def smoke_test(bundle: ModelBundle, n_emp: int = 5, n_ops: int = 5):
+    """
+    Predicts a small grid of known employees/operations and checks the output
+    is usable. Raises ValueError if the bundle should not go live.
+    """
+    enc = bundle.encoders
+    emp_enc = enc.emp.values[:n_emp]
+    op_enc = enc.op.values[:n_ops]
+    X = np.empty((len(emp_enc) * len(op_enc), len(FEATURE_COLUMNS)), dtype=np.float32)
+    X[:, 0] = np.repeat(emp_enc, len(op_enc))
+    X[:, 1] = np.tile(op_enc, len(emp_enc))
+    X[:, 2] = np.tile(np.linspace(5.0, 60.0, len(op_enc)), len(emp_enc))
+    X[:, 3] = enc.machine.fallback
+    X[:, 4] = enc.chain.fallback
+
+    predicted = np.asarray(bundle.backend.predict(X))
+    if predicted.shape != (len(X),):
+        raise ValueError(f"Smoke batch returned shape {predicted.shape}, expected ({len(X)},)")
+    if not np.all(np.isfinite(predicted)):
+        raise ValueError("Smoke batch returned non-finite rendements")
+    if np.any(predicted <= 0):
+        raise ValueError("Smoke batch returned non-positive rendements")
+
+
+class ModelRegistry:
+    """
+    Holds the active ModelBundle. Readers take `registry.get()` once per
+    request and use that bundle throughout; reloads build and validate a new
+    bundle in a background thread, then replace the reference in one step.
+    """
+
+    def __init__(self):
+        self._active: Optional[ModelBundle] = None
+        self._load_lock = threading.Lock()
+        self._reload_lock = threading.Lock()  # makes reload_async's check-and-start atomic
+        self._reload_thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        self.history: List[Dict[str, Any]] = []
+
+    @property
+    def active(self) -> Optional[ModelBundle]:
+        return self._active
+
+    def is_ready(self) -> bool:
+        return self._active is not None
+
+    def get(self) -> Optional[ModelBundle]:
+        """Active bundle, loading the configured default model on first use."""
+        if self._active is None:
+            self.ensure_loaded()
+        return self._active
+
+    def ensure_loaded(self) -> bool:
+        """Loads the configured default model once (startup hook or first request)."""
+        if self._active is not None:
+            return True
+        with self._load_lock:
+            if self._active is not None:
+                return True
+            try:
+                self._activate(self._load(config.MODEL_PATH, config.AGG_PATH, config.ENCODERS_PATH))
+            except (FileNotFoundError, ValueError) as e:
+                logger.error("could not load the model or its data, check the paths: %s", e,
+                             extra=fields(model_path=config.MODEL_PATH, agg_path=config.AGG_PATH))
+                self.last_error = str(e)
+                return False
+        return True
+
+    def reload_async(self, model_path: str, agg_path: Optional[str] = None,
+                     encoders_path: Optional[str] = None, version: Optional[str] = None) -> bool:
+        """
+        Starts loading a new bundle in the background. The current bundle keeps
+        serving until the new one passed its smoke test.
+
+        Returns:
+            False if another reload is still running.
+        """
+        with self._reload_lock:
+            if self.reloading:
+                return False
+            self._reload_thread = threading.Thread(
+                target=self._reload,
+                args=(model_path, agg_path or config.AGG_PATH, encoders_path or config.ENCODERS_PATH, version),
+                daemon=True
+            )
+            self._reload_thread.start()
+        return True
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_thread is not None and self._reload_thread.is_alive()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready(),
+            "active": self._active.describe() if self._active else None,
+            "reloading": self.reloading,
+            "last_error": self.last_error,
+            "history": self.history[-10:],
+        }
+
+    def _load(self, model_path, agg_path, encoders_path, version=None, stage_encoders=False) -> ModelBundle:
+        bundle = load_bundle(model_path, agg_path, encoders_path,
+                             config.PREDICT_BACKEND, config.PREDICT_NTHREAD, version, stage_encoders)
+        try:
+            smoke_test(bundle)
+        except Exception:
+            bundle.discard_staged()
+            raise
+        return bundle
+
+    def _activate(self, bundle: ModelBundle):
+        if bundle.staged_encoders is not None:
+            staged, artifact_path = bundle.staged_encoders
+            try:
+                os.replace(staged, artifact_path)
+            except OSError as e:  # the bundle already holds its encoders; only the cached file is missing
+                logger.warning("could not move rebuilt encoders to %s: %s", artifact_path, e)
+                _remove_quietly(staged)
+            bundle.staged_encoders = None
+        previous = self._active
+        self._active = bundle
+        self.last_error = None
+        self.history.append({
+            "version": bundle.version,
+            "previous": previous.version if previous else None,
+            "activated_at": datetime.now().isoformat(timespec="seconds"),
+        })
+        logger.info("model %s active", bundle.version, extra=fields(load_s=round(bundle.load_stats['total_s'], 3)))
+
+    def _reload(self, model_path, agg_path, encoders_path, version):
+        try:
+            # a rebuilt encoder artifact only replaces the file on disk if the bundle goes live
+            bundle = self._load(model_path, agg_path, encoders_path, version, stage_encoders=True)
+        except Exception as e:
+            logger.error("model reload from %s failed, keeping %s: %s", model_path,
+                         self._active.version if self._active else None, e)
+            self.last_error = f"{model_path}: {e}"
+            return
+        with self._load_lock:
+            self._activate(bundle)
+
+
+# Process-wide registry used by the API
+registry = ModelRegistry()
@@ -0,0 +1,142 @@
+import json
+from typing import Dict, Any, List, Optional, Iterable, Iterator
+
+import numpy as np
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the json module (several times slower on big plans)
+    orjson = None
+
+# ------------------------------------------------------------
+# /solve response shaping: columnar format, field selection, fast JSON
+# ------------------------------------------------------------
+# format=records (default) is the historical response. format=columnar
+# replaces the per-assignment dicts by index arrays into the operation and
+# employee id lists, drops metrics.emp_ops (the same information as the
+# assignments) and sends predicted_rendements as one dense matrix, so the
+# client gets its pivot table without pivoting. format=ndjson streams the
+# records response as newline-delimited JSON: a {"type": "response"} line
+# with everything but predicted_rendements, one line per rendement record,
+# sent in batches as they are serialized, then a {"type": "end"} line.
+# `fields` keeps or drops sections of any format by dotted path.
+RESPONSE_FORMATS = ("records", "columnar", "ndjson")
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_BATCH = 2000  # records serialized per chunk
+RESPONSE_SECTIONS = ("assignment_plan", "predicted_rendements", "rendement_sources", "candidates", "model_version",
+                     "instance", "timings", "scheduling", "profile", "stopped_by_client")
+
+
+def columnar_plan(assignment_result: Dict[str, Any], emp_ids: List[str]) -> Dict[str, Any]:
+    """
+    {"operations": [expanded op id, ...], "employees": [emp id, ...],
+     "assignments": {"employee": [index into employees, per operation], "time": [...]},
+     "metrics": {..., "emp_loads": [load per employee, 0 if unused]}, ...}
+    """
+    position = {emp: i for i, emp in enumerate(emp_ids)}
+    assignments = assignment_result["assignments"]
+    metrics = {k: v for k, v in assignment_result["metrics"].items() if k not in ("emp_ops", "emp_loads")}
+    loads = assignment_result["metrics"].get("emp_loads", {})
+    metrics["emp_loads"] = [loads.get(emp, 0.0) for emp in emp_ids]
+    plan = {k: v for k, v in assignment_result.items() if k not in ("assignments", "metrics")}
+    plan.update({
+        "format": "columnar",
+        "operations": [a["idOp"] for a in assignments],
+        "employees": list(emp_ids),
+        "assignments": {
+            "employee": [position[a["idEmp"]] for a in assignments],
+            "time": [round(a["time"], 4) for a in assignments],
+        },
+        "metrics": metrics,
+    })
+    return plan
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """
+    "assignment_plan,-assignment_plan.metrics.emp_ops" -> list of paths.
+
+    Raises:
+        ValueError: a path does not start with a response section.
+    """
+    paths = [f.strip() for f in (fields or "").split(",") if f.strip()]
+    for path in paths:
+        if path.lstrip("-").split(".")[0] not in RESPONSE_SECTIONS:
+            raise ValueError(f"Unknown field '{path.lstrip('-')}', expected one of {list(RESPONSE_SECTIONS)}")
+    return paths
+
+
+def _pick(source: Dict[str, Any], path: List[str], target: Dict[str, Any], full_path: str):
+    key = path[0]
+    if not isinstance(source, dict) or key not in source:
+        raise ValueError(f"Unknown field '{full_path}'")
+    if len(path) == 1:
+        target[key] = source[key]
+    elif target.get(key) is not source[key]:  # else the whole section is already kept
+        _pick(source[key], path[1:], target.setdefault(key, {}), full_path)
+
+
+def _without(node: Any, path: List[str]) -> Any:
+    # copies along the path instead of popping: the solve result is not ours to modify
+    if not isinstance(node, dict) or path[0] not in node:
+        return node
+    if len(path) == 1:
+        return {k: v for k, v in node.items() if k != path[0]}
+    return {**node, path[0]: _without(node[path[0]], path[1:])}
+
+
+def select_fields(response: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """
+    Keeps the listed dotted paths (e.g. "assignment_plan.assignments,timings")
+    and drops the ones prefixed with "-" (e.g. "-assignment_plan.metrics.emp_ops").
+
+    Raises:
+        ValueError: a kept path does not exist in the response.
+    """
+    keep = [f for f in fields if not f.startswith("-")]
+    if keep:
+        selected: Dict[str, Any] = {}
+        for path in keep:
+            _pick(response, path.split("."), selected, path)
+        response = selected
+    for path in (f[1:] for f in fields if f.startswith("-")):
+        response = _without(response, path.split("."))
+    return response
+
+
+def _default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def ndjson_lines(header: Dict[str, Any], batches: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    """
+    The ndjson body: header line, the records of each batch (one chunk per
+    batch), end line with the record count. Only one batch is in memory at a time.
+    """
+    yield dumps({"type": "response", **header}) + b"\n"
+    count = 0
+    for batch in batches:
+        count += len(batch)
+        yield b"".join(dumps(record) + b"\n" for record in batch)
+    yield dumps({"type": "end", "records": count}) + b"\n"
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse through orjson when installed. Return it from the endpoint
+    (rather than a dict) to also skip FastAPI's jsonable_encoder pass.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
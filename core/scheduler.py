@@ -0,0 +1,398 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque, Counter
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Callable, Awaitable, List
+
+from core.executor import SolveExecutor, SolveCancelled
+from core.metrics import metrics, observe_solve, SOLVES, LATENCY_BUCKETS
+from core.pipeline import SolveError
+from core.registry import ModelBundle
+from core.timing import PhaseTimings
+
+# ------------------------------------------------------------
+# Priority scheduler in front of the solver (parametres_production.priorite)
+# ------------------------------------------------------------
+# Every solve (/solve and /jobs) takes a ticket before running. At most
+# `capacity` tickets run at once; waiting tickets are granted by priority,
+# then arrival order. Each priority has a local-search time budget. When an
+# urgent ticket waits and every slot is busy, the lowest-priority preemptible
+# solve that ran at least `preempt_after_s` gets its budget cut: its local
+# search stops at the next iteration and returns its best plan so far.
+#
+# Admission control applies to the interactive solves of a client (/solve,
+# /solve/stream; /jobs has its own JOB_QUEUE_MAX). Instead of letting the queue and every
+# wait grow at peak, a solve is refused right away with 503 when `max_queued`
+# client solves already wait (unless it can take the place of a lower-priority
+# one, which is shed) or when its estimated wait exceeds `max_wait_s`, and
+# with 429 when its client already has `client_max` solves queued or running.
+# A queued solve still waiting after `max_wait_s` gets 503 too. Refusals carry
+# a Retry-After estimated from the recent run times. Within a priority, a
+# client's n-th pending solve goes after every other client's (n-1)-th, so
+# one client's burst does not hold the others back.
+PRIORITIES = ["Urgente", "Haute", "Moyenne", "Basse"]  # highest first
+DEFAULT_PRIORITY = "Moyenne"
+WAIT_SAMPLES = 500  # recent wait times kept per priority for the percentiles
+RUN_SAMPLES = 100  # recent run times kept for the wait estimates
+MIN_RUN_SAMPLES = 3  # run times needed before refusing on the estimated wait
+DEFAULT_RUN_S = 10.0  # assumed run time before any solve finished
+
+WAIT_TIME = metrics.histogram("scheduler_wait_seconds", "Time solves waited for a slot, by priority.",
+                              ("priority",), buckets=LATENCY_BUCKETS)
+PREEMPTIONS = metrics.counter("scheduler_preemptions_total", "Running solves cut short for a higher priority.",
+                              ("priority",))
+REJECTIONS = metrics.counter(
+    "scheduler_rejected_total",
+    "Solves refused by admission control (client_limit, queue_full, wait_estimate, wait_timeout, shed).",
+    ("reason", "priority"))
+
+
+class Overloaded(SolveError):
+    """A solve refused by admission control: 429 (client over its limit) or 503 (saturated)."""
+
+    def __init__(self, status_code: int, detail: str, reason: str, retry_after_s: int):
+        super().__init__(status_code, detail)
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+def parse_budgets(spec: str) -> Dict[str, float]:
+    """'Urgente:60,Haute:45' -> {'Urgente': 60.0, 'Haute': 45.0}"""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition(":")
+        budgets[name.strip()] = float(seconds)
+    return budgets
+
+
+def normalize_priority(priorite: Optional[str]) -> str:
+    for name in PRIORITIES:
+        if priorite and priorite.strip().lower() == name.lower():
+            return name
+    return DEFAULT_PRIORITY
+
+
+class Ticket:
+    """A solve's place in the scheduler: waiting, then running until released."""
+
+    def __init__(self, seq: int, priority: str, budget_s: Optional[float], client: Optional[str] = None,
+                 turn: int = 0, admitted: bool = False):
+        self.seq = seq
+        self.priority = priority
+        self.level = PRIORITIES.index(priority)
+        self.budget_s = budget_s
+        self.client = client
+        self.turn = turn  # the client's solves (of any kind) already pending when this one arrived
+        self.admitted = admitted  # went through admission control: counts towards its limits
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.granted = asyncio.get_running_loop().create_future()
+        self.cut_requested = False
+        self.cut_by: Optional[str] = None
+
+    def __lt__(self, other: "Ticket"):
+        return (self.level, self.turn, self.seq) < (other.level, other.turn, other.seq)
+
+    @property
+    def wait_s(self) -> float:
+        return (self.started_at or time.monotonic()) - self.enqueued_at
+
+    @property
+    def run_s(self) -> float:
+        return ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "priority": self.priority,
+            "wait_s": round(self.wait_s, 3),
+            "run_s": round(self.run_s, 3),
+            "budget_s": self.budget_s,
+            "budget_exhausted": bool(self.budget_s is not None and self.run_s >= self.budget_s),
+            "preempted_by": self.cut_by,
+        }
+
+
+class PriorityScheduler:
+    """
+    Args:
+        capacity: Solves running at once (normally the number of solver processes).
+        budgets: Local search time budget per priority, in seconds (missing = unlimited).
+        preemptible: Priorities whose running solves may be cut for a higher one.
+        preempt_after_s: Minimum run time before a solve can be cut.
+        poll_interval: Seconds between cancel / preemption checks while waiting.
+        max_queued: Admitted solves waiting at once (0 = unlimited).
+        max_wait_s: Longest wait of an admitted solve in the queue (0 = unlimited).
+        client_max: Admitted solves one client can have queued or running (0 = unlimited).
+    """
+
+    def __init__(self, capacity: int, budgets: Optional[Dict[str, float]] = None,
+                 preemptible: Optional[List[str]] = None, preempt_after_s: float = 2.0,
+                 poll_interval: float = 0.25, max_queued: int = 0, max_wait_s: float = 0.0, client_max: int = 0):
+        self.capacity = max(1, capacity)
+        self.budgets = budgets or {}
+        self.preemptible = set(preemptible if preemptible is not None else ["Moyenne", "Basse"])
+        self.preempt_after_s = preempt_after_s
+        self.poll_interval = poll_interval
+        self.max_queued = max_queued
+        self.max_wait_s = max_wait_s
+        self.client_max = client_max
+        self._waiting: List[Ticket] = []
+        self._running: List[Ticket] = []
+        self._pending = Counter()  # client -> solves queued or running, admitted or not
+        self._recent_runs = deque(maxlen=RUN_SAMPLES)
+        self._seq = itertools.count()
+        self._stats = {p: {"granted": 0, "cancelled": 0, "preempted": 0, "wait_sum_s": 0.0, "wait_max_s": 0.0,
+                           "recent_waits": deque(maxlen=WAIT_SAMPLES)} for p in PRIORITIES}
+
+    # -------------------- public API --------------------
+    @asynccontextmanager
+    async def slot(self, priorite: Optional[str], should_cancel: Optional[Callable[[], Awaitable[bool]]] = None,
+                   client: Optional[str] = None, admission: bool = True):
+        """Waits for a run slot by priority; the ticket is released on exit."""
+        ticket = await self.acquire(priorite, should_cancel, client, admission)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    async def acquire(self, priorite: Optional[str],
+                      should_cancel: Optional[Callable[[], Awaitable[bool]]] = None,
+                      client: Optional[str] = None, admission: bool = True) -> Ticket:
+        """
+        `client` is who the solve is fair-shared for. With `admission`, a
+        client's solve also goes through admission control.
+
+        Raises:
+            Overloaded: admission control refused the solve.
+            SolveCancelled: should_cancel said so while waiting.
+        """
+        priority = normalize_priority(priorite)
+        admitted = admission and client is not None
+        if admitted:
+            self.check_admission(priority, client)
+            if self.max_queued and self._queued_admitted() >= self.max_queued:
+                self._shed(self._shed_candidate(PRIORITIES.index(priority)))
+        ticket = Ticket(next(self._seq), priority, self.budgets.get(priority), client, self._pending[client], admitted)
+        self._pending[client] += 1
+        heapq.heappush(self._waiting, ticket)
+        self._dispatch()
+        try:
+            while not ticket.granted.done():
+                done, _ = await asyncio.wait({ticket.granted}, timeout=self.poll_interval)
+                if done:
+                    break
+                if should_cancel is not None and await should_cancel():
+                    self._stats[priority]["cancelled"] += 1
+                    raise SolveCancelled()
+                if admitted and self.max_wait_s and ticket.wait_s >= self.max_wait_s:
+                    raise self._refusal(503, f"No solver slot within {self.max_wait_s:g} s", "wait_timeout",
+                                        priority)
+                self._preempt()
+            ticket.granted.result()  # raises Overloaded if the ticket was shed
+        except BaseException:
+            if not ticket.granted.done() or ticket.granted.exception() is None:
+                self._leave_queue(ticket)
+            if ticket.started_at is not None:
+                self.release(ticket)  # granted while being cancelled
+            raise
+        return ticket
+
+    def check_admission(self, priorite: Optional[str], client: str):
+        """
+        Raises Overloaded if a new solve of `client` at this priority would be
+        refused right now (also checked by acquire).
+        """
+        priority = normalize_priority(priorite)
+        level = PRIORITIES.index(priority)
+        pending = sum(1 for t in self._waiting + self._running if t.admitted and t.client == client)
+        if self.client_max and pending >= self.client_max:
+            raise self._refusal(429, f"{pending} solves of this client already queued or running",
+                                "client_limit", priority,
+                                max(self.estimated_wait_s(priority), self.typical_run_s()))
+        if (self.max_queued and self._queued_admitted() >= self.max_queued
+                and self._shed_candidate(level) is None):
+            raise self._refusal(503, f"{self._queued_admitted()} solves already waiting", "queue_full", priority)
+        if self.max_wait_s and len(self._recent_runs) >= MIN_RUN_SAMPLES:
+            estimate = self.estimated_wait_s(priority)
+            if estimate > self.max_wait_s:
+                raise self._refusal(503, f"Estimated wait {estimate:.0f} s exceeds {self.max_wait_s:g} s",
+                                    "wait_estimate", priority, estimate)
+
+    def typical_run_s(self) -> float:
+        """Median of the recent run times (DEFAULT_RUN_S before any solve finished)."""
+        if not self._recent_runs:
+            return DEFAULT_RUN_S
+        runs = sorted(self._recent_runs)
+        return runs[len(runs) // 2]
+
+    def estimated_wait_s(self, priorite: Optional[str] = None) -> float:
+        """Wait of a solve arriving now: rounds of `capacity` solves ahead of it, at the typical run time."""
+        level = PRIORITIES.index(normalize_priority(priorite))
+        ahead = sum(1 for t in self._waiting if t.level <= level)
+        free = self.capacity - len(self._running)
+        if ahead < free:
+            return 0.0
+        return ((ahead - free) // self.capacity + 1) * self.typical_run_s()
+
+    def retry_after_s(self, priorite: Optional[str] = None) -> int:
+        """Retry-After value, in whole seconds, for a refused solve."""
+        return max(1, math.ceil(self.estimated_wait_s(priorite)))
+
+    async def solve(self, executor: SolveExecutor, request_data: Dict[str, Any], bundle: ModelBundle,
+                    should_cancel: Optional[Callable[[], Awaitable[bool]]] = None,
+                    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    should_cut: Optional[Callable[[], bool]] = None, client: Optional[str] = None,
+                    admission: bool = True, **options) -> Dict[str, Any]:
+        """
+        executor.solve once a slot is granted, with the priority's time budget;
+        the response gets a "scheduling" entry (priority, wait, run time, budget, cut)
+        and a "timings" entry (milliseconds per phase, see core.timing).
+        `should_cut` lets the caller stop the local search too (e.g. a planner
+        accepting the current plan). `client` and `admission` are passed to
+        acquire: an admitted solve may raise Overloaded.
+        """
+        priorite = request_data.get("parametres_production", {}).get("priorite")
+        if on_event is not None:
+            on_event({"type": "phase", "phase": "queued"})
+        priority = normalize_priority(priorite)
+        timings = PhaseTimings()
+        try:
+            with timings.phase("total"):
+                async with self.slot(priority, should_cancel, client, admission) as ticket:
+                    timings.add("queue", ticket.wait_s)
+                    WAIT_TIME.observe(ticket.wait_s, priority=priority)
+                    response = await executor.solve(
+                        request_data, bundle, should_cancel=should_cancel, on_event=on_event,
+                        should_cut=lambda: ticket.cut_requested or (should_cut is not None and should_cut()),
+                        time_budget_s=ticket.budget_s, timings=timings, **options
+                    )
+        except SolveCancelled:
+            SOLVES.inc(outcome="cancelled", priority=priority)
+            raise
+        except Overloaded:
+            SOLVES.inc(outcome="refused", priority=priority)
+            raise
+        except SolveError:
+            SOLVES.inc(outcome="rejected", priority=priority)
+            raise
+        except Exception:
+            SOLVES.inc(outcome="failed", priority=priority)
+            raise
+        response["scheduling"] = ticket.summary()
+        response["timings"] = timings.to_ms()
+        observe_solve(response, priority)
+        return response
+
+    def release(self, ticket: Ticket):
+        ticket.finished_at = time.monotonic()
+        if ticket in self._running:
+            self._running.remove(ticket)
+            self._recent_runs.append(ticket.run_s)
+            self._forget_client(ticket)
+        self._dispatch()
+
+    # -------------------- internals --------------------
+    def _queued_admitted(self) -> int:
+        return sum(1 for t in self._waiting if t.admitted)
+
+    def _forget_client(self, ticket: Ticket):
+        self._pending[ticket.client] -= 1
+        if self._pending[ticket.client] <= 0:
+            del self._pending[ticket.client]
+
+    def _leave_queue(self, ticket: Ticket):
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._forget_client(ticket)
+
+    def _refusal(self, status_code: int, detail: str, reason: str, priority: str,
+                 retry_after_s: Optional[float] = None) -> Overloaded:
+        REJECTIONS.inc(reason=reason, priority=priority)
+        retry_after = max(1, math.ceil(retry_after_s)) if retry_after_s is not None else self.retry_after_s(priority)
+        return Overloaded(status_code, detail, reason, retry_after)
+
+    def _shed_candidate(self, level: int) -> Optional[Ticket]:
+        """The admitted solve that goes last in the queue, if its priority is below `level`."""
+        candidates = [t for t in self._waiting if t.admitted and t.level > level]
+        return max(candidates) if candidates else None
+
+    def _shed(self, ticket: Optional[Ticket]):
+        if ticket is None:
+            return
+        self._leave_queue(ticket)
+        ticket.granted.set_exception(self._refusal(503, "Displaced by a higher-priority solve", "shed",
+                                                   ticket.priority))
+
+    def _dispatch(self):
+        while self._waiting and len(self._running) < self.capacity:
+            ticket = heapq.heappop(self._waiting)
+            ticket.started_at = time.monotonic()
+            self._running.append(ticket)
+            stats = self._stats[ticket.priority]
+            stats["granted"] += 1
+            stats["wait_sum_s"] += ticket.wait_s
+            stats["wait_max_s"] = max(stats["wait_max_s"], ticket.wait_s)
+            stats["recent_waits"].append(ticket.wait_s)
+            ticket.granted.set_result(True)
+        self._preempt()
+
+    def _preempt(self):
+        """Cuts the budget of one lower-priority running solve per waiting higher-priority ticket."""
+        if not self._waiting or len(self._running) < self.capacity:
+            return
+        top = self._waiting[0]
+        pending_cuts = sum(1 for t in self._running if t.cut_requested)
+        waiting_higher = sum(1 for t in self._waiting if t.level <= top.level)
+        if pending_cuts >= waiting_higher:
+            return
+        candidates = [
+            t for t in self._running
+            if not t.cut_requested and t.level > top.level and t.priority in self.preemptible
+            and t.run_s >= self.preempt_after_s
+        ]
+        if candidates:
+            victim = max(candidates, key=lambda t: (t.level, t.run_s))
+            victim.cut_requested = True
+            victim.cut_by = top.priority
+            self._stats[victim.priority]["preempted"] += 1
+            PREEMPTIONS.inc(priority=victim.priority)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, running count and wait-time statistics per priority."""
+        per_priority = {}
+        for p in PRIORITIES:
+            stats = self._stats[p]
+            recent = sorted(stats["recent_waits"])
+
+            def pct(q):
+                return round(recent[min(len(recent) - 1, int(q * len(recent)))], 3) if recent else None
+
+            per_priority[p] = {
+                "queued": sum(1 for t in self._waiting if t.priority == p),
+                "running": sum(1 for t in self._running if t.priority == p),
+                "granted": stats["granted"],
+                "cancelled_while_queued": stats["cancelled"],
+                "preempted": stats["preempted"],
+                "budget_s": self.budgets.get(p),
+                "wait_avg_s": round(stats["wait_sum_s"] / stats["granted"], 3) if stats["granted"] else None,
+                "wait_p50_s": pct(0.5),
+                "wait_p95_s": pct(0.95),
+                "wait_max_s": round(stats["wait_max_s"], 3),
+                "oldest_wait_s": round(max((t.wait_s for t in self._waiting if t.priority == p), default=0.0), 3),
+                "estimated_wait_s": round(self.estimated_wait_s(p), 3),
+            }
+        return {
+            "capacity": self.capacity,
+            "queued": len(self._waiting),
+            "running": len(self._running),
+            "clients": sum(1 for client in self._pending if client is not None),
+            "typical_run_s": round(self.typical_run_s(), 3),
+            "admission": {"max_queued": self.max_queued, "max_wait_s": self.max_wait_s,
+                          "client_max": self.client_max},
+            "priorities": per_priority,
+        }
@@ -0,0 +1,100 @@
+import asyncio
+import uuid
+from typing import Dict, Any, Optional, Callable, Awaitable, AsyncIterator
+
+from core.executor import SolveCancelled
+from core.logs import get_logger
+from core.pipeline import SolveError
+from core.responses import dumps
+
+# ------------------------------------------------------------
+# Live /solve progress over Server-Sent Events
+# ------------------------------------------------------------
+# POST /solve/stream runs the same scheduled solve as /solve and streams its
+# executor events as they happen: "accepted" (stream id), "phase", "milestone"
+# (prediction / matrix / greedy, the greedy one carrying a usable plan),
+# "improvement" / "iteration" from the local search, then "result" (the /solve
+# response) or "error". POST /solve/stream/{id}/stop stops the local search
+# and the stream ends with the best plan found so far. A client that drops
+# the connection cancels the solve.
+KEEPALIVE_S = 15.0  # comment line sent when nothing happened for that long
+
+logger = get_logger(__name__)
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+
+class SolveStream:
+    """One streamed solve: its events queue and the planner's stop request."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.stop_requested = False
+        self.closed = False
+
+    async def run(self, solve: Callable[..., Awaitable[Dict[str, Any]]]) -> AsyncIterator[str]:
+        """
+        Yields SSE frames for `solve(on_event=..., should_cancel=..., should_cut=...)`
+        (e.g. a functools.partial of PriorityScheduler.solve).
+        """
+        async def should_cancel():
+            return self.closed
+
+        task = asyncio.create_task(solve(on_event=self.events.put_nowait, should_cancel=should_cancel,
+                                         should_cut=lambda: self.stop_requested))
+        yield sse_event("accepted", {"stream_id": self.id, "stop": f"/solve/stream/{self.id}/stop"})
+        try:
+            while not task.done() or not self.events.empty():
+                getter = asyncio.ensure_future(self.events.get())
+                done, _ = await asyncio.wait({getter, task}, timeout=KEEPALIVE_S,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    event = getter.result()
+                    yield sse_event(event["type"], event)
+                else:
+                    getter.cancel()
+                    if not done:
+                        yield ": keep-alive\n\n"
+            try:
+                response = task.result()
+                if self.stop_requested:
+                    response["stopped_by_client"] = True
+                yield sse_event("result", response)
+            except SolveError as e:
+                yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+            except SolveCancelled:
+                pass
+            except Exception as e:
+                logger.exception("streamed solve %s failed", self.id)
+                yield sse_event("error", {"status_code": 500, "detail": str(e)})
+        finally:
+            # client gone (generator closed): the solve sees `closed` at its next
+            # check and cancels itself. Not awaited here, a cancelled await would
+            # cancel the task without stopping the solver process.
+            self.closed = True
+            if not task.done():
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+class StreamRegistry:
+    """Streams in progress, so /solve/stream/{id}/stop can reach them."""
+
+    def __init__(self):
+        self._streams: Dict[str, SolveStream] = {}
+
+    def open(self) -> SolveStream:
+        stream = SolveStream()
+        self._streams[stream.id] = stream
+        return stream
+
+    def close(self, stream: SolveStream):
+        self._streams.pop(stream.id, None)
+
+    def get(self, stream_id: str) -> Optional[SolveStream]:
+        return self._streams.get(stream_id)
+
+    def __len__(self):
+        return len(self._streams)
@@ -0,0 +1,67 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# ------------------------------------------------------------
+# Per-phase wall time of a /solve request
+# ------------------------------------------------------------
+# Phases, in pipeline order: queue (scheduler wait), prune, features,
+# predict (model), expand (gamme splitting), time_matrix, greedy,
+# local_search, solver_overhead (process dispatch + pickling), response,
+# and total. Returned as the response's `timings` block (milliseconds) and
+# as a Server-Timing header.
+
+
+class PhaseTimings:
+    """Seconds spent per phase, measured with time.perf_counter (monotonic)."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name: str, seconds: float):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def merge(self, seconds: Dict[str, float]):
+        for name, value in seconds.items():
+            self.add(name, value)
+
+    def to_ms(self) -> Dict[str, float]:
+        return {name: round(value * 1000, 3) for name, value in self.seconds.items()}
+
+
+@contextmanager
+def timed(timings: Optional[PhaseTimings], name: str):
+    """timings.phase(name), or nothing when the caller does not collect timings."""
+    if timings is None:
+        yield
+    else:
+        with timings.phase(name):
+            yield
+
+
+def server_timing_header(timings_ms: Dict[str, float]) -> str:
+    """{"predict": 412.5, ...} -> 'predict;dur=412.5, ...' (Server-Timing, W3C)"""
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in timings_ms.items())
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Inverse of server_timing_header; entries without a duration are skipped."""
+    timings = {}
+    for entry in filter(None, (part.strip() for part in (header or "").split(","))):
+        name, *params = [p.strip() for p in entry.split(";")]
+        for param in params:
+            key, _, value = param.partition("=")
+            if key == "dur":
+                try:
+                    timings[name] = float(value)
+                except ValueError:
+                    pass
+    return timings
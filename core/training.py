@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Iterable, List, Dict, Any, Optional
+
+from core.aggregates import RunningAggregates
+from core.backends import FEATURE_COLUMNS
+from core.encoders import Encoders, file_digest
+
+# ------------------------------------------------------------
+# Training pipeline: production records -> agg features -> XGBRegressor
+# ------------------------------------------------------------
+# Hyperparameters of the shipped equilibrage_model_XGBRegressor*.pkl models
+DEFAULT_PARAMS = {
+    "objective": "reg:squarederror",
+    "n_estimators": 100,
+    "max_depth": 10,
+    "learning_rate": 0.1,
+    "random_state": 42,
+}
+
+# File names inside a training run directory
+RUN_FILES = {
+    "model": "model.pkl",
+    "agg": "agg.csv",
+    "encoders": "encoders.npz",
+    "state": "agg_state.npz",
+    "manifest": "manifest.json",
+}
+
+
+def aggregate_chunks(chunks: Iterable[List[Dict[str, Any]]], state: Optional[RunningAggregates] = None,
+                     progress_every: int = 0) -> RunningAggregates:
+    """
+    Folds streamed chunks of production records into running aggregates.
+    Memory grows with the number of (employee, operation) pairs, not with
+    the number of records.
+    """
+    state = state or RunningAggregates()
+    t0 = time.perf_counter()
+    for i, chunk in enumerate(chunks, 1):
+        state.fold(chunk)
+        if progress_every and i % progress_every == 0:
+            print(f"  {state.records_folded} records, {len(state.pairs)} pairs "
+                  f"({state.records_folded / (time.perf_counter() - t0):.0f} rows/s)")
+    return state
+
+
+def agg_feature_matrix(agg_df: pd.DataFrame, encoders: Encoders) -> pd.DataFrame:
+    """The model's feature frame for the rows of an agg table (same encoding as at prediction time)."""
+    return pd.DataFrame({
+        FEATURE_COLUMNS[0]: encoders.emp.transform(agg_df["IDEmploye"]),
+        FEATURE_COLUMNS[1]: encoders.op.transform(agg_df["IDOperation"]),
+        FEATURE_COLUMNS[2]: agg_df["avg_temps"].to_numpy(dtype=np.float64),
+        FEATURE_COLUMNS[3]: encoders.machine.transform(agg_df["most_used_machine"]),
+        FEATURE_COLUMNS[4]: encoders.chain.transform(agg_df["most_used_chain"]),
+    }).astype(np.float32)
+
+
+def train_model(agg_df: pd.DataFrame, encoders: Encoders, params: Optional[Dict[str, Any]] = None):
+    """Fits the rendement XGBRegressor on the agg table (target: avg_rendement)."""
+    from xgboost import XGBRegressor
+
+    model = XGBRegressor(**{**DEFAULT_PARAMS, **(params or {})})
+    model.fit(agg_feature_matrix(agg_df, encoders), agg_df["avg_rendement"].to_numpy())
+    return model
+
+
+def write_run(out_dir: str, model, state: RunningAggregates, params: Dict[str, Any],
+              extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Writes the model, agg.csv, encoders.npz and the aggregate state of one
+    training run into `out_dir`. Files are written to a temporary sibling
+    directory that is renamed at the end, so a run directory is always complete.
+
+    Returns:
+        The run manifest (also written as manifest.json).
+    """
+    import joblib
+    import xgboost
+
+    tmp_dir = f"{out_dir.rstrip(os.sep)}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    paths = {name: os.path.join(tmp_dir, file) for name, file in RUN_FILES.items()}
+
+    encoders = state.publish(paths["agg"], paths["encoders"])
+    state.save(paths["state"])
+    joblib.dump(model, paths["model"])
+
+    manifest = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "xgboost_version": xgboost.__version__,
+        "params": params,
+        "features": FEATURE_COLUMNS,
+        "watermark": state.watermark,
+        "records": state.records_folded,
+        "pairs": len(encoders.pairs),
+        "encoders": {name: len(enc) for name, enc in encoders.items()},
+        "digests": {name: file_digest(paths[name]) for name in ("model", "agg", "encoders")},
+        "files": {name: file for name, file in RUN_FILES.items() if name != "manifest"},
+        **(extra or {}),
+    }
+    with open(paths["manifest"], "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+    return manifest
@@ -0,0 +1,178 @@
+import json
+import os
+import numpy as np
+
+# ------------------------------------------------------------
+# XGBoost trees flattened into NumPy node arrays
+# ------------------------------------------------------------
+ARTIFACT_VERSION = 1
+
+
+class TreeEnsemble:
+    """
+    All trees of a gbtree regressor stored as flat node arrays. Child indices
+    are global (into the concatenated arrays); leaves point to themselves so
+    the level-by-level walk can keep stepping rows that already reached one.
+    """
+
+    def __init__(self, feature, threshold, left, right, default_left, value, roots, max_depth, base_score):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float32)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.default_left = np.asarray(default_left, dtype=bool)
+        self.value = np.asarray(value, dtype=np.float32)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.max_depth = int(max_depth)
+        self.base_score = float(base_score)
+        # children interleaved as [right, left] so that child = _children[2 * node + go_left]
+        self._children = np.stack([self.right, self.left], axis=1).ravel()
+        self._feature_idx = self.feature.astype(np.int64)
+
+    @classmethod
+    def from_booster(cls, booster) -> "TreeEnsemble":
+        """Exports the trees of an xgboost Booster (or XGBRegressor)."""
+        if hasattr(booster, "get_booster"):
+            booster = booster.get_booster()
+        learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+        if learner["gradient_booster"]["name"] != "gbtree":
+            raise ValueError("Only gbtree models can be exported")
+        if learner["objective"]["name"] != "reg:squarederror":
+            raise ValueError(f"Unsupported objective {learner['objective']['name']}")
+        base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+
+        features, thresholds, lefts, rights, defaults, values, roots = [], [], [], [], [], [], []
+        max_depth, offset = 0, 0
+        for tree in learner["gradient_booster"]["model"]["trees"]:
+            left = np.asarray(tree["left_children"], dtype=np.int64)
+            right = np.asarray(tree["right_children"], dtype=np.int64)
+            n_nodes = len(left)
+            node_ids = np.arange(n_nodes)
+            is_leaf = left == -1
+
+            # depth of every node, parents always come before their children
+            depth = np.zeros(n_nodes, dtype=np.int64)
+            for node in node_ids[~is_leaf]:
+                depth[left[node]] = depth[right[node]] = depth[node] + 1
+            max_depth = max(max_depth, int(depth.max()))
+
+            split_conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+            features.append(np.where(is_leaf, 0, tree["split_indices"]))
+            thresholds.append(np.where(is_leaf, np.float32(np.inf), split_conditions))
+            lefts.append(np.where(is_leaf, node_ids, left) + offset)
+            rights.append(np.where(is_leaf, node_ids, right) + offset)
+            defaults.append(np.asarray(tree["default_left"], dtype=bool))
+            # leaf weights are stored in split_conditions for leaf nodes
+            values.append(np.where(is_leaf, split_conditions, np.float32(0)))
+            roots.append(offset)
+            offset += n_nodes
+
+        return cls(np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts),
+                   np.concatenate(rights), np.concatenate(defaults), np.concatenate(values),
+                   roots, max_depth, base_score)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Walks every row through every tree, one tree level per step, with all
+        (tree, row) positions advanced together by a handful of np.take calls.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        n_rows = X.shape[0]
+        if n_rows == 0:
+            return np.empty(0, dtype=np.float32)
+        # feature-major copy of X so that (feature, row) -> feature * n_rows + row
+        x_flat = np.ascontiguousarray(X.T).ravel()
+        has_missing = bool(np.isnan(x_flat).any())
+        cols = np.arange(n_rows, dtype=np.int64)
+
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)  # (trees, rows)
+        idx = np.empty(node.shape, dtype=np.int64)
+        x = np.empty(node.shape, dtype=np.float32)
+        go_left = np.empty(node.shape, dtype=bool)
+        for _ in range(self.max_depth):
+            np.take(self._feature_idx, node, out=idx)
+            idx *= n_rows
+            idx += cols
+            np.take(x_flat, idx, out=x)
+            np.less(x, np.take(self.threshold, node), out=go_left)
+            if has_missing:
+                missing = np.isnan(x)
+                go_left[missing] = self.default_left[node[missing]]
+            node *= 2
+            node += go_left
+            node = np.take(self._children, node)
+        return (self.value[node].sum(axis=0, dtype=np.float64) + self.base_score).astype(np.float32)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path, artifact_version=np.array(ARTIFACT_VERSION),
+            feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+            default_left=self.default_left, value=self.value, roots=self.roots,
+            max_depth=np.array(self.max_depth), base_score=np.array(self.base_score)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TreeEnsemble":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["artifact_version"]) != ARTIFACT_VERSION:
+                raise ValueError(f"Unsupported tree artifact version in {path}")
+            return cls(data["feature"], data["threshold"], data["left"], data["right"], data["default_left"],
+                       data["value"], data["roots"], int(data["max_depth"]), float(data["base_score"]))
+
+
+def check_parity(model, ensemble: TreeEnsemble, X: np.ndarray, atol: float = 1e-3) -> float:
+    """
+    Compares the NumPy evaluator with model.predict on X.
+
+    Returns:
+        The max absolute difference. Raises AssertionError above `atol`.
+    """
+    import pandas as pd
+    from core.backends import FEATURE_COLUMNS
+
+    expected = model.predict(pd.DataFrame(X, columns=FEATURE_COLUMNS))
+    max_diff = float(np.max(np.abs(ensemble.predict(X) - expected))) if len(X) else 0.0
+    assert max_diff <= atol, f"NumPy tree evaluator differs from model.predict by {max_diff:.2e}"
+    return max_diff
+
+
+if __name__ == "__main__":
+    # python -m core.tree_eval [model.pkl] : export the trees and check parity on agg.csv
+    import sys
+    import time
+    import joblib
+    import pandas as pd
+    from config import config
+    from core.encoders import load_encoders
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else config.MODEL_PATH
+    out_path = f"{os.path.splitext(model_path)[0]}.trees.npz"
+    model = joblib.load(model_path)
+    ensemble = TreeEnsemble.from_booster(model)
+    ensemble.save(out_path)
+    print(f"Exported {ensemble.n_trees} trees ({len(ensemble.feature)} nodes, depth {ensemble.max_depth}) to {out_path}")
+
+    agg_df = pd.read_csv(config.AGG_PATH)
+    encoders, _ = load_encoders(config.AGG_PATH, config.ENCODERS_PATH)
+    X = np.column_stack([
+        encoders.emp.transform(agg_df["IDEmploye"]),
+        encoders.op.transform(agg_df["IDOperation"]),
+        agg_df["avg_temps"],
+        encoders.machine.transform(agg_df["most_used_machine"]),
+        encoders.chain.transform(agg_df["most_used_chain"]),
+    ]).astype(np.float32)
+    print(f"Parity on {len(X)} agg rows: max |diff| = {check_parity(model, TreeEnsemble.load(out_path), X):.2e}")
+
+    for n_rows in (100, 1000, 5000, 20000):
+        t0 = time.perf_counter()
+        ensemble.predict(X[:n_rows])
+        t1 = time.perf_counter()
+        model.get_booster().inplace_predict(X[:n_rows], validate_features=False)
+        t2 = time.perf_counter()
+        print(f"{n_rows:>6} rows: numpy {1000 * (t1 - t0):8.2f} ms   xgboost inplace {1000 * (t2 - t1):8.2f} ms")
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from typing import List, Dict, Any, Optional
+
+from core.encoders import Encoders, file_digest
+from core.training import DEFAULT_PARAMS, agg_feature_matrix
+
+# ------------------------------------------------------------
+# Hyperparameter search on cached, memory-mapped CV folds
+# ------------------------------------------------------------
+FOLD_CACHE_VERSION = 2  # 2: shuffled training rows, early-stopping slice
+
+# Sampled search space: name -> list of choices
+SEARCH_SPACE = {
+    "max_depth": [4, 6, 8, 10, 12],
+    "learning_rate": [0.03, 0.05, 0.1, 0.2],
+    "min_child_weight": [1, 3, 5, 10],
+    "subsample": [0.6, 0.8, 1.0],
+    "colsample_bytree": [0.6, 0.8, 1.0],
+    "reg_lambda": [0.5, 1.0, 2.0, 5.0],
+}
+
+
+class FoldCache:
+    """
+    K cross-validation folds of the agg table, stored as .npy files and opened
+    with mmap_mode="r" so every worker process shares the same pages.
+    Target encodings of each fold are fit on its training rows only
+    (out-of-fold), so the validation score does not see its own target.
+    The training rows themselves get in-sample encodings (the encoders are
+    fit on them), as the final model trained on the whole agg table does.
+
+    Training rows are stored shuffled: their last `stop_fraction` is the
+    early-stopping slice (see run_trial), a view of the memory-mapped array.
+    """
+
+    def __init__(self, cache_dir: str, meta: Dict[str, Any]):
+        self.cache_dir = cache_dir
+        self.meta = meta
+
+    @property
+    def n_folds(self) -> int:
+        return self.meta["n_folds"]
+
+    def _path(self, fold: int, name: str) -> str:
+        return os.path.join(self.cache_dir, f"fold{fold}_{name}.npy")
+
+    def load_fold(self, fold: int):
+        """(X_train, y_train, X_valid, y_valid) of one fold, memory-mapped read-only."""
+        return tuple(np.load(self._path(fold, name), mmap_mode="r") for name in ("X_train", "y_train", "X_valid", "y_valid"))
+
+    @classmethod
+    def build(cls, agg_path: str, cache_dir: str, n_folds: int = 5, seed: int = 42,
+              stop_fraction: float = 0.1) -> "FoldCache":
+        """Builds the fold files, or reuses them if they were built from the same agg.csv and settings."""
+        meta = {
+            "version": FOLD_CACHE_VERSION,
+            "agg_digest": file_digest(agg_path),
+            "n_folds": n_folds,
+            "seed": seed,
+            "stop_fraction": stop_fraction,
+        }
+        meta_path = os.path.join(cache_dir, "folds.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                cached = json.load(f)
+            if {k: cached.get(k) for k in meta} == meta:
+                return cls(cache_dir, cached)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        agg_df = pd.read_csv(agg_path)
+        fold_of_row = np.random.default_rng(seed).permutation(len(agg_df)) % n_folds
+        cache = cls(cache_dir, meta)
+        for fold in range(n_folds):
+            train_df = agg_df[fold_of_row != fold].sample(frac=1, random_state=seed + fold)
+            valid_df = agg_df[fold_of_row == fold]
+            encoders = Encoders.from_agg(train_df)
+            arrays = {
+                "X_train": agg_feature_matrix(train_df, encoders).to_numpy(),
+                "y_train": train_df["avg_rendement"].to_numpy(dtype=np.float32),
+                "X_valid": agg_feature_matrix(valid_df, encoders).to_numpy(),
+                "y_valid": valid_df["avg_rendement"].to_numpy(dtype=np.float32),
+            }
+            for name, arr in arrays.items():
+                np.save(cache._path(fold, name), np.ascontiguousarray(arr))
+        meta["rows"] = len(agg_df)
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        return cache
+
+
+def run_settings(cache: FoldCache, max_rounds: int, early_stopping_rounds: int) -> Dict[str, Any]:
+    """What a trial score depends on besides its params: the folds and the training settings."""
+    return {
+        "folds": {k: cache.meta[k] for k in ("version", "agg_digest", "n_folds", "seed", "stop_fraction")},
+        "max_rounds": max_rounds,
+        "early_stopping_rounds": early_stopping_rounds,
+    }
+
+
+def trial_id(params: Dict[str, Any]) -> str:
+    """Stable id of a parameter set, used to skip finished trials on resume."""
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def sample_trials(n_trials: int, seed: int = 0, space: Optional[Dict[str, list]] = None) -> List[Dict[str, Any]]:
+    """Distinct random parameter sets from the search space (deterministic for a seed)."""
+    space = space or SEARCH_SPACE
+    rng = np.random.default_rng(seed)
+    n_combinations = int(np.prod([len(v) for v in space.values()]))
+    trials, seen = [], set()
+    while len(trials) < min(n_trials, n_combinations):
+        params = {name: choices[rng.integers(len(choices))] for name, choices in space.items()}
+        params = {k: v.item() if hasattr(v, "item") else v for k, v in params.items()}
+        key = trial_id(params)
+        if key not in seen:
+            seen.add(key)
+            trials.append(params)
+    return trials
+
+
+def run_trial(cache_dir: str, params: Dict[str, Any], max_rounds: int = 1000,
+              early_stopping_rounds: int = 30) -> Dict[str, Any]:
+    """
+    Cross-validates one parameter set (runs in a worker process). Each fold
+    trains up to `max_rounds` trees on its training rows minus the
+    early-stopping slice, and stops once the RMSE on that slice has not
+    improved for `early_stopping_rounds` rounds. RMSE / MAE are measured on
+    the validation rows, which neither training nor stopping saw.
+    """
+    from xgboost import XGBRegressor
+
+    with open(os.path.join(cache_dir, "folds.json")) as f:
+        cache = FoldCache(cache_dir, json.load(f))
+
+    t0 = time.perf_counter()
+    rmse, mae, rounds = [], [], []
+    for fold in range(cache.n_folds):
+        X_train, y_train, X_valid, y_valid = cache.load_fold(fold)
+        n_fit = len(X_train) - max(1, int(len(X_train) * cache.meta["stop_fraction"]))
+        model = XGBRegressor(**{
+            **DEFAULT_PARAMS, **params,
+            "n_estimators": max_rounds,
+            "early_stopping_rounds": early_stopping_rounds,
+            "eval_metric": "rmse",
+            "n_jobs": 1,
+        })
+        model.fit(X_train[:n_fit], y_train[:n_fit], eval_set=[(X_train[n_fit:], y_train[n_fit:])], verbose=False)
+        predicted = model.predict(X_valid, iteration_range=(0, model.best_iteration + 1))
+        rmse.append(float(np.sqrt(np.mean((predicted - y_valid) ** 2))))
+        mae.append(float(np.mean(np.abs(predicted - y_valid))))
+        rounds.append(int(model.best_iteration) + 1)
+
+    return {
+        "trial_id": trial_id(params),
+        "params": params,
+        "rmse": float(np.mean(rmse)),
+        "rmse_std": float(np.std(rmse)),
+        "mae": float(np.mean(mae)),
+        "n_estimators": int(np.round(np.mean(rounds))),
+        "fold_rmse": rmse,
+        "duration_s": round(time.perf_counter() - t0, 2),
+        "pid": os.getpid(),
+        "settings": run_settings(cache, max_rounds, early_stopping_rounds),
+    }
+
+
+def load_results(results_path: str, settings: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Finished trials of a previous (possibly interrupted) search, by trial id.
+    Trials scored with other settings (see run_settings: other agg.csv,
+    folds or rounds) are left out and run again.
+    """
+    results = {}
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # partial last line of an interrupted run
+                    continue
+                if result.get("settings") == settings:
+                    results[result["trial_id"]] = result
+    return results
+
+
+def append_result(results_path: str, result: Dict[str, Any]):
+    # one JSON line per finished trial, synced so a crash loses at most the running trials
+    with open(results_path, "ab+") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        f.write((json.dumps(result) + "\n").encode())
+        f.flush()
+        os.fsync(f.fileno())
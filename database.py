@@ -122,6 +122,54 @@ class MySQLDatabase:
         """
         return self._execute_query(query, tuple(game_ids))
 
+    def get_production_records_since(self, watermark, limit=5000):
+        """Get production records (one per employee/operation run) with an id above the watermark"""
+        query = self._production_query() + """
+        LIMIT %s;
+        """
+        return self._execute_query(query, (watermark, limit))
+
+    def iter_production_records(self, watermark=0, chunk_size=10000):
+        """
+        Stream all production records above the watermark, in id order, as
+        lists of at most chunk_size rows. Uses an unbuffered cursor so the
+        server streams the result set and only one chunk is held in memory.
+        """
+        connection = None
+        cursor = None
+        try:
+            connection = self.get_connection()
+            if not connection:
+                raise ConnectionError("No database connection available")
+            cursor = connection.cursor(dictionary=True, buffered=False)
+            cursor.execute(self._production_query() + ";", (watermark,))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            if connection and connection.unread_result:
+                # generator closed early: drain the stream before the connection goes back to the pool
+                connection.consume_results()
+            if cursor:
+                cursor.close()
+            if connection and connection.is_connected():
+                connection.close()
+
+    def _production_query(self):
+        return f"""
+        SELECT
+            p.{config.PRODUCTION_ID_COLUMN} as record_id,
+            p.idemploye as IDEmploye,
+            p.idoperation as IDOperation,
+            p.temps as temps,
+            p.rendement as rendement,
+            p.idmachine as machine,
+            p.IDChaineMontage as chain
+        FROM {config.PRODUCTION_TABLE} p
+        WHERE p.{config.PRODUCTION_ID_COLUMN} > %s
+        ORDER BY p.{config.PRODUCTION_ID_COLUMN}"""
 
     def _execute_query(self, query, params=None):
         """Execute query and return results as list of dictionaries"""
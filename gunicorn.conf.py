@@ -0,0 +1,41 @@
+"""
+Multi-worker deployment of the solver API with a shared, preloaded model.
+
+    gunicorn Solver:app -c gunicorn.conf.py
+
+The master imports Solver.py once (preload_app) and loads the model and
+encoders there (PRELOAD_MODEL); the uvicorn workers are forked from it and
+share those pages copy-on-write instead of each loading its own copy.
+GET /memory on any worker reports its RSS / PSS / shared memory.
+
+Every worker runs its own pool of solver processes (and scheduler): by
+default cores // WEB_CONCURRENCY of them, so the whole server runs about
+one local search per core. Set SOLVER_PROCESSES (and SCHEDULER_CAPACITY,
+which follows it) to size each worker's pool explicitly.
+
+Note: POST /models/reload only swaps the model of the worker that handles
+the request. To roll a new model out to every worker, point MODEL_PATH at it and
+restart gunicorn: with preload_app a HUP re-forks the workers from the
+already-loaded master and keeps the old model.
+"""
+import os
+
+# Must be set before Solver.py (and config.py) are imported by the master
+os.environ.setdefault("PRELOAD_MODEL", "true")
+# config.SOLVER_PROCESSES defaults to the cores / WEB_CONCURRENCY solver processes per worker
+os.environ.setdefault("WEB_CONCURRENCY", "4")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.environ["WEB_CONCURRENCY"])
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} forked from master {os.getppid()}")
+
+
+def post_worker_init(worker):
+    from core.preload import process_memory
+    worker.log.info(f"Worker {worker.pid} ready: {process_memory()}")
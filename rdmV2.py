@@ -22,16 +22,29 @@ test input
   ]
 }
 """
+import logging
+import time
+import numpy as np
 import pandas as pd
 import joblib
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 
+from core.metrics import (metrics, MetricsMiddleware, HTTP_LATENCY, PREDICT_PHASE_LATENCY, PREDICTED_PAIRS,
+                          ENCODER_LOOKUPS, CONTENT_TYPE)
+from core.logs import setup_logging, get_logger, fields, sampled, RequestContextMiddleware
+from core.responses import ndjson_lines, NDJSON_MEDIA_TYPE
+
+setup_logging()
+logger = get_logger("rdmV2")
+
 # ------------------------------------------------------------
 # Load model + encoders
 # ------------------------------------------------------------
-model = joblib.load("equilibrage_model_XGBRegressor.pkl")
+MODEL_FILE = "equilibrage_model_XGBRegressor.pkl"
+model = joblib.load(MODEL_FILE)
 
 agg_df = pd.read_csv("input/agg.csv")
 
@@ -46,8 +59,10 @@ OP_FALLBACK = float(enc_op_map.mean())
 MACHINE_FALLBACK = float(enc_machine_map.mean())
 CHAIN_FALLBACK = float(enc_chain_map.mean())
 
-print("=== Encoders loaded ===")
-print("----------------------------------------")
+STREAM_BATCH_ROWS = 5000  # (employee, operation) pairs predicted per chunk with format=ndjson
+
+logger.info("encoders loaded", extra=fields(employees=len(enc_emp_map), operations=len(enc_op_map),
+                                            machines=len(enc_machine_map), chains=len(enc_chain_map)))
 
 # ------------------------------------------------------------
 # Input format
@@ -67,17 +82,36 @@ class PredictionInput(BaseModel):
 # Create API
 # ------------------------------------------------------------
 app = FastAPI()
+app.add_middleware(MetricsMiddleware, histogram=HTTP_LATENCY)
+app.add_middleware(RequestContextMiddleware)
+metrics.gauge("model_info", "Loaded model file (value is always 1).", ("version",), collect=lambda: {(MODEL_FILE,): 1})
 
 
-@app.post("/predict-rendement")
-def predict_rendement(input_data: PredictionInput):
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus text exposition: latency per endpoint and phase, predicted pairs, encoder hits."""
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
 
-    print("\n================ NEW REQUEST ================")
+def _report_missing(employees: List[str], operations: List[OperationInput]):
+    """Logs the input categories the encoders do not know (their fallback value is used)."""
+    for name, values, encoder in [("employees", {int(emp) for emp in employees}, enc_emp_map),
+                                  ("operations", {int(op.idOp) for op in operations}, enc_op_map),
+                                  ("machines", {op.machine for op in operations}, enc_machine_map),
+                                  ("chains", {op.chain for op in operations}, enc_chain_map)]:
+        missing = sorted((value for value in values if value not in encoder.index), key=str)
+        if missing:
+            logger.warning("missing %s", name, extra=fields(count=len(missing), values=missing[:20]))
+
+
+def _predict(employees: List[str], operations: List[OperationInput]) -> pd.DataFrame:
+    """The (employee, operation) rows of the given employees with their predicted_rendement."""
+    started = time.perf_counter()
 
     # 1) Build dataframe of combinations
     rows = []
-    for emp in input_data.employees:
-        for op in input_data.operations:
+    for emp in employees:
+        for op in operations:
             rows.append({
                 "IDEmploye": int(emp),
                 "IDOperation": int(op.idOp),
@@ -87,30 +121,18 @@ def predict_rendement(input_data: PredictionInput):
             })
 
     df = pd.DataFrame(rows)
-    print("\n--- Incoming DF ---")
-    print(df.head())
-    print("----------------------------------------")
 
     # 2) ENCODING
-    print("\n--- Encoding checks ---")
-
     df["IDEmploye_encoded"] = df["IDEmploye"].map(enc_emp_map)
     df["IDOperation_encoded"] = df["IDOperation"].map(enc_op_map)
     df["most_used_machine_encoded"] = df["most_used_machine"].map(enc_machine_map)
     df["most_used_chain_encoded"] = df["most_used_chain"].map(enc_chain_map)
 
-    # Report missing categories
-    if df["IDEmploye_encoded"].isna().any():
-        print("⚠️ Missing employees:", df[df["IDEmploye_encoded"].isna()]["IDEmploye"].unique())
-
-    if df["IDOperation_encoded"].isna().any():
-        print("⚠️ Missing operations:", df[df["IDOperation_encoded"].isna()]["IDOperation"].unique())
-
-    if df["most_used_machine_encoded"].isna().any():
-        print("⚠️ Missing machines:", df[df["most_used_machine_encoded"].isna()]["most_used_machine"].unique())
-
-    if df["most_used_chain_encoded"].isna().any():
-        print("⚠️ Missing chains:", df[df["most_used_chain_encoded"].isna()]["most_used_chain"].unique())
+    for name, column in [("emp", "IDEmploye_encoded"), ("op", "IDOperation_encoded"),
+                         ("machine", "most_used_machine_encoded"), ("chain", "most_used_chain_encoded")]:
+        misses = int(df[column].isna().sum())
+        ENCODER_LOOKUPS.inc(len(df) - misses, encoder=name, result="hit")
+        ENCODER_LOOKUPS.inc(misses, encoder=name, result="miss")
 
     # Fill fallbacks
     df["IDEmploye_encoded"].fillna(EMP_FALLBACK, inplace=True)
@@ -118,15 +140,8 @@ def predict_rendement(input_data: PredictionInput):
     df["most_used_machine_encoded"].fillna(MACHINE_FALLBACK, inplace=True)
     df["most_used_chain_encoded"].fillna(CHAIN_FALLBACK, inplace=True)
 
-    print("\n--- Encoded DF ---")
-    print(df[[
-        "IDEmploye", "IDEmploye_encoded",
-        "IDOperation", "IDOperation_encoded",
-        "avg_temps",
-        "most_used_machine", "most_used_machine_encoded",
-        "most_used_chain", "most_used_chain_encoded"
-    ]].head())
-    print("----------------------------------------")
+    if sampled(logger, logging.DEBUG):
+        logger.debug("encoded rows", extra=fields(sample=True, head=df.head().to_dict("records")))
 
     # 3) Build feature matrix with EXACT SAME feature names as model training
     X = df[[
@@ -137,24 +152,60 @@ def predict_rendement(input_data: PredictionInput):
         "most_used_chain_encoded"
     ]]
 
-    print("\n--- Feature Matrix Sent to Model ---")
-    print(X.head())
-    print("----------------------------------------")
+    PREDICT_PHASE_LATENCY.observe(time.perf_counter() - started, phase="encode")
 
     # 4) Predict
+    started = time.perf_counter()
     df["predicted_rendement"] = model.predict(X)
+    PREDICT_PHASE_LATENCY.observe(time.perf_counter() - started, phase="predict")
+    PREDICTED_PAIRS.inc(len(df))
+
+    if sampled(logger, logging.DEBUG):
+        logger.debug("predictions", extra=fields(
+            sample=True, head=df[["IDEmploye", "IDOperation", "predicted_rendement"]].head().to_dict("records")))
+    return df
 
-    print("\n--- Predictions ---")
-    print(df[["IDEmploye", "IDOperation", "predicted_rendement"]].head())
-    print("----------------------------------------")
 
-    # 5) Format output
-    output = []
-    for _, row in df.iterrows():
-        output.append({
-            "idEmp": str(row["IDEmploye"]),
-            "idOp": str(row["IDOperation"]),
-            "rendement": float(round(row["predicted_rendement"], 3))
-        })
+def _records(df: pd.DataFrame) -> List[dict]:
+    """The output records of predicted rows."""
+    started = time.perf_counter()
+    output = [
+        {"idEmp": str(emp), "idOp": str(op), "rendement": rendement}
+        for emp, op, rendement in zip(df["IDEmploye"].tolist(), df["IDOperation"].tolist(),
+                                      np.round(df["predicted_rendement"].to_numpy(np.float64), 3).tolist())
+    ]
+    PREDICT_PHASE_LATENCY.observe(time.perf_counter() - started, phase="format")
+    return output
 
-    return {"predicted_rendement": output}
+
+def _record_batches(employees: List[str], operations: List[OperationInput]):
+    # whole employees per batch, about STREAM_BATCH_ROWS rows each
+    step = max(1, STREAM_BATCH_ROWS // max(1, len(operations)))
+    for start in range(0, len(employees), step):
+        yield _records(_predict(employees[start:start + step], operations))
+
+
+@app.post("/predict-rendement")
+def predict_rendement(input_data: PredictionInput, response_format: str = Query("json", alias="format")):
+    """
+    Predicted rendement of every (employee, operation) pair.
+
+    `format=ndjson` streams the result as newline-delimited JSON: a
+    `{"type": "response", "pairs": n}` line, one `{"idEmp", "idOp",
+    "rendement"}` line per pair, then `{"type": "end", "records": n}`.
+    Pairs are predicted and sent STREAM_BATCH_ROWS at a time, so neither
+    side holds the whole result and the client can start right away.
+    """
+    if response_format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'")
+    logger.info("predict received", extra=fields(employees=len(input_data.employees),
+                                                 operations=len(input_data.operations)))
+    _report_missing(input_data.employees, input_data.operations)
+
+    if response_format == "ndjson":
+        header = {"pairs": len(input_data.employees) * len(input_data.operations)}
+        return StreamingResponse(ndjson_lines(header, _record_batches(input_data.employees, input_data.operations)),
+                                 media_type=NDJSON_MEDIA_TYPE)
+
+    df = _predict(input_data.employees, input_data.operations)
+    return {"predicted_rendement": _records(df)}
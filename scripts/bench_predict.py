@@ -0,0 +1,74 @@
+"""
+Benchmark of the rendement prediction backends across grid sizes.
+
+Usage (from the project root):
+    python -m scripts.bench_predict [--backends sklearn,inplace,numpy] [--nthreads 1,4] [--repeat 20]
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import joblib
+
+from config import config
+from core.backends import make_backend
+from core.encoders import load_encoders
+
+# (employees, operations) -> grid of E*O rows
+GRID_SIZES = [(10, 10), (30, 40), (50, 100), (100, 200), (100, 300)]
+
+
+def random_grid(agg_df: pd.DataFrame, encoders, n_emp: int, n_ops: int, rng) -> np.ndarray:
+    emps = rng.choice(agg_df["IDEmploye"].unique(), n_emp, replace=False)
+    ops = rng.choice(agg_df["IDOperation"].unique(), n_ops, replace=False)
+    X = np.empty((n_emp * n_ops, 5), dtype=np.float32)
+    X[:, 0] = np.repeat(encoders.emp.transform(emps), n_ops)
+    X[:, 1] = np.tile(encoders.op.transform(ops), n_emp)
+    X[:, 2] = np.tile(rng.uniform(5, 120, n_ops), n_emp)
+    X[:, 3] = encoders.machine.fallback
+    X[:, 4] = encoders.chain.fallback
+    return X
+
+
+def time_backend(backend, X: np.ndarray, repeat: int) -> float:
+    backend.predict(X)  # warm-up
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        backend.predict(X)
+        runs.append(time.perf_counter() - t0)
+    return float(np.median(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=config.MODEL_PATH)
+    parser.add_argument("--backends", default="sklearn,inplace,numpy")
+    parser.add_argument("--nthreads", default="1,0", help="0 = xgboost default (all cores)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    agg_df = pd.read_csv(config.AGG_PATH)
+    encoders, _ = load_encoders(config.AGG_PATH, config.ENCODERS_PATH)
+    rng = np.random.default_rng(42)
+    grids = {(e, o): random_grid(agg_df, encoders, e, o, rng) for e, o in GRID_SIZES}
+
+    reference = make_backend("sklearn", joblib.load(args.model))
+    header = f"{'backend':<10}{'nthread':>8}" + "".join(f"{f'{e}x{o}':>12}" for e, o in GRID_SIZES)
+    print(header + "   (median ms per call)")
+    print("-" * len(header))
+    for name in args.backends.split(","):
+        for nthread in [int(n) for n in args.nthreads.split(",")]:
+            # fresh model per configuration so thread settings do not leak between runs
+            backend = make_backend(name, joblib.load(args.model), nthread or None)
+            cells = []
+            for size, X in grids.items():
+                max_diff = float(np.max(np.abs(backend.predict(X) - reference.predict(X))))
+                if max_diff > 1e-3:
+                    print(f"WARNING: {name} differs from sklearn by {max_diff:.2e} on {size}")
+                cells.append(f"{time_backend(backend, X, args.repeat) * 1000:>12.2f}")
+            print(f"{name:<10}{nthread:>8}" + "".join(cells))
+
+
+if __name__ == "__main__":
+    main()
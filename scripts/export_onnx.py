@@ -0,0 +1,120 @@
+"""
+Export the pickled XGBRegressor to ONNX, check parity and compare serving costs.
+
+Usage (from the project root):
+    python -m scripts.export_onnx [--model equilibrage_model_XGBRegressorMtest.pkl] [--out model.onnx] [--atol 1e-3]
+
+Writes <model>.onnx, checks it against the pickle on every agg.csv row, then
+loads the pickle and the .onnx file in fresh processes and reports startup
+time, resident memory and prediction latency for each.
+
+Serving the .onnx file needs onnxruntime (in requirements.txt); exporting
+it also needs `onnx`, a build-time dependency: pip install onnx
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from config import config
+
+LATENCY_ROWS = [100, 1000, 5000, 20000]
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def agg_features() -> np.ndarray:
+    from core.encoders import load_encoders
+    from core.training import agg_feature_matrix
+    encoders, _ = load_encoders(config.AGG_PATH, config.ENCODERS_PATH)
+    return agg_feature_matrix(pd.read_csv(config.AGG_PATH), encoders).to_numpy()
+
+
+def measure(model_path: str, backend_name: str):
+    """Runs in a fresh process: load cost, memory and latency of one artifact."""
+    rss_before = rss_mb()
+    t0 = time.perf_counter()
+    from core.backends import load_model_artifact, artifact_backend, make_backend
+    model = load_model_artifact(model_path, config.PREDICT_NTHREAD)
+    backend = make_backend(artifact_backend(model_path) or backend_name, model, config.PREDICT_NTHREAD)
+    load_s = time.perf_counter() - t0
+    rss_loaded = rss_mb()
+
+    X = np.random.default_rng(0).uniform(40, 110, (max(LATENCY_ROWS), 5)).astype(np.float32)
+    backend.predict(X[:10])
+    latency = {}
+    for n_rows in LATENCY_ROWS:
+        runs = []
+        for _ in range(10):
+            t = time.perf_counter()
+            backend.predict(X[:n_rows])
+            runs.append(time.perf_counter() - t)
+        latency[n_rows] = round(1000 * float(np.median(runs)), 2)
+    print(json.dumps({
+        "backend": backend.name,
+        "load_s": round(load_s, 3),
+        "rss_load_mb": round(rss_loaded - rss_before, 1),
+        "rss_total_mb": round(rss_mb(), 1),
+        "latency_ms": latency,
+        "xgboost_imported": "xgboost" in sys.modules,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=config.MODEL_PATH)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--atol", type=float, default=1e-3)
+    parser.add_argument("--measure", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--backend", default="inplace", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.backend)
+        return
+
+    import joblib
+    from core.backends import OnnxModel, OnnxBackend
+    from core.onnx_export import export_onnx
+    from core.registry import model_version
+
+    out_path = args.out or f"{os.path.splitext(args.model)[0]}.onnx"
+    model = joblib.load(args.model)
+    export_onnx(model, out_path, model_version(args.model))
+    print(f"Exported {args.model} -> {out_path} "
+          f"({os.path.getsize(args.model) / 1024:.0f} KB pickle, {os.path.getsize(out_path) / 1024:.0f} KB onnx)")
+
+    X = agg_features()
+    expected = model.predict(pd.DataFrame(X, columns=model.get_booster().feature_names))
+    got = OnnxBackend(OnnxModel(out_path)).predict(X)
+    max_diff = float(np.max(np.abs(got - expected)))
+    print(f"Parity on {len(X)} agg rows: max |diff| = {max_diff:.2e} (atol {args.atol:g})")
+    if max_diff > args.atol:
+        print("FAILED: ONNX predictions differ from the pickle beyond tolerance")
+        sys.exit(1)
+
+    print(f"\n{'artifact':<12}{'backend':<10}{'load s':>8}{'+RSS MB':>9}{'RSS MB':>8}"
+          + "".join(f"{f'{n} rows':>12}" for n in LATENCY_ROWS) + "   xgboost")
+    for path, backend_name in ((args.model, "inplace"), (out_path, "onnx")):
+        proc = subprocess.run(
+            [sys.executable, "-m", "scripts.export_onnx", "--measure", path, "--backend", backend_name],
+            capture_output=True, text=True, check=True
+        )
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{os.path.splitext(path)[1]:<12}{r['backend']:<10}{r['load_s']:>8.3f}{r['rss_load_mb']:>9.1f}"
+              f"{r['rss_total_mb']:>8.1f}" + "".join(f"{r['latency_ms'][str(n)]:>9.2f} ms" for n in LATENCY_ROWS)
+              + f"   {'yes' if r['xgboost_imported'] else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
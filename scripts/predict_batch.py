@@ -0,0 +1,48 @@
+"""
+Score a large CSV of (employee, operation, time) rows with the rendement model.
+
+Usage (from the project root):
+    python -m scripts.predict_batch INPUT.csv OUTPUT.parquet|OUTPUT.csv
+                                    [--model equilibrage_model_XGBRegressorMtest.pkl] [--chunksize 50000]
+                                    [--only-inputs]
+
+Input columns (agg.csv or API names): IDEmploye|employee_id,
+IDOperation|operation_id, avg_temps|temps_execution, and optionally
+most_used_machine|machine and most_used_chain|chain. The file is read and
+written chunk by chunk, so its size is not limited by memory; the output
+gets a predicted_rendement column.
+"""
+import argparse
+import sys
+
+from config import config
+from core.batch import DEFAULT_CHUNKSIZE, predict_csv
+from core.models import load_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--model", default=config.MODEL_PATH)
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument("--format", choices=("csv", "parquet"), default=None, help="default: from the output extension")
+    parser.add_argument("--only-inputs", action="store_true", help="write only the model input columns")
+    args = parser.parse_args()
+
+    bundle = load_model(args.model)
+    if bundle is None:
+        sys.exit(f"Could not load {args.model}")
+    print(f"Model {bundle.version} ({bundle.backend.name} backend)")
+
+    def progress(stats):
+        print(f"  {stats.rows} rows, {stats.rows_per_s:.0f} rows/s")
+
+    stats = predict_csv(args.input, args.output, bundle, args.chunksize, args.format,
+                        keep_columns=not args.only_inputs, progress=progress)
+    print(f"Wrote {stats['rows']} rows to {args.output} in {stats['elapsed_s']:.2f}s "
+          f"({stats['rows_per_s']} rows/s, {stats['predict_s']:.2f}s in encoding + model)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Fold new production records into agg.csv and the encoder artifact.
+
+Usage (from the project root):
+    python -m scripts.refresh_encoders [--dry-run] [--reseed] [--max-batches N]
+
+Keeps the running per-pair / per-category (count, sum) state in
+config.AGG_STATE_PATH together with the last production record id folded
+(the watermark). Each run only reads the records above the watermark, in
+batches of config.REFRESH_BATCH_SIZE, then rewrites agg.csv and
+encoders.npz from the state. The API picks the new files up on the next
+POST /models/reload.
+
+The first run (or --reseed) seeds the state from the current agg.csv. That
+needs its n_records column (records per pair, so new records move the
+means by the right weight) and the last production record id it already
+aggregates: the agg.csv.watermark file written next to it by
+scripts/train_model.py and this script, or --watermark. Without them the
+history would be folded a second time on top of agg.csv.
+"""
+import argparse
+import os
+import sys
+import time
+import pandas as pd
+
+from config import config
+from core.aggregates import RunningAggregates, read_agg_watermark
+from core.encoders import PAIR_COUNT_COLUMN
+
+
+def load_state(reseed: bool, watermark=None) -> RunningAggregates:
+    if not reseed and os.path.exists(config.AGG_STATE_PATH):
+        state = RunningAggregates.load(config.AGG_STATE_PATH)
+        if watermark is not None:
+            state.watermark = watermark
+        print(f"Loaded state {config.AGG_STATE_PATH}: {len(state.pairs)} pairs, watermark {state.watermark}")
+        return state
+    agg_df = pd.read_csv(config.AGG_PATH)
+    if PAIR_COUNT_COLUMN not in agg_df.columns:
+        sys.exit(f"{config.AGG_PATH} has no {PAIR_COUNT_COLUMN} column: cannot weigh new records against it. "
+                 f"Rebuild it with python -m scripts.train_model --source db")
+    if watermark is None:
+        watermark = read_agg_watermark(config.AGG_PATH)
+    if watermark is None:
+        sys.exit(f"Unknown watermark of {config.AGG_PATH}: pass --watermark <last production id it aggregates>")
+    state = RunningAggregates.from_agg(agg_df, watermark)
+    print(f"Seeded state from {config.AGG_PATH}: {len(state.pairs)} pairs, watermark {state.watermark}")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="fold and report, but write nothing")
+    parser.add_argument("--reseed", action="store_true", help="rebuild the state from agg.csv first")
+    parser.add_argument("--watermark", type=int, default=None,
+                        help="override the stored watermark (required to seed from an agg.csv without one)")
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args()
+
+    from database import db
+
+    state = load_state(args.reseed, args.watermark)
+
+    start_watermark = state.watermark
+    t0 = time.perf_counter()
+    folded, batches = 0, 0
+    while args.max_batches is None or batches < args.max_batches:
+        records = db.get_production_records_since(state.watermark, config.REFRESH_BATCH_SIZE)
+        if not records:
+            break
+        folded += state.fold(records)
+        batches += 1
+        if len(records) < config.REFRESH_BATCH_SIZE:
+            break
+    print(f"Folded {folded} records in {batches} batches ({time.perf_counter() - t0:.2f}s), "
+          f"{len(state.pairs)} pairs, watermark {state.watermark}")
+
+    if args.dry_run or folded == 0 and not args.reseed and state.watermark == start_watermark:
+        print("Nothing written")
+        return
+    if folded == 0 and not args.reseed:
+        # only records without rendement / temps: keep their watermark so they are not read again
+        state.save(config.AGG_STATE_PATH)
+        print(f"Wrote {config.AGG_STATE_PATH}")
+        return
+
+    encoders = state.publish(config.AGG_PATH, config.ENCODERS_PATH)
+    state.save(config.AGG_STATE_PATH)
+    print(f"Wrote {config.AGG_PATH}, {config.ENCODERS_PATH} "
+          f"({', '.join(f'{name}={len(e)}' for name, e in encoders.items())}, pairs={len(encoders.pairs)}) "
+          f"and {config.AGG_STATE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
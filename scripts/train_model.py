@@ -0,0 +1,71 @@
+"""
+Train the rendement model and write it together with its agg features and encoders.
+
+Usage (from the project root):
+    python -m scripts.train_model [--source db|agg] [--agg input/agg.csv] [--out runs/<name>]
+                                  [--chunk-size 10000] [--params '{"max_depth": 8}']
+
+--source db (default) streams every production record out of MySQL in
+chunks (unbuffered cursor, see database.iter_production_records) and folds
+them into per-pair running aggregates, so memory depends on the number of
+(employee, operation) pairs rather than on the length of the history.
+--source agg retrains from an existing agg.csv instead.
+
+The run directory holds model.pkl, agg.csv (with agg.csv.watermark, the
+last production record id it aggregates), encoders.npz, agg_state.npz
+(the state for scripts/refresh_encoders.py) and manifest.json. Serve it
+with POST /models/reload {"model_path": "<run>/model.pkl",
+"agg_path": "<run>/agg.csv", "encoders_path": "<run>/encoders.npz"}.
+"""
+import argparse
+import json
+import os
+import time
+import pandas as pd
+from datetime import datetime
+
+from config import config
+from core.aggregates import RunningAggregates, read_agg_watermark
+from core.training import DEFAULT_PARAMS, aggregate_chunks, train_model, write_run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=("db", "agg"), default="db")
+    parser.add_argument("--agg", default=config.AGG_PATH, help="agg.csv used with --source agg")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--params", default="{}", help="JSON overrides of the XGBRegressor parameters")
+    args = parser.parse_args()
+
+    params = {**DEFAULT_PARAMS, **json.loads(args.params)}
+    out_dir = args.out or os.path.join(config.MODEL_DIR, "runs", f"rendement_{datetime.now():%Y%m%d_%H%M%S}")
+
+    t0 = time.perf_counter()
+    if args.source == "db":
+        from database import db
+        print(f"Streaming production records from {config.PRODUCTION_TABLE} in chunks of {args.chunk_size}")
+        state = aggregate_chunks(db.iter_production_records(0, args.chunk_size), progress_every=10)
+    else:
+        state = RunningAggregates.from_agg(pd.read_csv(args.agg), read_agg_watermark(args.agg) or 0)
+    t1 = time.perf_counter()
+    print(f"Aggregated {len(state.pairs)} pairs ({state.records_folded} records folded) in {t1 - t0:.2f}s")
+    if not state.pairs:
+        print("No production records, nothing to train on")
+        return
+
+    agg_df = state.to_agg_frame()
+    model = train_model(agg_df, state.to_encoders(), params)
+    t2 = time.perf_counter()
+    print(f"Trained XGBRegressor on {len(agg_df)} rows in {t2 - t1:.2f}s")
+
+    manifest = write_run(out_dir, model, state, params, {
+        "source": args.source if args.source == "db" else f"agg:{args.agg}",
+        "timings_s": {"aggregate": round(t1 - t0, 3), "train": round(t2 - t1, 3)},
+    })
+    print(f"Wrote {out_dir} ({', '.join(manifest['files'].values())}), "
+          f"model digest {manifest['digests']['model'][:8]}")
+
+
+if __name__ == "__main__":
+    main()
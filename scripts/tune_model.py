@@ -0,0 +1,91 @@
+"""
+Parallel hyperparameter search for the rendement XGBRegressor.
+
+Usage (from the project root):
+    python -m scripts.tune_model [--agg input/agg.csv] [--out runs/search] [--trials 40]
+                                 [--folds 5] [--workers N] [--max-rounds 1000] [--early-stopping 30]
+                                 [--stop-fraction 0.1]
+
+Builds the CV folds once (out-of-fold target encodings, see
+core.tuning.FoldCache) under <out>/folds and memory-maps them in every
+worker. Trials run in a process pool, one xgboost thread each, with early
+stopping on a slice of the fold's training rows (--stop-fraction) and the
+score measured on its validation rows. Each finished trial is appended to
+<out>/results.jsonl with the settings it was scored with; rerunning the same
+command skips the trials already there, so an interrupted search picks up
+where it stopped. Trials scored on another agg.csv, other folds or other
+--max-rounds / --early-stopping are run again.
+
+Train the best configuration with:
+    python -m scripts.train_model --params '<best params JSON>'
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from config import config
+from core.tuning import FoldCache, sample_trials, trial_id, run_trial, run_settings, load_results, append_result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agg", default=config.AGG_PATH)
+    parser.add_argument("--out", default=os.path.join(config.MODEL_DIR, "runs", "search"))
+    parser.add_argument("--trials", type=int, default=40)
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-rounds", type=int, default=1000)
+    parser.add_argument("--early-stopping", type=int, default=30)
+    parser.add_argument("--stop-fraction", type=float, default=0.1,
+                        help="share of each fold's training rows held out for early stopping")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    cache = FoldCache.build(args.agg, os.path.join(args.out, "folds"), args.folds, args.seed, args.stop_fraction)
+    print(f"Folds ready in {cache.cache_dir} ({cache.meta['rows']} rows, {cache.n_folds} folds, "
+          f"{time.perf_counter() - t0:.2f}s)")
+
+    results_path = os.path.join(args.out, "results.jsonl")
+    done = load_results(results_path, run_settings(cache, args.max_rounds, args.early_stopping))
+    trials = sample_trials(args.trials, args.seed)
+    pending = [p for p in trials if trial_id(p) not in done]
+    print(f"{len(trials)} trials, {len(trials) - len(pending)} already done, "
+          f"running {len(pending)} on {args.workers} workers")
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(run_trial, cache.cache_dir, params, args.max_rounds, args.early_stopping): params
+            for params in pending
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"  trial {trial_id(futures[future])} failed: {e}")
+                continue
+            append_result(results_path, result)
+            done[result["trial_id"]] = result
+            print(f"  [{i}/{len(pending)}] rmse {result['rmse']:.3f} ± {result['rmse_std']:.3f} "
+                  f"({result['n_estimators']} trees, {result['duration_s']:.1f}s) {json.dumps(result['params'])}")
+    if pending:
+        print(f"Ran {len(pending)} trials in {time.perf_counter() - t0:.1f}s")
+
+    ranked = sorted((done[trial_id(p)] for p in trials if trial_id(p) in done), key=lambda r: r["rmse"])
+    if not ranked:
+        print("No finished trials")
+        return
+    print(f"\n{'rmse':>8}{'std':>7}{'mae':>8}{'trees':>7}  params")
+    for r in ranked[:5]:
+        print(f"{r['rmse']:>8.3f}{r['rmse_std']:>7.3f}{r['mae']:>8.3f}{r['n_estimators']:>7}  {json.dumps(r['params'])}")
+    best = {**ranked[0]["params"], "n_estimators": ranked[0]["n_estimators"]}
+    with open(os.path.join(args.out, "best_params.json"), "w") as f:
+        json.dump(best, f, indent=2)
+    print(f"\nBest: python -m scripts.train_model --params '{json.dumps(best)}'")
+
+
+if __name__ == "__main__":
+    main()